@@ -0,0 +1,271 @@
+"""
+Actualización mensual incremental del modelo.
+
+Cada mes llega un barómetro nuevo del CIS. En lugar de volver a ejecutar
+el notebook sobre todos los .sav y reentrenar desde cero:
+
+1. Cada mes se preprocesa una sola vez (ingesta de sus 9 columnas,
+   recodificación y filtrado) y se guarda en formato compacto en
+   `data/cache/preprocesado/mes=<mes>.parquet`. Solo se rehace si el .sav
+   de ese mes cambia.
+2. Se mide la deriva de los meses nuevos frente a los datos con los que se
+   entrenó la versión en servicio: el PSI (population stability index) de
+   cada variable y del voto, y la caída de accuracy del modelo actual.
+3. Si ninguna métrica supera su umbral, el estimador se actualiza con los
+   datos nuevos sin volver a buscar el modelo: `partial_fit` si lo admite,
+   árboles adicionales (`warm_start`) en los ensembles y, en el resto,
+   continuando el ajuste desde la solución actual (`warm_start`) o
+   reajustando los mismos hiperparámetros. Si alguna lo supera (o con
+   `--completo`), se reentrena desde cero con `entrenamiento.py`.
+4. El resultado se publica como nueva versión del registro (`registro.py`)
+   y la app la carga sin reiniciar los workers.
+5. Solo con `--guardar-datos`, el dataset limpio (`data/datos_limpios.parquet`,
+   el que usan la app y `bootstrap.py`) se sustituye por el de todos los
+   meses del modelo publicado.
+
+Uso:
+    python actualizacion.py [meses...] [--completo] [--minutos M] [--guardar-datos]
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from codificador import CODIFICADOR
+from datos import RUTA_DATOS, compactar_recodificado, guardar_compacto
+from esquema import VARIABLES, PARTIDOS, OBJETIVO
+from ingesta import MESES, DIRECTORIO_DATOS, RUTA_CACHE, actualizar_cache, cargar_barometros
+from recodificacion import recodificar
+import registro
+
+RUTA_PREPROCESADO = 'data/cache/preprocesado'
+
+# PSI a partir del cual una variable se considera desplazada (criterio habitual)
+UMBRAL_PSI = 0.2
+
+# Caída de accuracy (en tanto por uno) que obliga a reentrenar
+UMBRAL_CAIDA_ACCURACY = 0.05
+
+# Proporción mínima de cada categoría en el PSI (evita log(0))
+EPSILON_PSI = 1e-4
+
+
+def preprocesar_mes(mes, directorio=DIRECTORIO_DATOS, cache=RUTA_PREPROCESADO):
+    """Filas del mes listas para el modelo (formato compacto de `datos.py`), con caché"""
+    actualizar_cache([mes], directorio)
+    with open(os.path.join(RUTA_CACHE, f'mes={mes}', 'fuente.json'), encoding='utf-8') as f:
+        fuente = json.load(f)
+
+    ruta = os.path.join(cache, f'mes={mes}.parquet')
+    try:
+        with open(ruta[:-len('.parquet')] + '.json', encoding='utf-8') as f:
+            if json.load(f) == fuente:
+                return pd.read_parquet(ruta)
+    except (OSError, ValueError):
+        pass
+
+    datos = compactar_recodificado(recodificar(cargar_barometros([mes], directorio)))
+    os.makedirs(cache, exist_ok=True)
+    guardar_compacto(datos, ruta)
+    with open(ruta[:-len('.parquet')] + '.json', 'w', encoding='utf-8') as f:
+        json.dump(fuente, f)
+    return datos
+
+
+def cargar_meses(meses, directorio=DIRECTORIO_DATOS):
+    """Datos preprocesados de varios meses en un único DataFrame compacto"""
+    return pd.concat([preprocesar_mes(mes, directorio) for mes in meses], ignore_index=True)
+
+
+def matriz(ligero, datos):
+    """Matriz de entrada del estimador y etiquetas (códigos de `PARTIDOS`) de unos datos compactos"""
+    X = ligero.preprocesar(CODIFICADOR.transformar(datos))
+    return X, datos[OBJETIVO].cat.codes.to_numpy()
+
+
+def distribuciones(datos):
+    """Recuento de cada categoría de las variables predictoras y del voto"""
+    categorias = {**VARIABLES, OBJETIVO: PARTIDOS}
+    return {
+        variable: pd.Categorical(datos[variable], categories=valores).value_counts().tolist()
+        for variable, valores in categorias.items()
+    }
+
+
+def psi(referencia, nuevos):
+    """Population stability index entre dos recuentos de categorías"""
+    p = np.maximum(np.asarray(referencia, dtype=np.float64) / max(sum(referencia), 1), EPSILON_PSI)
+    q = np.maximum(np.asarray(nuevos, dtype=np.float64) / max(sum(nuevos), 1), EPSILON_PSI)
+    return float(((q - p) * np.log(q / p)).sum())
+
+
+def accuracy(ligero, datos):
+    """Accuracy del modelo sobre unos datos compactos"""
+    etiquetas, _ = ligero.predecir_matriz(CODIFICADOR.transformar(datos))
+    return float((etiquetas == datos[OBJETIVO].astype(str).to_numpy()).mean())
+
+
+def medir_deriva(ligero, meta, nuevos):
+    """PSI de cada variable y caída de accuracy de los datos nuevos frente a la versión en servicio"""
+    actuales = distribuciones(nuevos)
+    precision = accuracy(ligero, nuevos)
+    return {
+        'psi': {v: psi(meta['distribuciones'][v], actuales[v]) for v in actuales},
+        'accuracy': precision,
+        'caida_accuracy': meta['accuracy_referencia'] - precision,
+    }
+
+
+def requiere_reentrenamiento(deriva):
+    """Indica si la deriva supera alguno de los umbrales"""
+    return (max(deriva['psi'].values()) > UMBRAL_PSI
+            or deriva['caida_accuracy'] > UMBRAL_CAIDA_ACCURACY)
+
+
+def actualizar_estimador(ligero, todos, nuevos):
+    """
+    Actualiza el estimador de `ligero` con los datos nuevos sin buscar de nuevo el modelo.
+
+    `todos` incluye los meses ya entrenados y los nuevos. Devuelve el tipo
+    de actualización aplicada.
+    """
+    from sklearn.base import clone
+
+    estimador = ligero.estimador
+    parametros = estimador.get_params()
+    if hasattr(estimador, 'partial_fit'):
+        estimador.partial_fit(*matriz(ligero, nuevos))
+        return 'partial_fit'
+
+    X, y = matriz(ligero, todos)
+    if 'warm_start' in parametros and 'n_estimators' in parametros:
+        # Árboles nuevos en proporción a las filas nuevas
+        adicionales = max(1, round(estimador.n_estimators * len(nuevos) / len(todos)))
+        estimador.set_params(warm_start=True, n_estimators=estimador.n_estimators + adicionales)
+        estimador.fit(X, y)
+        return 'warm_start'
+    if 'warm_start' in parametros:
+        estimador.set_params(warm_start=True)
+        estimador.fit(X, y)
+        return 'warm_start'
+    ligero.estimador = clone(estimador).fit(X, y)
+    return 'reajuste'
+
+
+def reentrenar(todos, minutos=None):
+    """
+    Selección y ajuste completos con `entrenamiento.py`.
+
+    Devuelve el nuevo `ModeloLigero` y el hash del .pkl del que se extrajo.
+    """
+    from datos import expandir
+    from entrenamiento import entrenar
+    from inferencia import extraer_modelo
+    from tabla_perfiles import cargar_pipeline
+
+    entrenar(expandir(todos), minutos)
+    pipeline, hash_pkl = cargar_pipeline()
+    return extraer_modelo(pipeline), hash_pkl
+
+
+def version_inicial(meses=MESES, ruta=registro.RUTA_REGISTRO):
+    """Publica como primera versión del registro el modelo de `models/` (entrenado con `meses`)"""
+    from inferencia import extraer_modelo
+    from tabla_perfiles import cargar_pipeline
+
+    pipeline, hash_pkl = cargar_pipeline()
+    ligero = extraer_modelo(pipeline)
+    todos = cargar_meses(meses)
+    return registro.publicar(ligero, {
+        'meses': list(meses),
+        'tipo': 'inicial',
+        'hash_modelo': hash_pkl,
+        'filas': len(todos),
+        'distribuciones': distribuciones(todos),
+        # Sobre los propios datos de entrenamiento: es algo optimista
+        'accuracy_referencia': accuracy(ligero, todos),
+    }, ruta)
+
+
+def sustituir_dataset(todos, meses, ruta=RUTA_DATOS):
+    """Sustituye el dataset limpio por `todos` (ver `datos.guardar_compacto`) e indica qué se reemplaza"""
+    anteriores = len(pd.read_parquet(ruta, columns=[OBJETIVO])) if os.path.exists(ruta) else None
+    guardar_compacto(todos, ruta)
+    print(f"💾 {ruta}: {'sin dataset anterior' if anteriores is None else f'{anteriores:,} filas'} → "
+          f"{len(todos):,} filas ({len(meses)} meses: {', '.join(meses)})")
+
+
+def actualizar(meses=MESES, completo=False, minutos=None, ruta=registro.RUTA_REGISTRO, guardar_datos=False):
+    """
+    Añade al modelo en servicio los meses que aún no ha visto y publica una nueva versión.
+
+    Con `guardar_datos`, una vez publicada la versión, sustituye el dataset
+    limpio por el de todos sus meses. Devuelve la versión publicada, o None
+    si no había meses nuevos.
+    """
+    version = registro.version_actual(ruta) or version_inicial(ruta=ruta)
+    meta = registro.leer_meta(version, ruta)
+    meses_nuevos = [mes for mes in meses if mes not in meta['meses']]
+    if not meses_nuevos and not completo:
+        return None
+
+    meses_todos = meta['meses'] + meses_nuevos
+    todos = cargar_meses(meses_todos)
+    ligero = registro.cargar_version(version, ruta)
+
+    deriva = None
+    if meses_nuevos:
+        nuevos = cargar_meses(meses_nuevos)
+        deriva = medir_deriva(ligero, meta, nuevos)
+    if completo or requiere_reentrenamiento(deriva):
+        ligero, hash_pkl = reentrenar(todos, minutos)
+        tipo = 'completo'
+        referencia = accuracy(ligero, todos)
+    else:
+        # El estimador sigue derivando del mismo .pkl que la versión anterior
+        hash_pkl = meta.get('hash_modelo')
+        tipo = actualizar_estimador(ligero, todos, nuevos)
+        # Accuracy del modelo anterior sobre meses que no había visto
+        referencia = deriva['accuracy']
+
+    version = registro.publicar(ligero, {
+        'meses': meses_todos,
+        'tipo': tipo,
+        'hash_modelo': hash_pkl,
+        'version_anterior': version,
+        'filas': len(todos),
+        'deriva': deriva,
+        'distribuciones': distribuciones(todos),
+        'accuracy_referencia': referencia,
+    }, ruta)
+    if guardar_datos:
+        sustituir_dataset(todos, meses_todos)
+    return version
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Añade los barómetros nuevos al modelo en servicio")
+    parser.add_argument('meses', nargs='*', default=MESES, help="meses a incluir (por defecto, los de 2025)")
+    parser.add_argument('--completo', action='store_true', help="reentrenar desde cero aunque no haya deriva")
+    parser.add_argument('--minutos', type=float, default=None, help="presupuesto del reentrenamiento completo")
+    parser.add_argument('--guardar-datos', action='store_true',
+                        help=f"sustituir {RUTA_DATOS} por el dataset de todos los meses del modelo publicado")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    version = actualizar(args.meses, args.completo, args.minutos, guardar_datos=args.guardar_datos)
+    if version is None:
+        print("✅ No hay meses nuevos: el modelo en servicio ya está al día")
+    else:
+        meta = registro.leer_meta(version)
+        print(f"✅ Versión {version} publicada ({meta['tipo']}, {len(meta['meses'])} meses, "
+              f"{meta['filas']:,} filas, {time.perf_counter() - inicio:.1f} s)")
+        if meta['deriva']:
+            peor = max(meta['deriva']['psi'], key=meta['deriva']['psi'].get)
+            print(f"   Deriva: PSI máximo {meta['deriva']['psi'][peor]:.3f} ({peor}), "
+                  f"caída de accuracy {meta['deriva']['caida_accuracy']:+.1%}")
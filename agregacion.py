@@ -0,0 +1,185 @@
+"""
+Estimación agregada del voto de una población.
+
+En lugar de puntuar a cada individuo, la población se describe como pesos
+sobre los perfiles posibles (`tabla_perfiles`): la estimación de voto de
+un grupo es la suma de los vectores de probabilidad de sus perfiles,
+ponderados por su peso, dividida por el peso total. Las filas de la
+población se agrupan por (grupo, perfil) y cada perfil distinto se puntúa
+una sola vez, de modo que el coste depende del número de perfiles
+distintos (como mucho 207.360), no del tamaño de la población; con la
+tabla precalculada la puntuación es una consulta al array.
+
+La población puede ser la muestra de encuestados de los barómetros
+(`poblacion_barometros`) o esa misma muestra reponderada para que
+reproduzca una tabla cruzada externa, p. ej. un censo por CCAA × GRUPO_EDAD
+× SEXO (`postestratificar`).
+
+Uso:
+    python agregacion.py [meses...]
+"""
+
+import numpy as np
+import pandas as pd
+
+from codificador import CODIFICADOR
+from esquema import VARIABLES, PARTIDOS
+from tabla_perfiles import RADICES, N_PERFILES
+
+
+def codigos_perfiles(poblacion):
+    """Código de base mixta de cada fila (-1 si alguna variable no es válida o falta)"""
+    codigos = CODIFICADOR.codigos(poblacion, validar=False)
+    validas = (codigos >= 0).all(axis=1)
+    resultado = np.full(len(poblacion), -1, dtype=np.int64)
+    resultado[validas] = np.ravel_multi_index(codigos[validas].T, RADICES)
+    return resultado
+
+
+def agregar(modelo, codigos, pesos=None, grupos=None, n_grupos=None):
+    """
+    Suma ponderada de las probabilidades de voto por grupo.
+
+    `codigos` es el código de perfil de cada fila, `pesos` su peso (1 por
+    defecto) y `grupos` el índice de grupo de cada fila (0 por defecto).
+    Devuelve la matriz (grupos, partidos) de votos ponderados, el peso
+    total de cada grupo y el número de perfiles distintos puntuados.
+    """
+    codigos = np.asarray(codigos, dtype=np.int64)
+    pesos = np.ones(len(codigos)) if pesos is None else np.asarray(pesos, dtype=np.float64)
+    grupos = np.zeros(len(codigos), dtype=np.int64) if grupos is None else np.asarray(grupos, dtype=np.int64)
+    n_grupos = n_grupos or (int(grupos.max()) + 1 if len(grupos) else 1)
+
+    # Peso de cada combinación (grupo, perfil) presente en la población
+    celdas, inverso = np.unique(grupos * N_PERFILES + codigos, return_inverse=True)
+    pesos_celda = np.bincount(inverso, weights=pesos, minlength=len(celdas))
+    grupo_celda = celdas // N_PERFILES
+
+    # Cada perfil distinto se puntúa una sola vez
+    perfiles, perfil_celda = np.unique(celdas % N_PERFILES, return_inverse=True)
+    if len(perfiles):
+        _, probabilidades = modelo.predecir_codigos(np.stack(np.unravel_index(perfiles, RADICES), axis=1))
+    else:
+        probabilidades = np.zeros((0, len(PARTIDOS)))
+    ponderadas = np.asarray(probabilidades, dtype=np.float64)[perfil_celda] * pesos_celda[:, None]
+
+    votos = np.stack([np.bincount(grupo_celda, weights=ponderadas[:, i], minlength=n_grupos)
+                      for i in range(len(PARTIDOS))], axis=1)
+    totales = np.bincount(grupo_celda, weights=pesos_celda, minlength=n_grupos)
+    return votos, totales, len(perfiles)
+
+
+def estimar_voto(modelo, poblacion, por=None, pesos=None):
+    """
+    Estimación de voto (proporción de cada partido) de una población.
+
+    `poblacion` tiene una fila por individuo (o por celda, con su peso en
+    la columna `pesos`) con las 8 variables del modelo. `por` es la columna
+    por la que se desglosa (p. ej. 'CCAA' o 'MES'); sin ella se devuelve una
+    única fila 'Total'. Las filas con valores no válidos se descartan.
+    Devuelve un DataFrame con la proporción de cada partido, el peso total
+    ('Peso') y los perfiles distintos de cada grupo ('Perfiles').
+    """
+    codigos = codigos_perfiles(poblacion)
+    validas = codigos >= 0
+    w = None if pesos is None else poblacion[pesos].to_numpy(dtype=np.float64)[validas]
+
+    if por is None:
+        etiquetas, grupos = pd.Index(['Total']), None
+    else:
+        columna = poblacion[por]
+        if isinstance(columna.dtype, pd.CategoricalDtype):
+            grupos, etiquetas = columna.cat.codes.to_numpy(), columna.cat.categories
+        else:
+            grupos, etiquetas = pd.factorize(columna, sort=True)
+        validas &= grupos >= 0
+        grupos = grupos[validas]
+        if w is not None:
+            w = poblacion[pesos].to_numpy(dtype=np.float64)[validas]
+
+    votos, totales, _ = agregar(modelo, codigos[validas], w, grupos, len(etiquetas))
+
+    resultado = pd.DataFrame(votos / np.maximum(totales, 1e-12)[:, None], columns=PARTIDOS,
+                             index=pd.Index(etiquetas, name=por))
+    resultado['Peso'] = totales
+    resultado['Perfiles'] = _perfiles_por_grupo(codigos[validas], grupos, len(etiquetas))
+    return resultado[totales > 0]
+
+
+def _perfiles_por_grupo(codigos, grupos, n_grupos):
+    if grupos is None:
+        return [len(np.unique(codigos))]
+    celdas = np.unique(np.asarray(grupos, dtype=np.int64) * N_PERFILES + codigos)
+    return np.bincount(celdas // N_PERFILES, minlength=n_grupos)
+
+
+def postestratificar(muestra, tabla_cruzada, peso='N'):
+    """
+    Pesos que hacen que la muestra reproduzca los totales de una tabla cruzada.
+
+    `tabla_cruzada` tiene una fila por celda (p. ej. CCAA × GRUPO_EDAD × SEXO)
+    con su población en la columna `peso`. Cada encuestado recibe el total
+    de su celda dividido entre los encuestados de esa celda, de modo que las
+    variables que no están en la tabla mantienen su distribución dentro de
+    cada celda. Los encuestados de celdas que no están en la tabla reciben
+    peso 0; la población de celdas sin encuestados no se puede repartir y
+    se pierde (ver `cobertura`).
+    """
+    variables = [c for c in tabla_cruzada.columns if c != peso]
+    faltan = [v for v in variables if v not in VARIABLES]
+    if faltan:
+        raise ValueError(f"Variables desconocidas en la tabla cruzada: {faltan}")
+
+    claves = pd.MultiIndex.from_frame(muestra[variables].astype(object))
+    totales = tabla_cruzada.groupby([tabla_cruzada[v].astype(object) for v in variables])[peso].sum()
+    encuestados = pd.Series(1, index=claves).groupby(level=list(range(len(variables)))).sum()
+
+    pesos = totales.reindex(claves).to_numpy(dtype=np.float64) / encuestados.reindex(claves).to_numpy()
+    return pd.Series(np.nan_to_num(pesos), index=muestra.index, name=peso)
+
+
+def cobertura(muestra, tabla_cruzada, peso='N'):
+    """Proporción de la población de la tabla cruzada que cae en celdas con encuestados"""
+    variables = [c for c in tabla_cruzada.columns if c != peso]
+    presentes = pd.MultiIndex.from_frame(muestra[variables].astype(object)).unique()
+    celdas = pd.MultiIndex.from_frame(tabla_cruzada[variables].astype(object))
+    total = tabla_cruzada[peso].sum()
+    return float(tabla_cruzada[peso][celdas.isin(presentes)].sum() / total) if total else 0.0
+
+
+def poblacion_barometros(meses=None):
+    """
+    Encuestados de los barómetros con las 8 variables válidas y su mes (columna MES).
+
+    A diferencia del dataset de entrenamiento, se conservan todos los
+    encuestados, voten a quien voten.
+    """
+    from ingesta import MESES, cargar_barometros
+    from recodificacion import recodificar
+
+    recodificado = recodificar(cargar_barometros(meses or MESES))
+    return recodificado.dropna(subset=list(VARIABLES))[list(VARIABLES) + ['MES']].reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    from prediccion import cargar_modelo
+
+    modelo = cargar_modelo()
+    poblacion = poblacion_barometros(sys.argv[1:] or None)
+
+    for por in (None, 'MES', 'CCAA'):
+        inicio = time.perf_counter()
+        resultado = estimar_voto(modelo, poblacion, por)
+        ms = (time.perf_counter() - inicio) * 1000
+        print(f"\n📊 Estimación por {por or 'total'} ({len(poblacion):,} encuestados, {ms:.0f} ms)")
+        print(resultado[PARTIDOS].map('{:.1%}'.format).to_string())
+
+    # Todos los perfiles posibles con el mismo peso
+    todos = np.arange(N_PERFILES)
+    inicio = time.perf_counter()
+    agregar(modelo, todos, grupos=np.unravel_index(todos, RADICES)[list(VARIABLES).index('CCAA')])
+    print(f"\n⚡ {N_PERFILES:,} perfiles agregados por CCAA en "
+          f"{(time.perf_counter() - inicio) * 1000:.0f} ms")
@@ -4,11 +4,29 @@ Aplicación Streamlit para predecir intención de voto mediante Machine Learning
 Basado en datos del CIS (Centro de Investigaciones Sociológicas)
 """
 
+import time
+
 import streamlit as st
 import pandas as pd
-from pycaret.classification import load_model, predict_model
-import plotly.express as px
-import plotly.graph_objects as go
+
+# PyCaret y Plotly se importan solo cuando hacen falta: el modelo se sirve
+# desde la tabla precalculada y el artefacto ligero, sin PyCaret
+from esquema import VARIABLES, PARTIDOS
+from ingesta import MESES, firma_barometros
+from prediccion import barrido
+import tabla_perfiles
+import inferencia
+import registro
+from codificador import CODIFICADOR
+from cache_predicciones import CachePredicciones
+import agregacion
+import bootstrap
+import explicacion
+from instrumentacion import LATENCIAS, PERFILADOR, medir
+
+# Duración de cada ejecución del script (rerun) y, si se ha solicitado, su perfil
+inicio_ejecucion = time.perf_counter()
+PERFILADOR.iniciar('app')
 
 # Configuración de la página
 st.set_page_config(
@@ -20,7 +38,8 @@ st.set_page_config(
 )
 
 # Forzar tema oscuro
-st.markdown("""
+with medir('app.css'):
+    st.markdown("""
     <style>
         /* Forzar modo oscuro */
         :root {
@@ -85,84 +104,120 @@ COLORES_PARTIDOS = {
     'VOX': '#73B446'      # Verde VOX
 }
 
-# Cargar datos limpios
-@st.cache_data
-def cargar_datos():
-    """Carga el dataset procesado para análisis (one-hot encoded)"""
+# Encuestados de los barómetros para la estimación agregada
+@st.cache_data(max_entries=4)
+def cargar_poblacion(meses, firma):
+    """Encuestados con las 8 variables válidas de los barómetros de `meses` (`firma`: versión de los .sav)"""
+    with medir('carga.poblacion'):
+        return agregacion.poblacion_barometros(list(meses))
+
+# Cargar el modelo (la huella forma parte de la clave de la caché)
+@st.cache_resource(max_entries=2)
+def cargar_modelo(huella):
+    """
+    Carga el modelo de predicción entrenado y el hash de los bytes cargados.
+
+    Si el .pkl se ha sustituido después de calcular `huella`, el hash
+    devuelto es el del modelo realmente cargado y no coincide con ella.
+    """
+    try:
+        with medir('carga.modelo'):
+            modelo, huella_cargada = tabla_perfiles.cargar_pipeline()
+        # Las columnas del codificador deben coincidir con las del entrenamiento
+        CODIFICADOR.validar(modelo)
+        return modelo, huella_cargada
+    except Exception as e:
+        st.error(f"❌ Error al cargar el modelo: {e}")
+        st.info("💡 Asegúrate de que el modelo esté guardado en 'models/modelo_prediccion_voto.pkl'")
+        return None, None
+
+# Cargar el artefacto ligero del modelo (se conservan las dos últimas versiones)
+@st.cache_resource(max_entries=2)
+def cargar_modelo_ligero(huella, ruta=inferencia.RUTA_MODELO_LIGERO):
+    """Carga el modelo ligero (sin PyCaret); lo exporta desde el .pkl si falta o está obsoleto"""
     try:
-        df = pd.read_csv('data/datos_limpios.csv')
-        return df
+        ligero = inferencia.cargar_modelo_ligero(ruta, huella)
+        # Las versiones del registro ya se publican con su artefacto
+        if ligero is None and ruta == inferencia.RUTA_MODELO_LIGERO:
+            modelo, huella_cargada = cargar_modelo(huella)
+            if modelo is None:
+                return None
+            # El artefacto se etiqueta con el hash de los bytes cargados; si
+            # el .pkl ha vuelto a cambiar, la siguiente ejecución usará la nueva huella
+            inferencia.exportar_modelo(inferencia.extraer_modelo(modelo), huella_cargada)
+            ligero = inferencia.cargar_modelo_ligero(huella=huella)
+        return ligero
     except Exception as e:
-        st.error(f"❌ Error al cargar datos: {e}")
+        st.error(f"❌ Error al cargar el modelo ligero: {e}")
         return None
 
-# Cargar el modelo
-@st.cache_resource
-def cargar_modelo():
-    """Carga el modelo de predicción entrenado"""
+# Cargar la tabla de predicciones precalculadas (se conservan las dos últimas versiones)
+@st.cache_resource(max_entries=2)
+def cargar_tabla(huella, ruta=tabla_perfiles.RUTA_TABLA, ruta_ligero=inferencia.RUTA_MODELO_LIGERO):
+    """Abre la tabla de predicciones del modelo con hash `huella` (la reconstruye si está obsoleta)"""
     try:
-        modelo = load_model('models/modelo_prediccion_voto')
-        return modelo
+        tabla = tabla_perfiles.cargar_tabla(ruta, huella)
+        if tabla is None:
+            ligero = cargar_modelo_ligero(huella, ruta_ligero)
+            if ligero is None:
+                return None
+            with st.spinner('Precalculando predicciones para todos los perfiles...'):
+                tabla_perfiles.construir_tabla(ligero, huella, ruta)
+            tabla = tabla_perfiles.cargar_tabla(ruta, huella)
+        return tabla
     except Exception as e:
-        st.error(f"❌ Error al cargar el modelo: {e}")
-        st.info("💡 Asegúrate de que el modelo esté guardado en 'models/modelo_prediccion_voto.pkl'")
+        st.error(f"❌ Error al cargar la tabla de predicciones: {e}")
         return None
 
-# Función auxiliar para crear dataframe de predicción
-def crear_dataframe_prediccion(grupo_edad, sexo, ccaa, tamuni, escideol, estudios, sitlab, participacion):
-    """Convierte los parámetros de entrada en un DataFrame para el modelo"""
-    return pd.DataFrame({
-        'ESCIDEOL': [escideol],
-        # GRUPO_EDAD
-        'GRUPO_EDAD_30-39': [1 if grupo_edad == '30-39' else 0],
-        'GRUPO_EDAD_40-49': [1 if grupo_edad == '40-49' else 0],
-        'GRUPO_EDAD_50-59': [1 if grupo_edad == '50-59' else 0],
-        'GRUPO_EDAD_60-69': [1 if grupo_edad == '60-69' else 0],
-        'GRUPO_EDAD_70+': [1 if grupo_edad == '70+' else 0],
-        # CCAA
-        'CCAA_Aragón': [1 if ccaa == 'Aragón' else 0],
-        'CCAA_Asturias': [1 if ccaa == 'Asturias' else 0],
-        'CCAA_Balears': [1 if ccaa == 'Balears' else 0],
-        'CCAA_Canarias': [1 if ccaa == 'Canarias' else 0],
-        'CCAA_Cantabria': [1 if ccaa == 'Cantabria' else 0],
-        'CCAA_Castilla y León': [1 if ccaa == 'Castilla y León' else 0],
-        'CCAA_Castilla-La Mancha': [1 if ccaa == 'Castilla-La Mancha' else 0],
-        'CCAA_Catalunya': [1 if ccaa == 'Catalunya' else 0],
-        'CCAA_Ceuta y Melilla': [1 if ccaa == 'Ceuta y Melilla' else 0],
-        'CCAA_Comunitat Valenciana': [1 if ccaa == 'Comunitat Valenciana' else 0],
-        'CCAA_Euskadi': [1 if ccaa == 'Euskadi' else 0],
-        'CCAA_Extremadura': [1 if ccaa == 'Extremadura' else 0],
-        'CCAA_Galicia': [1 if ccaa == 'Galicia' else 0],
-        'CCAA_La Rioja': [1 if ccaa == 'La Rioja' else 0],
-        'CCAA_Madrid': [1 if ccaa == 'Madrid' else 0],
-        'CCAA_Murcia': [1 if ccaa == 'Murcia' else 0],
-        'CCAA_Navarra': [1 if ccaa == 'Navarra' else 0],
-        # SEXO
-        'SEXO_Mujer': [1 if sexo == 'Mujer' else 0],
-        # TAMUNI
-        'TAMUNI_0-10000': [1 if tamuni == '0-10.000' else 0],
-        'TAMUNI_10.001-100.000': [1 if tamuni == '10.001-100.000' else 0],
-        'TAMUNI_>100.000': [1 if tamuni == '>100.000' else 0],
-        # PARTICIPACION
-        'PARTICIPACIONG_Sí': [1 if participacion == 'Sí' else 0],
-        # ESTUDIOS
-        'ESTUDIOS_Formación Profesional': [1 if estudios == 'Formación Profesional' else 0],
-        'ESTUDIOS_Secundaria': [1 if estudios == 'Secundaria' else 0],
-        'ESTUDIOS_Sin estudios o primaria': [1 if estudios == 'Sin estudios o primaria' else 0],
-        'ESTUDIOS_Superiores': [1 if estudios == 'Superiores' else 0],
-        # SITLAB
-        'SITLAB_En paro': [1 if sitlab == 'En paro' else 0],
-        'SITLAB_Otra situación': [1 if sitlab == 'Otra situación' else 0],
-        'SITLAB_Pensionista': [1 if sitlab == 'Pensionista' else 0],
-        'SITLAB_Trabaja': [1 if sitlab == 'Trabaja' else 0]
-    })
-
-modelo = cargar_modelo()
-df_datos = cargar_datos()
-
-if modelo is not None:
+# La versión en servicio se consulta en cada ejecución: cuando se publica una
+# nueva en el registro (actualizacion.py) los workers la cargan sin reiniciarse.
+# Sin registro, la tabla se indexa por el hash del .pkl y se reconstruye si cambia
+try:
+    fuente = registro.fuente_actual()
+except (OSError, ValueError, KeyError):
+    fuente = None
+
+with medir('app.cargar_tabla'):
+    tabla = cargar_tabla(fuente['huella'], fuente['ruta_tabla'], fuente['ruta_ligero']) if fuente is not None else None
+
+# Ensemble bootstrap para los intervalos de confianza (opcional: `python bootstrap.py`)
+@st.cache_resource(max_entries=2)
+def cargar_ensemble(huella, ruta=bootstrap.RUTA_BOOTSTRAP):
+    """Abre el ensemble bootstrap del modelo con hash `huella`, o None si no se ha entrenado"""
+    return bootstrap.cargar_bootstrap(ruta, huella)
+
+with medir('app.cargar_ensemble'):
+    ensemble = cargar_ensemble(fuente['huella']) if fuente is not None else None
+
+def mostrar_intervalos_opcion(key):
+    """Interruptor de los intervalos de confianza (solo si hay ensemble)"""
+    if ensemble is None:
+        return False
+    return st.toggle(f"Mostrar intervalos de confianza del {bootstrap.NIVEL:.0%} "
+                     f"({ensemble.n_modelos} modelos bootstrap)", key=key)
+
+# Explicaciones (valores de Shapley) del modelo en servicio, con los encuestados como fondo
+@st.cache_resource(max_entries=2)
+def cargar_explicador(huella, firma, _tabla):
+    """Explicador del modelo con hash `huella` y los encuestados de los barómetros (`firma`: versión de los .sav)"""
+    poblacion = cargar_poblacion(tuple(MESES), firma)
+    return explicacion.crear_explicador(_tabla, poblacion), poblacion
+
+# Caché de predicciones compartida por todas las sesiones del proceso
+@st.cache_resource
+def cargar_cache_predicciones():
+    """Crea la caché LRU de predicciones (tamaño: variable de entorno CACHE_PREDICCIONES)"""
+    return CachePredicciones()
+
+cache_predicciones = cargar_cache_predicciones()
+if fuente is not None:
+    # Se vacía sola si el modelo en servicio ha cambiado
+    cache_predicciones.vincular(fuente['huella'])
+
+if tabla is not None:
     # Crear pestañas
-    tab1, tab2 = st.tabs(["🔮 Predicción Individual", "📊 Análisis de Probabilidades"])
+    tab1, tab2, tab3, tab4 = st.tabs(["🔮 Predicción Individual", "📊 Análisis de Probabilidades",
+                                      "🗺️ Estimación Agregada", "🧭 ¿Por qué este partido?"])
     
     # ============================================================================
     # PESTAÑA 1: PREDICCIÓN INDIVIDUAL
@@ -235,13 +290,22 @@ if modelo is not None:
         
         st.markdown("---")
         
+        intervalos_tab1 = mostrar_intervalos_opcion("intervalos_tab1")
+        
         # Botón de predicción
         if st.button("🔮 Predecir Voto", type="primary", use_container_width=True):
-            nuevo_dato = crear_dataframe_prediccion(grupo_edad, sexo, ccaa, tamuni, escideol, estudios, sitlab, participacion)
+            with medir('tab1.perfil'):
+                # Diccionario: la caché lo busca por su tupla sin construir un DataFrame
+                nuevo_perfil = {
+                    'GRUPO_EDAD': grupo_edad, 'SEXO': sexo, 'CCAA': ccaa, 'TAMUNI': tamuni,
+                    'ESCIDEOL': escideol, 'ESTUDIOS': estudios, 'SITLAB': sitlab,
+                    'PARTICIPACIONG': participacion
+                }
             
             with st.spinner('Realizando predicción...'):
                 try:
-                    prediccion = predict_model(modelo, data=nuevo_dato)
+                    with medir('tab1.prediccion'):
+                        prediccion = cache_predicciones.predecir(tabla, [nuevo_perfil])
                     
                     st.success("✅ Predicción completada")
                     
@@ -250,8 +314,8 @@ if modelo is not None:
                     with res_col2:
                         st.markdown("### 🎯 Resultado de la Predicción")
                         
-                        voto_predicho = prediccion['prediction_label'].values[0]
-                        probabilidad = prediccion['prediction_score'].values[0]
+                        voto_predicho = prediccion['Partido'].values[0]
+                        probabilidad = float(prediccion['Probabilidad'].values[0])
                         
                     color_partido = COLORES_PARTIDOS.get(voto_predicho, '#1f77b4')
                     
@@ -264,15 +328,33 @@ if modelo is not None:
                     </div>
                     """, unsafe_allow_html=True)
                     
-                    st.markdown(f"""
-                    <style>
-                        .stProgress > div > div > div > div {{
-                            background-color: {color_partido};
-                        }}
-                    </style>
-                    """, unsafe_allow_html=True)
+                    with medir('tab1.css'):
+                        st.markdown(f"""
+                        <style>
+                            .stProgress > div > div > div > div {{
+                                background-color: {color_partido};
+                            }}
+                        </style>
+                        """, unsafe_allow_html=True)
                     st.progress(probabilidad)
                     
+                    if intervalos_tab1:
+                        with medir('tab1.intervalos'):
+                            intervalos = ensemble.intervalos(prediccion[list(VARIABLES)])
+                        st.markdown(f"#### 📏 Intervalos de confianza del {bootstrap.NIVEL:.0%}")
+                        df_intervalos = pd.DataFrame({
+                            'Partido': PARTIDOS,
+                            'Probabilidad': [float(prediccion[p].values[0]) for p in PARTIDOS],
+                            'Inferior': [float(intervalos[f'{p} inf'].values[0]) for p in PARTIDOS],
+                            'Superior': [float(intervalos[f'{p} sup'].values[0]) for p in PARTIDOS],
+                        })
+                        df_intervalos['Fuera del intervalo'] = ((df_intervalos['Probabilidad'] < df_intervalos['Inferior'])
+                                                                | (df_intervalos['Probabilidad'] > df_intervalos['Superior']))
+                        st.dataframe(df_intervalos.style.format({c: '{:.1%}' for c in ['Probabilidad', 'Inferior', 'Superior']}),
+                                     hide_index=True, use_container_width=True)
+                        st.caption("Rango de la probabilidad de cada partido entre modelos entrenados "
+                                   "con remuestras de los encuestados")
+                    
                     st.markdown("---")
                     st.info("""
                     **💡 Interpretación:**
@@ -317,106 +399,215 @@ if modelo is not None:
             base_participacion = st.selectbox("Participación base", ["Sí", "No"], key="base_participacion")
         
         st.markdown("### 🔍 Variable a Analizar")
+        # Variable a barrer y valores recorridos para cada opción del análisis
+        BARRIDOS = {
+            "Escala ideológica": ('ESCIDEOL', VARIABLES['ESCIDEOL']),
+            "Grupo de edad": ('GRUPO_EDAD', VARIABLES['GRUPO_EDAD']),
+            "Nivel de estudios": ('ESTUDIOS', VARIABLES['ESTUDIOS']),
+            "Situación laboral": ('SITLAB', VARIABLES['SITLAB']),
+            "CCAA": ('CCAA', ccaa_options[:10])
+        }
         variable_analizar = st.selectbox(
             "Selecciona la variable para ver cómo afecta la predicción:",
-            ["Escala ideológica", "Grupo de edad", "Nivel de estudios", "Situación laboral", "CCAA"]
+            list(BARRIDOS)
         )
         
+        intervalos_tab2 = mostrar_intervalos_opcion("intervalos_tab2")
+        
         if st.button("📈 Generar Análisis", type="primary"):
             with st.spinner("Generando análisis..."):
                 try:
-                    resultados = []
-                    
-                    if variable_analizar == "Escala ideológica":
-                        for ideol in range(1, 11):
-                            df_temp = crear_dataframe_prediccion(
-                                base_grupo_edad, base_sexo, base_ccaa, base_tamuni, 
-                                ideol, base_estudios, base_sitlab, base_participacion
-                            )
-                            pred = predict_model(modelo, data=df_temp)
-                            resultados.append({
-                                'Variable': ideol,
-                                'Partido': pred['prediction_label'].values[0],
-                                'Probabilidad': pred['prediction_score'].values[0]
-                            })
-                    
-                    elif variable_analizar == "Grupo de edad":
-                        grupos_edad = ['18-29', '30-39', '40-49', '50-59', '60-69', '70+']
-                        for grupo_temp in grupos_edad:
-                            df_temp = crear_dataframe_prediccion(
-                                grupo_temp, base_sexo, base_ccaa, base_tamuni, 
-                                5, base_estudios, base_sitlab, base_participacion
-                            )
-                            pred = predict_model(modelo, data=df_temp)
-                            resultados.append({
-                                'Variable': grupo_temp,
-                                'Partido': pred['prediction_label'].values[0],
-                                'Probabilidad': pred['prediction_score'].values[0]
-                            })
-                    
-                    elif variable_analizar == "Nivel de estudios":
-                        opciones = ['Sin estudios o primaria', 'Secundaria', 'Formación Profesional', 'Superiores']
-                        for est in opciones:
-                            df_temp = crear_dataframe_prediccion(
-                                base_grupo_edad, base_sexo, base_ccaa, base_tamuni, 
-                                5, est, base_sitlab, base_participacion
-                            )
-                            pred = predict_model(modelo, data=df_temp)
-                            resultados.append({
-                                'Variable': est,
-                                'Partido': pred['prediction_label'].values[0],
-                                'Probabilidad': pred['prediction_score'].values[0]
-                            })
-                    
-                    elif variable_analizar == "Situación laboral":
-                        opciones = ['Trabaja', 'En paro', 'Pensionista', 'Otra situación']
-                        for sit in opciones:
-                            df_temp = crear_dataframe_prediccion(
-                                base_grupo_edad, base_sexo, base_ccaa, base_tamuni, 
-                                5, base_estudios, sit, base_participacion
-                            )
-                            pred = predict_model(modelo, data=df_temp)
-                            resultados.append({
-                                'Variable': sit,
-                                'Partido': pred['prediction_label'].values[0],
-                                'Probabilidad': pred['prediction_score'].values[0]
-                            })
-                    
-                    elif variable_analizar == "CCAA":
-                        for ccaa_temp in ccaa_options[:10]:
-                            df_temp = crear_dataframe_prediccion(
-                                base_grupo_edad, base_sexo, ccaa_temp, base_tamuni, 
-                                5, base_estudios, base_sitlab, base_participacion
-                            )
-                            pred = predict_model(modelo, data=df_temp)
-                            resultados.append({
-                                'Variable': ccaa_temp,
-                                'Partido': pred['prediction_label'].values[0],
-                                'Probabilidad': pred['prediction_score'].values[0]
-                            })
+                    perfil_base = {
+                        'GRUPO_EDAD': base_grupo_edad, 'SEXO': base_sexo, 'CCAA': base_ccaa,
+                        'TAMUNI': base_tamuni, 'ESCIDEOL': 5, 'ESTUDIOS': base_estudios,
+                        'SITLAB': base_sitlab, 'PARTICIPACIONG': base_participacion
+                    }
+                    variable, valores = BARRIDOS[variable_analizar]
                     
-                    df_resultados = pd.DataFrame(resultados)
+                    # Todo el barrido se resuelve con una única consulta a la tabla
+                    with medir('tab2.barrido'):
+                        df_resultados = barrido(tabla, perfil_base, {variable: valores})
+                    columnas = ['Variable', 'Partido', 'Probabilidad']
+                    if intervalos_tab2:
+                        # Intervalos del partido predicho en todo el barrido, de una vez
+                        with medir('tab2.intervalos'):
+                            intervalos = ensemble.intervalos(df_resultados[list(VARIABLES)])
+                        partido = pd.Categorical(df_resultados['Partido'], categories=PARTIDOS).codes
+                        filas = range(len(df_resultados))
+                        for limite, sufijo in (('Inferior', 'inf'), ('Superior', 'sup')):
+                            limites = intervalos[[f'{p} {sufijo}' for p in PARTIDOS]].to_numpy()
+                            df_resultados[limite] = limites[filas, partido]
+                        # La predicción del modelo en servicio puede quedar fuera del intervalo de las réplicas
+                        df_resultados['Fuera del intervalo'] = ((df_resultados['Probabilidad'] < df_resultados['Inferior'])
+                                                                | (df_resultados['Probabilidad'] > df_resultados['Superior']))
+                        columnas += ['Inferior', 'Superior', 'Fuera del intervalo']
+                    df_resultados = df_resultados.rename(columns={variable: 'Variable'})
                     
-                    fig = px.bar(df_resultados, x='Variable', y='Probabilidad', color='Partido',
-                                title=f'Predicción según {variable_analizar}',
-                                labels={'Variable': variable_analizar, 'Probabilidad': 'Probabilidad (%)'},
-                                text='Probabilidad',
-                                color_discrete_map=COLORES_PARTIDOS)
+                    with medir('tab2.figura'):
+                        import plotly.express as px
+                        fig = px.bar(df_resultados, x='Variable', y='Probabilidad', color='Partido',
+                                    title=f'Predicción según {variable_analizar}',
+                                    labels={'Variable': variable_analizar, 'Probabilidad': 'Probabilidad (%)'},
+                                    text='Probabilidad',
+                                    color_discrete_map=COLORES_PARTIDOS)
                     
-                    fig.update_traces(texttemplate='%{text:.1%}', textposition='outside')
-                    fig.update_layout(height=500)
+                        fig.update_traces(texttemplate='%{text:.1%}', textposition='outside')
+                        if intervalos_tab2:
+                            # Cada intervalo se dibuja como un segmento propio entre sus límites
+                            import plotly.graph_objects as go
+                            segmentos_x, segmentos_y = [], []
+                            for x, inferior, superior in df_resultados[['Variable', 'Inferior', 'Superior']].itertuples(index=False):
+                                segmentos_x += [x, x, None]
+                                segmentos_y += [inferior, superior, None]
+                            fig.add_trace(go.Scatter(x=segmentos_x, y=segmentos_y, mode='lines+markers',
+                                                     name=f'Intervalo {bootstrap.NIVEL:.0%}',
+                                                     line=dict(color='black', width=2),
+                                                     marker=dict(symbol='line-ew-open', size=12, color='black')))
+                        fig.update_layout(height=500)
                     
-                    st.plotly_chart(fig, use_container_width=True)
+                    with medir('tab2.grafico'):
+                        st.plotly_chart(fig, use_container_width=True)
                     
                     st.markdown("### 📋 Resultados Detallados")
+                    df_resultados = df_resultados[columnas]
                     st.dataframe(
-                        df_resultados.style.format({'Probabilidad': '{:.1%}'}),
+                        df_resultados.style.format({c: '{:.1%}' for c in ['Probabilidad', 'Inferior', 'Superior']
+                                                    if c in columnas}),
                         use_container_width=True
                     )
+                    if intervalos_tab2 and df_resultados['Fuera del intervalo'].any():
+                        st.warning(f"⚠️ En {df_resultados['Fuera del intervalo'].sum()} valores la probabilidad del "
+                                   f"modelo en servicio queda fuera del intervalo de las réplicas bootstrap")
                     
                 except Exception as e:
                     st.error(f"❌ Error al generar análisis: {e}")
 
+    # ============================================================================
+    # PESTAÑA 3: ESTIMACIÓN AGREGADA
+    # ============================================================================
+    with tab3:
+        st.subheader("🗺️ Estimación de Voto de una Población")
+        st.markdown("Suma las probabilidades de voto de todos los encuestados de los barómetros "
+                    "(cada perfil distinto se puntúa una sola vez)")
+
+        agr_col1, agr_col2 = st.columns(2)
+        with agr_col1:
+            meses_agregados = st.multiselect("Barómetros", MESES, default=MESES, key="meses_agregados")
+        with agr_col2:
+            desglose = st.radio("Desglose", ["Total", "CCAA", "Mes"], horizontal=True, key="desglose")
+
+        tabla_cruzada = st.file_uploader(
+            "Tabla cruzada de población (opcional): CSV con columnas de las variables del modelo "
+            "(p. ej. CCAA, GRUPO_EDAD, SEXO) y la población de cada celda en la columna N",
+            type="csv", key="tabla_cruzada")
+
+        # Como en las demás pestañas, la estimación solo se calcula al pulsar el botón:
+        # Streamlit reejecuta el script con cualquier interacción, también de otras pestañas
+        if st.button("🗺️ Estimar Voto", type="primary", key="estimar"):
+            if not meses_agregados:
+                st.warning("Selecciona al menos un barómetro")
+            else:
+                with st.spinner("Calculando la estimación..."):
+                    try:
+                        with medir('tab3.poblacion'):
+                            poblacion = cargar_poblacion(tuple(meses_agregados), firma_barometros(meses_agregados))
+                        pesos = None
+                        if tabla_cruzada is not None:
+                            cruzada = pd.read_csv(tabla_cruzada)
+                            poblacion = poblacion.assign(N=agregacion.postestratificar(poblacion, cruzada).to_numpy())
+                            pesos = 'N'
+                            st.caption(f"Muestra reponderada a la tabla cruzada ({agregacion.cobertura(poblacion, cruzada):.1%} "
+                                       f"de su población cae en celdas con encuestados)")
+
+                        por = {'Total': None, 'CCAA': 'CCAA', 'Mes': 'MES'}[desglose]
+                        with medir('tab3.estimacion'):
+                            estimacion = agregacion.estimar_voto(tabla, poblacion, por, pesos)
+                        df_estimacion = estimacion[PARTIDOS].rename_axis('Grupo').reset_index().melt(
+                            id_vars='Grupo', var_name='Partido', value_name='Proporción')
+
+                        with medir('tab3.figura'):
+                            import plotly.express as px
+                            fig = px.bar(df_estimacion, x='Grupo', y='Proporción', color='Partido', barmode='group',
+                                         title=f'Estimación de voto ({len(poblacion):,} encuestados)',
+                                         labels={'Grupo': desglose, 'Proporción': 'Proporción (%)'},
+                                         color_discrete_map=COLORES_PARTIDOS)
+                            fig.update_layout(height=500, yaxis_tickformat='.0%')
+                        with medir('tab3.grafico'):
+                            st.plotly_chart(fig, use_container_width=True)
+
+                        st.dataframe(
+                            estimacion.style.format({**{p: '{:.1%}' for p in PARTIDOS}, 'Peso': '{:,.0f}'}),
+                            use_container_width=True
+                        )
+                    except Exception as e:
+                        st.error(f"❌ Error al calcular la estimación: {e}")
+
+    # ============================================================================
+    # PESTAÑA 4: EXPLICACIÓN DE LA PREDICCIÓN
+    # ============================================================================
+    with tab4:
+        st.subheader("🧭 ¿Por qué este partido?")
+        st.markdown("Contribución de cada variable del perfil configurado en **Predicción Individual** "
+                    "a la probabilidad de cada partido (valores de Shapley exactos frente a una muestra "
+                    "de encuestados reales)")
+
+        if st.button("🧭 Explicar Perfil", type="primary", key="explicar"):
+            try:
+                firma_datos = firma_barometros(MESES)
+                with medir('tab4.explicador'):
+                    explicador, poblacion_fondo = cargar_explicador(fuente['huella'], firma_datos, tabla)
+                perfil_explicado = pd.DataFrame([{
+                    'GRUPO_EDAD': grupo_edad, 'SEXO': sexo, 'CCAA': ccaa, 'TAMUNI': tamuni,
+                    'ESCIDEOL': escideol, 'ESTUDIOS': estudios, 'SITLAB': sitlab,
+                    'PARTICIPACIONG': participacion
+                }])
+                with medir('tab4.shapley'):
+                    contribuciones, base = explicador.explicar(perfil_explicado)
+                prediccion_explicada = base + contribuciones[PARTIDOS].sum()
+                partido_explicado = prediccion_explicada.idxmax()
+
+                st.markdown(f"### {partido_explicado}: {prediccion_explicada[partido_explicado]:.1%}")
+                st.caption(f"Probabilidad media de {partido_explicado} entre los encuestados: "
+                           f"{base[partido_explicado]:.1%}. Cada barra es lo que suma o resta una variable.")
+
+                with medir('tab4.figura'):
+                    import plotly.express as px
+                    df_contribuciones = contribuciones.assign(
+                        Etiqueta=contribuciones['Variable'] + ' = ' + contribuciones['Valor']
+                    ).sort_values(partido_explicado, key=abs)
+                    fig = px.bar(df_contribuciones, x=partido_explicado, y='Etiqueta', orientation='h',
+                                 title=f'Contribución de cada variable a la probabilidad de {partido_explicado}',
+                                 labels={partido_explicado: 'Contribución (puntos)', 'Etiqueta': ''},
+                                 color_discrete_sequence=[COLORES_PARTIDOS[partido_explicado]])
+                    fig.update_layout(height=450, xaxis_tickformat='+.0%')
+                st.plotly_chart(fig, use_container_width=True)
+
+                st.markdown("### 📋 Contribuciones a todos los partidos")
+                st.dataframe(contribuciones.style.format({p: '{:+.1%}' for p in PARTIDOS}),
+                             hide_index=True, use_container_width=True)
+
+                st.markdown("### 🌐 Importancia global de cada variable")
+                # El perfil ya se ha mostrado: el resumen global solo se calcula la primera vez
+                # para cada modelo y datos (unos segundos, con una barra de progreso); después
+                # se lee de models/explicaciones/
+                barra = st.progress(0.0, text="Calculando la importancia global (solo la primera vez)...")
+                with medir('tab4.resumen'):
+                    resumen = explicacion.cargar_resumen_global(
+                        explicador, fuente['huella'], poblacion_fondo,
+                        progreso=lambda hechos, total: barra.progress(
+                            hechos / total, text=f"Calculando la importancia global: {hechos:,} de {total:,} encuestados"))
+                barra.empty()
+                importancia = pd.DataFrame(resumen['importancia']).rename_axis('Variable').reset_index().melt(
+                    id_vars='Variable', var_name='Partido', value_name='Importancia')
+                fig = px.bar(importancia, x='Importancia', y='Variable', color='Partido', orientation='h',
+                             barmode='group', color_discrete_map=COLORES_PARTIDOS,
+                             labels={'Importancia': 'Contribución absoluta media (puntos)', 'Variable': ''})
+                fig.update_layout(height=500, xaxis_tickformat='.0%')
+                st.plotly_chart(fig, use_container_width=True)
+                st.caption(f"Calculada una vez para este modelo y estos datos sobre {resumen['perfiles']:,} encuestados")
+            except Exception as e:
+                st.error(f"❌ Error al explicar el perfil: {e}")
+
     # Sección de información
     st.markdown("---")
     with st.expander("ℹ️ Información sobre el modelo"):
@@ -444,6 +635,16 @@ if modelo is not None:
         - La precisión varía según el partido político
         """)
 
+    with st.expander("📈 Caché de predicciones"):
+        estadisticas = cache_predicciones.estadisticas()
+        cache_col1, cache_col2, cache_col3, cache_col4 = st.columns(4)
+        cache_col1.metric("Perfiles en caché", f"{estadisticas['perfiles']:,} / {estadisticas['capacidad']:,}")
+        cache_col2.metric("Tasa de aciertos", f"{estadisticas['tasa_aciertos']:.1%}")
+        cache_col3.metric("Aciertos / fallos", f"{estadisticas['aciertos']:,} / {estadisticas['fallos']:,}")
+        cache_col4.metric("Desalojos", f"{estadisticas['desalojos']:,}")
+        st.caption(f"Compartida por todas las sesiones de este proceso. Se ha vaciado "
+                   f"{estadisticas['vaciados']} veces por cambios del modelo.")
+
 else:
     st.error("❌ No se pudo cargar el modelo. Verifica que el archivo 'models/modelo_prediccion_voto.pkl' exista.")
     st.info("""
@@ -460,3 +661,19 @@ st.markdown("""
     Desarrollado por Rubén Díaz usando Streamlit y PyCaret | Datos: CIS 2025
 </div>
 """, unsafe_allow_html=True)
+
+LATENCIAS.registrar('app.ejecucion', time.perf_counter() - inicio_ejecucion)
+PERFILADOR.terminar()
+
+# Latencias por etapa (opcional: abrir la app con ?latencias=1)
+if st.query_params.get('latencias') == '1':
+    with st.sidebar:
+        st.subheader("⏱️ Latencias por etapa")
+        st.dataframe(pd.DataFrame.from_dict(LATENCIAS.resumen(), orient='index').round(2),
+                     use_container_width=True)
+        st.caption("Milisegundos, acumulados por todas las sesiones de este proceso")
+        if PERFILADOR.habilitado:
+            if st.button("🔬 Perfilar la siguiente ejecución"):
+                PERFILADOR.solicitar()
+            if PERFILADOR.ultimo:
+                st.caption(f"Último perfil: `{PERFILADOR.ultimo}.prof` (cProfile) y `.txt` (pilas plegadas)")
@@ -0,0 +1,72 @@
+"""
+Tiempo de importación y memoria (RSS) del arranque de un worker de la app.
+
+Cada escenario se ejecuta en un proceso Python nuevo, como un worker de
+Streamlit recién creado, y se mide el tiempo hasta tener el modelo listo
+para predecir y el pico de memoria residente del proceso.
+
+Uso (desde la raíz del proyecto):
+    python benchmarks/arranque.py [repeticiones]
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ESCENARIOS = {
+    'Antes: PyCaret + Plotly + load_model': """
+import streamlit, pandas
+from pycaret.classification import load_model, predict_model
+import plotly.express, plotly.graph_objects
+modelo = load_model('models/modelo_prediccion_voto', verbose=False)
+""",
+    'Después: tabla precalculada (app.py)': """
+import streamlit, pandas
+import prediccion, tabla_perfiles
+modelo = tabla_perfiles.cargar_tabla()
+assert modelo is not None
+""",
+    'Después: artefacto ligero (sin Streamlit)': """
+import pandas
+import prediccion, inferencia
+modelo = inferencia.cargar_modelo_ligero()
+assert modelo is not None
+""",
+}
+
+# Envoltorio que mide el escenario dentro del proceso hijo
+MEDICION = """
+import json, resource, sys, time, warnings
+warnings.filterwarnings('ignore')
+inicio = time.perf_counter()
+exec(compile({codigo!r}, 'escenario', 'exec'))
+segundos = time.perf_counter() - inicio
+modulos = len(sys.modules)
+rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps({{'segundos': segundos, 'rss_mb': rss_mb, 'modulos': modulos}}))
+"""
+
+
+def medir(codigo, repeticiones):
+    """Ejecuta el escenario `repeticiones` veces y devuelve las medianas"""
+    resultados = []
+    for _ in range(repeticiones):
+        salida = subprocess.run(
+            [sys.executable, '-c', MEDICION.format(codigo=codigo)],
+            cwd=RAIZ, capture_output=True, text=True, check=True,
+        ).stdout
+        resultados.append(json.loads(salida.strip().splitlines()[-1]))
+    return {clave: statistics.median(r[clave] for r in resultados) for clave in resultados[0]}
+
+
+if __name__ == '__main__':
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f"| Escenario | Arranque (s) | RSS máx. (MB) | Módulos cargados |")
+    print(f"|---|---:|---:|---:|")
+    for nombre, codigo in ESCENARIOS.items():
+        r = medir(codigo, repeticiones)
+        print(f"| {nombre} | {r['segundos']:.2f} | {r['rss_mb']:.0f} | {r['modulos']:.0f} |")
@@ -0,0 +1,83 @@
+"""
+Recodificación del notebook (`.map()` por variable + `.apply()` fila a fila)
+frente a `recodificacion.recodificar` sobre 1×, 10× y 100× los datos reales.
+
+Para cada tamaño se mide el mejor tiempo de varias repeticiones, el pico
+de memoria reservada durante la recodificación (tracemalloc) y la memoria
+del DataFrame resultante.
+
+Uso (desde la raíz del proyecto):
+    python benchmarks/recodificacion.py [factores...]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+import warnings
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingesta import COLUMNAS, cargar_barometros  # noqa: E402
+from recodificacion import RECODIFICACION, recodificar  # noqa: E402
+
+
+def crear_grupo_edad(edad):
+    if edad < 29:
+        return '18-29'
+    elif edad < 39:
+        return '30-39'
+    elif edad < 49:
+        return '40-49'
+    elif edad < 59:
+        return '50-59'
+    elif edad < 69:
+        return '60-69'
+    else:
+        return '70+'
+
+
+def recodificar_notebook(df_filtrado):
+    """Recodificación tal y como la hace el notebook: un `.map()` por variable y `.apply()` para la edad"""
+    df_filtrado = df_filtrado.copy()
+    for variable, mapeo in RECODIFICACION.items():
+        if variable == 'VOTOSIMG':
+            df_filtrado['VOTOSIMG'] = df_filtrado['VOTOSIMG'].map(mapeo)
+        else:
+            df_filtrado.loc[:, variable] = df_filtrado[variable].map(mapeo)
+    df_filtrado['GRUPO_EDAD'] = df_filtrado['EDAD'].apply(crear_grupo_edad)
+    return df_filtrado
+
+
+def medir(funcion, df, repeticiones):
+    """Mejor tiempo, pico de memoria (MB) y memoria del resultado (MB)"""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion(df)
+        tiempos.append(time.perf_counter() - inicio)
+
+    tracemalloc.start()
+    resultado = funcion(df)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(tiempos), pico / 2**20, resultado.memory_usage(deep=True).sum() / 2**20
+
+
+if __name__ == '__main__':
+    warnings.filterwarnings('ignore')
+    factores = [int(f) for f in sys.argv[1:]] or [1, 10, 100]
+    base = cargar_barometros()[COLUMNAS]
+
+    print("| Filas | Notebook (s) | Vectorizado (s) | Aceleración | Pico notebook (MB) | "
+          "Pico vectorizado (MB) | Resultado notebook (MB) | Resultado vectorizado (MB) |")
+    print("|---:|---:|---:|---:|---:|---:|---:|---:|")
+    for factor in factores:
+        df = pd.concat([base] * factor, ignore_index=True)
+        repeticiones = 3 if factor < 100 else 1
+        t_nb, pico_nb, mem_nb = medir(recodificar_notebook, df, repeticiones)
+        t_vec, pico_vec, mem_vec = medir(recodificar, df, repeticiones)
+        print(f"| {len(df):,} | {t_nb:.2f} | {t_vec:.3f} | {t_nb / t_vec:.0f}× | {pico_nb:.0f} | "
+              f"{pico_vec:.0f} | {mem_nb:.0f} | {mem_vec:.0f} |")
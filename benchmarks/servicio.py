@@ -0,0 +1,113 @@
+"""
+Prueba de carga local del servicio HTTP de predicción (`servicio.py`).
+
+Arranca el servicio en un proceso aparte, con y sin agrupación de
+peticiones, y lanza peticiones /predict de un perfil aleatorio con varios
+niveles de concurrencia. Para cada nivel se mide la latencia p50 y p99,
+el rendimiento (peticiones por segundo) y el tamaño medio de los lotes
+que ha puntuado el servicio.
+
+Uso (desde la raíz del proyecto):
+    python benchmarks/servicio.py [peticiones] [concurrencias...]
+"""
+
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+from tornado.httpclient import AsyncHTTPClient, HTTPClientError
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from esquema import VARIABLES  # noqa: E402
+
+PUERTO = 8765
+
+# Espera de agrupación (ms) de cada escenario
+ESCENARIOS = {
+    'Sin agrupar': 0,
+    'Agrupando 2 ms': 2,
+}
+
+
+def perfiles_aleatorios(n, semilla=0):
+    """Cuerpos JSON de `n` perfiles aleatorios"""
+    rng = np.random.default_rng(semilla)
+    cuerpos = []
+    for _ in range(n):
+        perfil = {variable: categorias[rng.integers(len(categorias))]
+                  for variable, categorias in VARIABLES.items()}
+        cuerpos.append(json.dumps(perfil, ensure_ascii=False))
+    return cuerpos
+
+
+async def esperar_servicio(url, intentos=100):
+    cliente = AsyncHTTPClient()
+    for _ in range(intentos):
+        try:
+            return json.loads((await cliente.fetch(url + '/salud')).body)
+        except (ConnectionError, HTTPClientError, OSError):
+            await asyncio.sleep(0.1)
+    raise RuntimeError("El servicio no ha arrancado")
+
+
+async def carga(url, cuerpos, concurrencia):
+    """Lanza todas las peticiones con `concurrencia` clientes a la vez; devuelve latencias y duración"""
+    cliente = AsyncHTTPClient(force_instance=True, max_clients=concurrencia)
+    cola = list(reversed(cuerpos))
+    latencias = []
+
+    async def trabajador():
+        while cola:
+            cuerpo = cola.pop()
+            inicio = time.perf_counter()
+            await cliente.fetch(url + '/predict', method='POST', body=cuerpo)
+            latencias.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabajador() for _ in range(concurrencia)))
+    duracion = time.perf_counter() - inicio
+    cliente.close()
+    return np.array(latencias), duracion
+
+
+async def medir(espera_ms, peticiones, concurrencias):
+    """Arranca el servicio con la espera indicada y mide cada nivel de concurrencia"""
+    url = f'http://localhost:{PUERTO}'
+    servicio = subprocess.Popen(
+        [sys.executable, 'servicio.py', '--puerto', str(PUERTO), '--espera-ms', str(espera_ms)],
+        cwd=RAIZ, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        await esperar_servicio(url)
+        cuerpos = perfiles_aleatorios(peticiones)
+        # Calentamiento
+        await carga(url, cuerpos[:200], 8)
+
+        resultados = []
+        for concurrencia in concurrencias:
+            antes = await esperar_servicio(url)
+            latencias, duracion = await carga(url, cuerpos, concurrencia)
+            despues = await esperar_servicio(url)
+            lote_medio = (despues['peticiones'] - antes['peticiones']) / (despues['lotes'] - antes['lotes'])
+            resultados.append((concurrencia, np.percentile(latencias, 50) * 1000,
+                               np.percentile(latencias, 99) * 1000, len(latencias) / duracion, lote_medio))
+        return resultados
+    finally:
+        servicio.terminate()
+        servicio.wait()
+
+
+if __name__ == '__main__':
+    peticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrencias = [int(c) for c in sys.argv[2:]] or [1, 8, 32, 128]
+
+    print("| Escenario | Concurrencia | p50 (ms) | p99 (ms) | Peticiones/s | Perfiles por lote |")
+    print("|---|---:|---:|---:|---:|---:|")
+    for nombre, espera_ms in ESCENARIOS.items():
+        for concurrencia, p50, p99, rendimiento, lote in asyncio.run(medir(espera_ms, peticiones, concurrencias)):
+            print(f"| {nombre} | {concurrencia} | {p50:.1f} | {p99:.1f} | {rendimiento:,.0f} | {lote:.1f} |")
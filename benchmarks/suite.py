@@ -0,0 +1,453 @@
+"""
+Suite de benchmarks reproducible del camino de datos y de predicción, sin Streamlit.
+
+Cubre la ingesta de los 11 .sav (en frío y desde la caché), la
+recodificación, la codificación de perfiles (`crear_dataframe_prediccion`),
+la predicción de un perfil y de lotes (tabla precalculada, artefacto ligero
+y `predict_model` si PyCaret está instalado), cada tipo de barrido de la
+pestaña de análisis y un escalado sintético a más de un millón de filas.
+
+Cada caso se ejecuta varias veces (tras una ejecución de calentamiento,
+salvo los casos en frío) y se guarda la mediana, el mínimo y el tiempo por
+elemento en un JSON junto con los metadatos del entorno (versiones, CPU,
+commit y huella del modelo). `comparar` contrasta dos resultados y marca
+los casos cuya mediana empeora más de un umbral; termina con código 1 si
+hay alguno, para poder usarlo en CI. Sin base explícita se compara con la
+línea base de referencia del repositorio (`benchmarks/linea_base.json`,
+con el entorno en el que se midió). Si la CPU, el número de núcleos,
+Python o las versiones de los paquetes no coinciden no se compara
+(termina con código 2), salvo con `--forzar`.
+
+Uso (desde la raíz del proyecto):
+    python benchmarks/suite.py ejecutar [--salida R.json] [--casos PREFIJO...] [--repeticiones N]
+    python benchmarks/suite.py comparar [base.json] R.json [--umbral 0.2] [--minimo-ms 0.5] [--forzar]
+"""
+
+import datetime
+import functools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from esquema import VARIABLES  # noqa: E402
+
+DIRECTORIO_RESULTADOS = os.path.join(RAIZ, 'benchmarks', 'resultados')
+
+# Línea base de referencia incluida en el repositorio
+RUTA_LINEA_BASE = os.path.join(RAIZ, 'benchmarks', 'linea_base.json')
+
+# Repeticiones medidas de cada caso (por defecto)
+REPETICIONES = 5
+
+# Filas del escalado sintético
+FILAS_ESCALA = 1_048_576
+
+# Perfiles de los lotes de predicción
+FILAS_LOTE = 10_000
+
+# Empeoramiento relativo de la mediana a partir del cual se marca un caso
+UMBRAL = 0.2
+
+# Diferencia absoluta mínima (ms) para marcarlo (evita el ruido de los casos de microsegundos)
+MINIMO_MS = 0.5
+
+PAQUETES = ('numpy', 'pandas', 'pyarrow', 'pyreadstat', 'scikit-learn', 'pycaret', 'streamlit')
+
+# Claves del entorno que deben coincidir para comparar dos resultados
+CLAVES_ENTORNO = ('procesador', 'nucleos', 'python', 'paquetes')
+
+# Perfil base de los barridos (el de la pestaña de análisis)
+PERFIL_BASE = {
+    'GRUPO_EDAD': '30-39', 'SEXO': 'Hombre', 'CCAA': 'Madrid', 'TAMUNI': '>100.000',
+    'ESCIDEOL': 5, 'ESTUDIOS': 'Superiores', 'SITLAB': 'Trabaja', 'PARTICIPACIONG': 'Sí',
+}
+
+# Barridos de la pestaña de análisis y el de dos variables
+BARRIDOS = {
+    'escideol': {'ESCIDEOL': None},
+    'grupo_edad': {'GRUPO_EDAD': None},
+    'estudios': {'ESTUDIOS': None},
+    'sitlab': {'SITLAB': None},
+    'ccaa': {'CCAA': VARIABLES['CCAA'][:10]},
+    'escideol_x_ccaa': {'ESCIDEOL': None, 'CCAA': None},
+}
+
+
+class Omitido(Exception):
+    """El caso no se puede ejecutar en este entorno (p. ej. falta PyCaret)"""
+
+
+class EntornoDistinto(Exception):
+    """Los resultados que se comparan se midieron en entornos distintos"""
+
+
+# {nombre: (preparar, calentar)}; `preparar()` devuelve (función a medir, elementos procesados)
+CASOS = {}
+
+
+def caso(nombre, calentar=True):
+    def registrar(preparar):
+        CASOS[nombre] = (preparar, calentar)
+        return preparar
+    return registrar
+
+
+# Datos compartidos por los casos (se preparan una sola vez y fuera de la medición)
+
+@functools.cache
+def brutos():
+    from ingesta import COLUMNAS, cargar_barometros
+    return cargar_barometros()[COLUMNAS + ['MES']]
+
+
+@functools.cache
+def poblacion():
+    from recodificacion import recodificar
+    return recodificar(brutos()).dropna(subset=list(VARIABLES))[list(VARIABLES) + ['MES']].reset_index(drop=True)
+
+
+@functools.cache
+def perfiles(n):
+    """`n` perfiles muestreados con reemplazo de los encuestados reales"""
+    indices = np.random.default_rng(0).integers(0, len(poblacion()), n)
+    return poblacion().iloc[indices].reset_index(drop=True)
+
+
+@functools.cache
+def tabla():
+    from prediccion import cargar_modelo
+    modelo = cargar_modelo()
+    if type(modelo).__name__ != 'TablaPerfiles':
+        raise Omitido("la tabla de perfiles del modelo actual no está construida")
+    return modelo
+
+
+@functools.cache
+def ligero():
+    from inferencia import cargar_modelo_ligero
+    from registro import fuente_actual
+    fuente = fuente_actual()
+    modelo = cargar_modelo_ligero(fuente['ruta_ligero'], fuente['huella'])
+    if modelo is None:
+        raise Omitido("no hay artefacto ligero del modelo actual")
+    return modelo
+
+
+@functools.cache
+def pipeline():
+    try:
+        from pycaret.classification import load_model
+    except ImportError:
+        raise Omitido("PyCaret no está instalado")
+    from tabla_perfiles import RUTA_MODELO
+    return load_model(RUTA_MODELO[:-len('.pkl')], verbose=False)
+
+
+# Casos
+
+@caso('ingesta.sav_en_frio', calentar=False)
+def _ingesta_en_frio():
+    from ingesta import MESES, cargar_barometros
+
+    def ingerir():
+        with tempfile.TemporaryDirectory() as cache:
+            cargar_barometros(cache=cache)
+    return ingerir, len(MESES)
+
+
+@caso('ingesta.cache')
+def _ingesta_cache():
+    from ingesta import MESES, cargar_barometros
+    return cargar_barometros, len(MESES)
+
+
+@caso('recodificacion.recodificar')
+def _recodificar():
+    from recodificacion import recodificar
+    datos = brutos()
+    return (lambda: recodificar(datos)), len(datos)
+
+
+@caso('recodificacion.compactar')
+def _compactar():
+    from datos import compactar_recodificado
+    from recodificacion import recodificar
+    recodificado = recodificar(brutos())
+    return (lambda: compactar_recodificado(recodificado)), len(recodificado)
+
+
+@caso('codificacion.crear_dataframe_prediccion')
+def _crear_dataframe_prediccion():
+    from prediccion import crear_dataframe_prediccion
+    valores = [PERFIL_BASE[v] for v in VARIABLES]
+    return (lambda: crear_dataframe_prediccion(*valores)), 1
+
+
+@caso('codificacion.codigos_1')
+def _codigos_uno():
+    from codificador import CODIFICADOR
+    perfil = perfiles(1)
+    return (lambda: CODIFICADOR.codigos(perfil)), 1
+
+
+@caso('codificacion.lote')
+def _codificar_lote():
+    from codificador import CODIFICADOR
+    lote = perfiles(FILAS_LOTE)
+    return (lambda: CODIFICADOR.transformar(lote)), FILAS_LOTE
+
+
+def _casos_prediccion(nombre, cargar):
+    from prediccion import predecir
+
+    @caso(f'prediccion.{nombre}_1')
+    def _uno():
+        modelo, perfil = cargar(), perfiles(1)
+        return (lambda: predecir(modelo, perfil)), 1
+
+    @caso(f'prediccion.{nombre}_lote')
+    def _lote():
+        modelo, lote = cargar(), perfiles(FILAS_LOTE)
+        return (lambda: predecir(modelo, lote)), FILAS_LOTE
+
+
+_casos_prediccion('tabla', tabla)
+_casos_prediccion('ligero', ligero)
+_casos_prediccion('predict_model', pipeline)
+
+
+def _caso_barrido(nombre, variables):
+    @caso(f'barrido.{nombre}')
+    def _barrido():
+        from prediccion import barrido
+        modelo = tabla()
+        n = len(barrido(modelo, PERFIL_BASE, variables))
+        return (lambda: barrido(modelo, PERFIL_BASE, variables)), n
+
+
+for _nombre, _variables in BARRIDOS.items():
+    _caso_barrido(_nombre, _variables)
+
+
+@caso('escala.recodificar')
+def _escala_recodificar():
+    from recodificacion import recodificar
+    datos = brutos()
+    datos = pd.concat([datos] * -(-FILAS_ESCALA // len(datos)), ignore_index=True)
+    return (lambda: recodificar(datos)), len(datos)
+
+
+@caso('escala.codificar')
+def _escala_codificar():
+    from codificador import CODIFICADOR
+    datos = perfiles(FILAS_ESCALA)
+    return (lambda: CODIFICADOR.codigos(datos)), FILAS_ESCALA
+
+
+@caso('escala.predecir_tabla')
+def _escala_predecir():
+    from prediccion import predecir
+    modelo, datos = tabla(), perfiles(FILAS_ESCALA)
+    return (lambda: predecir(modelo, datos)), FILAS_ESCALA
+
+
+@caso('escala.agregar_ccaa')
+def _escala_agregar():
+    from agregacion import estimar_voto
+    modelo, datos = tabla(), perfiles(FILAS_ESCALA)
+    return (lambda: estimar_voto(modelo, datos, 'CCAA')), FILAS_ESCALA
+
+
+def entorno():
+    """Metadatos del entorno en el que se ha medido"""
+    from importlib.metadata import PackageNotFoundError, version
+
+    def version_de(paquete):
+        try:
+            return version(paquete)
+        except PackageNotFoundError:
+            return None
+
+    def git(*argumentos):
+        try:
+            return subprocess.run(['git', *argumentos], cwd=RAIZ, capture_output=True,
+                                  text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    try:
+        from registro import fuente_actual
+        huella = fuente_actual()['huella']
+    except (OSError, ValueError, KeyError):
+        huella = None
+
+    return {
+        'fecha': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'procesador': platform.processor() or platform.machine(),
+        'nucleos': os.cpu_count(),
+        'paquetes': {p: version_de(p) for p in PAQUETES},
+        'commit': git('rev-parse', '--short', 'HEAD'),
+        'cambios_sin_commit': bool(git('status', '--porcelain', '--untracked-files=no')),
+        'huella_modelo': huella,
+    }
+
+
+def medir(preparar, calentar, repeticiones):
+    """Mediana, mínimo y tiempo por elemento de un caso"""
+    funcion, elementos = preparar()
+    if calentar:
+        funcion()
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    mediana = statistics.median(tiempos)
+    return {
+        'mediana_s': mediana,
+        'min_s': min(tiempos),
+        'repeticiones': repeticiones,
+        'elementos': elementos,
+        'us_por_elemento': mediana / max(elementos, 1) * 1e6,
+    }
+
+
+def ejecutar(prefijos=None, repeticiones=REPETICIONES):
+    """Ejecuta los casos (los que empiezan por alguno de `prefijos`) y devuelve el resultado"""
+    resultados = {}
+    for nombre, (preparar, calentar) in CASOS.items():
+        if prefijos and not any(nombre.startswith(p) for p in prefijos):
+            continue
+        try:
+            resultados[nombre] = medir(preparar, calentar, repeticiones)
+            r = resultados[nombre]
+            print(f"{nombre:<42}{r['mediana_s'] * 1000:>12.2f} ms{r['us_por_elemento']:>14.2f} µs/elem")
+        except Omitido as e:
+            resultados[nombre] = {'omitido': str(e)}
+            print(f"{nombre:<42}{'omitido':>15}  ({e})")
+    return {'entorno': entorno(), 'resultados': resultados}
+
+
+def diferencias_entorno(base, nuevo):
+    """Claves del entorno (CPU, núcleos, Python, paquetes) que difieren entre dos resultados"""
+    diferencias = []
+    for clave in CLAVES_ENTORNO:
+        antes, despues = base['entorno'].get(clave), nuevo['entorno'].get(clave)
+        if clave == 'paquetes':
+            antes, despues = antes or {}, despues or {}
+            diferencias += [f"{p}: {antes.get(p)} → {despues.get(p)}"
+                            for p in sorted(set(antes) | set(despues)) if antes.get(p) != despues.get(p)]
+        elif antes != despues:
+            diferencias.append(f"{clave}: {antes} → {despues}")
+    return diferencias
+
+
+def comparar(base, nuevo, umbral=UMBRAL, minimo_ms=MINIMO_MS, forzar=False):
+    """
+    Compara dos resultados de `ejecutar` e imprime una tabla.
+
+    Devuelve los casos en los que la mediana ha empeorado más de `umbral`
+    (en tanto por uno) y más de `minimo_ms` milisegundos. Lanza
+    EntornoDistinto si los entornos no coinciden (ver `diferencias_entorno`),
+    salvo con `forzar`.
+    """
+    diferencias = diferencias_entorno(base, nuevo)
+    if diferencias and not forzar:
+        raise EntornoDistinto(diferencias)
+    for diferencia in diferencias:
+        print(f"⚠️ Entorno distinto ({diferencia}): la comparación puede no ser fiable")
+
+    empeorados = []
+    print("| Caso | Base (ms) | Nuevo (ms) | Cambio | |")
+    print("|---|---:|---:|---:|---|")
+    for nombre in sorted(set(base['resultados']) | set(nuevo['resultados'])):
+        antes = base['resultados'].get(nombre, {}).get('mediana_s')
+        despues = nuevo['resultados'].get(nombre, {}).get('mediana_s')
+        if antes is None or despues is None:
+            print(f"| {nombre} | {_ms(antes)} | {_ms(despues)} | | sin comparar |")
+            continue
+        cambio = despues / antes - 1
+        marca = ''
+        if cambio > umbral and (despues - antes) * 1000 > minimo_ms:
+            empeorados.append(nombre)
+            marca = '🔴 más lento'
+        elif cambio < -umbral and (antes - despues) * 1000 > minimo_ms:
+            marca = '🟢 más rápido'
+        print(f"| {nombre} | {_ms(antes)} | {_ms(despues)} | {cambio:+.0%} | {marca} |")
+    return empeorados
+
+
+def _ms(segundos):
+    return '—' if segundos is None else f'{segundos * 1000:.2f}'
+
+
+if __name__ == '__main__':
+    import argparse
+
+    warnings.filterwarnings('ignore')
+    os.chdir(RAIZ)
+
+    parser = argparse.ArgumentParser(description="Benchmarks de ingesta, codificación, inferencia y barridos")
+    ordenes = parser.add_subparsers(dest='orden', required=True)
+    p_ejecutar = ordenes.add_parser('ejecutar', help="ejecuta los casos y guarda el resultado en JSON")
+    p_ejecutar.add_argument('--salida', help="fichero JSON (por defecto, benchmarks/resultados/<fecha>-<commit>.json)")
+    p_ejecutar.add_argument('--casos', nargs='*', help="prefijos de los casos a ejecutar (p. ej. barrido escala)")
+    p_ejecutar.add_argument('--repeticiones', type=int, default=REPETICIONES)
+    p_comparar = ordenes.add_parser('comparar', help="compara un resultado con una línea base")
+    p_comparar.add_argument('ficheros', nargs='+', metavar='[base] nuevo',
+                            help="resultados a comparar (sin base, benchmarks/linea_base.json)")
+    p_comparar.add_argument('--umbral', type=float, default=UMBRAL,
+                            help="empeoramiento relativo de la mediana que se marca (0.2 = 20 %%)")
+    p_comparar.add_argument('--minimo-ms', type=float, default=MINIMO_MS,
+                            help="diferencia absoluta mínima para marcar un caso")
+    p_comparar.add_argument('--forzar', action='store_true',
+                            help="comparar aunque la CPU, los núcleos, Python o los paquetes sean distintos")
+    args = parser.parse_args()
+
+    if args.orden == 'ejecutar':
+        resultado = ejecutar(args.casos, args.repeticiones)
+        salida = args.salida
+        if salida is None:
+            os.makedirs(DIRECTORIO_RESULTADOS, exist_ok=True)
+            fecha = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+            salida = os.path.join(DIRECTORIO_RESULTADOS, f"{fecha}-{resultado['entorno']['commit'] or 'sin-git'}.json")
+        with open(salida, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+        print(f"✅ Resultados guardados en {salida}")
+    else:
+        if len(args.ficheros) > 2:
+            parser.error("comparar admite como mucho dos ficheros: [base] nuevo")
+        ruta_base, ruta_nuevo = ([RUTA_LINEA_BASE] + args.ficheros)[-2:]
+        with open(ruta_base, encoding='utf-8') as f:
+            base = json.load(f)
+        with open(ruta_nuevo, encoding='utf-8') as f:
+            nuevo = json.load(f)
+        print(f"Línea base: {os.path.relpath(ruta_base, RAIZ)} ({base['entorno'].get('fecha')}, "
+              f"commit {base['entorno'].get('commit')}, {base['entorno'].get('procesador')}, "
+              f"{base['entorno'].get('nucleos')} núcleos)")
+        try:
+            empeorados = comparar(base, nuevo, args.umbral, args.minimo_ms, args.forzar)
+        except EntornoDistinto as e:
+            print("❌ No se compara: los resultados se midieron en entornos distintos "
+                  "(genera la línea base en este entorno o usa --forzar)")
+            for diferencia in e.args[0]:
+                print(f"   {diferencia}")
+            sys.exit(2)
+        if empeorados:
+            print(f"🔴 {len(empeorados)} casos más lentos que la línea base: {', '.join(empeorados)}")
+            sys.exit(1)
+        print("✅ Ningún caso más lento que la línea base")
@@ -0,0 +1,201 @@
+"""
+Intervalos de confianza de las predicciones por bootstrap.
+
+La probabilidad que muestra la app es la de un único modelo y no dice
+cuánto podría cambiar si se hubiera entrenado con otra muestra de
+encuestados. Este módulo entrena `N_MODELOS` réplicas del estimador en
+servicio (mismos hiperparámetros y mismo preprocesado) sobre remuestras
+con reemplazo del dataset limpio, en paralelo con joblib.
+
+Como el espacio de perfiles es finito, de cada réplica solo se guarda su
+tabla de probabilidades (ver `tabla_perfiles`): todas juntas forman un
+único array (réplicas, perfiles, partidos) en float16 que se abre con
+memory-map, de modo que los workers comparten las mismas páginas y cargar
+el ensemble no multiplica la memoria por el número de modelos. Los
+intervalos de un perfil o de un barrido completo se obtienen con una sola
+indexación del array y un percentil sobre el eje de las réplicas.
+
+El ensemble guarda la huella del modelo del que se derivó y solo se usa
+mientras ese modelo siga en servicio.
+
+Uso:
+    python bootstrap.py [--modelos B] [--procesos N]
+"""
+
+import datetime
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from codificador import CODIFICADOR
+from esquema import VARIABLES, PARTIDOS
+from tabla_perfiles import RADICES, N_PERFILES, TAMANO_LOTE
+
+RUTA_BOOTSTRAP = 'models/bootstrap'
+
+# Réplicas del ensemble (por defecto)
+N_MODELOS = 30
+
+# Nivel de los intervalos de confianza
+NIVEL = 0.9
+
+SEMILLA = 123
+
+
+def modelo_base(fuente=None):
+    """`ModeloLigero` con el estimador de scikit-learn del modelo en servicio"""
+    import registro
+
+    if fuente is None:
+        fuente = registro.fuente_actual()
+    if fuente['version'] is not None:
+        return registro.cargar_version(fuente['version'])
+
+    from inferencia import extraer_modelo
+    from tabla_perfiles import cargar_pipeline
+
+    pipeline, huella = cargar_pipeline()
+    # El ensemble se etiqueta con la huella de `fuente`: debe ser la del pipeline cargado
+    if huella != fuente['huella']:
+        raise ValueError("El modelo ha cambiado mientras se cargaba; vuelve a intentarlo")
+    return extraer_modelo(pipeline)
+
+
+def _replica(ligero, X, y, semilla):
+    """Ajusta el estimador sobre una remuestra con reemplazo y puntúa todos los perfiles"""
+    from sklearn.base import clone
+
+    filas = np.random.default_rng(semilla).integers(0, len(X), len(X))
+    estimador = clone(ligero.estimador).fit(X[filas], y[filas])
+
+    probabilidades = np.empty((N_PERFILES, len(PARTIDOS)), dtype=np.float16)
+    for inicio in range(0, N_PERFILES, TAMANO_LOTE):
+        codigos = np.arange(inicio, min(inicio + TAMANO_LOTE, N_PERFILES))
+        matriz = CODIFICADOR.transformar_codigos(np.stack(np.unravel_index(codigos, RADICES), axis=1))
+        probabilidades[codigos] = estimador.predict_proba(ligero.preprocesar(matriz))
+    return probabilidades
+
+
+def entrenar_bootstrap(datos, n_modelos=N_MODELOS, procesos=-1, fuente=None, ruta=RUTA_BOOTSTRAP):
+    """
+    Entrena el ensemble sobre `datos` (formato compacto de `datos.py`) y lo guarda en `ruta`.
+
+    Las réplicas se entrenan en paralelo y cada una se escribe en el array
+    en cuanto termina. El ensemble se escribe en un directorio temporal y
+    se mueve a su sitio al terminar.
+    """
+    from joblib import Parallel, delayed
+
+    from actualizacion import matriz
+    import registro
+
+    if fuente is None:
+        fuente = registro.fuente_actual()
+    ligero = modelo_base(fuente)
+    X, y = matriz(ligero, datos)
+
+    ruta_tmp = ruta + '.tmp'
+    shutil.rmtree(ruta_tmp, ignore_errors=True)
+    os.makedirs(ruta_tmp)
+    probabilidades = np.lib.format.open_memmap(
+        os.path.join(ruta_tmp, 'probabilidades.npy'), mode='w+',
+        dtype=np.float16, shape=(n_modelos, N_PERFILES, len(PARTIDOS)))
+
+    tareas = (delayed(_replica)(ligero, X, y, SEMILLA + b) for b in range(n_modelos))
+    for b, replica in enumerate(Parallel(n_jobs=procesos, return_as='generator')(tareas)):
+        probabilidades[b] = replica
+    probabilidades.flush()
+    del probabilidades
+
+    with open(os.path.join(ruta_tmp, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({
+            'hash_modelo': fuente['huella'],
+            'version': fuente['version'],
+            'n_modelos': n_modelos,
+            'filas': len(datos),
+            'semilla': SEMILLA,
+            'partidos': PARTIDOS,
+            'variables': VARIABLES,
+            'creado': datetime.datetime.now().isoformat(timespec='seconds'),
+        }, f, ensure_ascii=False, indent=2)
+
+    shutil.rmtree(ruta, ignore_errors=True)
+    os.replace(ruta_tmp, ruta)
+
+
+class EnsembleBootstrap:
+    """Probabilidades de todas las réplicas para todos los perfiles, servidas con memory-map"""
+
+    def __init__(self, ruta=RUTA_BOOTSTRAP):
+        with open(os.path.join(ruta, 'meta.json'), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        if self.meta['variables'] != VARIABLES or self.meta['partidos'] != PARTIDOS:
+            raise ValueError("El ensemble no corresponde al esquema actual")
+        self.huella = self.meta['hash_modelo']
+        self.probabilidades = np.load(os.path.join(ruta, 'probabilidades.npy'), mmap_mode='r')
+        self.n_modelos = len(self.probabilidades)
+
+    def intervalos_codigos(self, codigos, nivel=NIVEL):
+        """
+        Límites inferior y superior (N, partidos) de una matriz de códigos (`CodificadorOneHot.codigos`).
+
+        Las réplicas de todos los perfiles se reúnen en un único array
+        (réplicas, N, partidos) y los percentiles se calculan de una vez.
+        """
+        indices = np.ravel_multi_index(np.asarray(codigos).T, RADICES)
+        replicas = self.probabilidades[:, indices].astype(np.float32)
+        alfa = (1 - nivel) / 2 * 100
+        inferior, superior = np.percentile(replicas, [alfa, 100 - alfa], axis=0)
+        return inferior, superior
+
+    def intervalos(self, perfiles, nivel=NIVEL):
+        """
+        Intervalo de la probabilidad de cada partido para cada perfil.
+
+        Devuelve un DataFrame alineado con `perfiles` (sin su índice) con
+        las columnas '<partido> inf' y '<partido> sup'. Se combina con la
+        salida de `prediccion.predecir` o `prediccion.barrido`.
+        """
+        inferior, superior = self.intervalos_codigos(CODIFICADOR.codigos(perfiles), nivel)
+        columnas = {}
+        for i, partido in enumerate(PARTIDOS):
+            columnas[f'{partido} inf'] = inferior[:, i]
+            columnas[f'{partido} sup'] = superior[:, i]
+        return pd.DataFrame(columnas)
+
+
+def cargar_bootstrap(ruta=RUTA_BOOTSTRAP, huella=None):
+    """
+    Abre el ensemble si existe y se derivó del modelo con hash `huella`.
+
+    Devuelve None si no existe o corresponde a otro modelo.
+    """
+    if huella is None:
+        from registro import fuente_actual
+        huella = fuente_actual()['huella']
+    try:
+        ensemble = EnsembleBootstrap(ruta)
+    except (OSError, ValueError, KeyError):
+        return None
+    return ensemble if ensemble.huella == huella else None
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    from datos import cargar_datos
+
+    parser = argparse.ArgumentParser(description="Entrena el ensemble bootstrap del modelo en servicio")
+    parser.add_argument('--modelos', type=int, default=N_MODELOS, help="réplicas del ensemble")
+    parser.add_argument('--procesos', type=int, default=-1, help="procesos (por defecto, todos los núcleos)")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    entrenar_bootstrap(cargar_datos(), args.modelos, args.procesos)
+    tamano = os.path.getsize(os.path.join(RUTA_BOOTSTRAP, 'probabilidades.npy')) / 2**20
+    print(f"✅ Ensemble de {args.modelos} modelos guardado en {RUTA_BOOTSTRAP} "
+          f"({tamano:.0f} MB, {time.perf_counter() - inicio:.0f} s)")
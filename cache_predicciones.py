@@ -0,0 +1,116 @@
+"""
+Caché LRU de predicciones por perfil, compartida por todas las sesiones.
+
+Muchos usuarios envían los mismos perfiles (los valores por defecto de los
+selectores, ESCIDEOL=5...). La app guarda una única `CachePredicciones`
+por proceso (`st.cache_resource`) indexada por la tupla de las 8
+variables en el orden de `esquema.VARIABLES`. Tiene un número máximo de
+perfiles (`CAPACIDAD`, configurable con la variable de entorno
+`CACHE_PREDICCIONES`) y, al llenarse, desaloja el usado hace más tiempo.
+Se vacía sola cuando cambia la huella del modelo en servicio y lleva la
+cuenta de aciertos, fallos y desalojos para poder dimensionarla.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from esquema import VARIABLES, PARTIDOS
+
+# Perfiles guardados como máximo (por defecto)
+CAPACIDAD = int(os.environ.get('CACHE_PREDICCIONES', 4096))
+
+# Columnas de la predicción que se guardan por perfil
+COLUMNAS = ['Partido'] + PARTIDOS + ['Probabilidad']
+
+
+class CachePredicciones:
+    """Caché LRU de predicciones por perfil, segura entre hilos (sesiones de Streamlit)"""
+
+    def __init__(self, capacidad=CAPACIDAD):
+        self.capacidad = capacidad
+        self.huella = None
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self.vaciados = 0
+        self._datos = OrderedDict()
+        self._cerrojo = threading.Lock()
+
+    def vincular(self, huella):
+        """Asocia la caché al modelo con hash `huella`; si es otro modelo, la vacía"""
+        with self._cerrojo:
+            if huella != self.huella:
+                if self._datos:
+                    self.vaciados += 1
+                self._datos.clear()
+                self.huella = huella
+
+    def predecir(self, modelo, perfiles):
+        """
+        Devuelve las predicciones de los perfiles con el mismo formato que `prediccion.predecir`.
+
+        `perfiles` es un DataFrame o una lista de diccionarios {variable: valor}.
+        La caché se consulta con la tupla de cada perfil antes de construir
+        ningún DataFrame ni codificar nada: solo los perfiles que faltan se
+        puntúan, juntos en una llamada a `prediccion.predecir`, y se añaden
+        a la caché si el modelo no ha cambiado mientras tanto.
+        """
+        from prediccion import predecir
+
+        variables = list(VARIABLES)
+        if isinstance(perfiles, pd.DataFrame):
+            claves = list(perfiles[variables].itertuples(index=False, name=None))
+        else:
+            claves = [tuple(perfil[v] for v in variables) for perfil in perfiles]
+
+        filas = [None] * len(claves)
+        with self._cerrojo:
+            huella = self.huella
+            for i, clave in enumerate(claves):
+                fila = self._datos.get(clave)
+                if fila is not None:
+                    self._datos.move_to_end(clave)
+                    filas[i] = fila
+            faltan = [i for i, fila in enumerate(filas) if fila is None]
+            self.aciertos += len(claves) - len(faltan)
+            self.fallos += len(faltan)
+
+        if faltan:
+            pendientes = pd.DataFrame([claves[i] for i in faltan], columns=variables)
+            # Filas NumPy con los tipos de la predicción (float32 en la tabla de perfiles)
+            nuevas = predecir(modelo, pendientes)[COLUMNAS].to_records(index=False)
+            with self._cerrojo:
+                # Si el modelo cambió durante la predicción no se guarda nada
+                guardar = self.huella == huella
+                for i, fila in zip(faltan, nuevas):
+                    filas[i] = fila
+                    if guardar:
+                        self._datos[claves[i]] = fila
+                        self._datos.move_to_end(claves[i])
+                while len(self._datos) > self.capacidad:
+                    self._datos.popitem(last=False)
+                    self.desalojos += 1
+
+        columnas = dict(zip(variables, zip(*claves))) if claves else {v: [] for v in variables}
+        if filas:
+            registros = np.array(filas, dtype=filas[0].dtype)
+            columnas.update((columna, registros[columna]) for columna in COLUMNAS)
+        return pd.DataFrame(columnas, columns=variables + COLUMNAS)
+
+    def estadisticas(self):
+        """Contadores de uso de la caché"""
+        with self._cerrojo:
+            consultas = self.aciertos + self.fallos
+            return {
+                'perfiles': len(self._datos),
+                'capacidad': self.capacidad,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'desalojos': self.desalojos,
+                'vaciados': self.vaciados,
+                'tasa_aciertos': self.aciertos / consultas if consultas else 0.0,
+            }
@@ -0,0 +1,141 @@
+"""
+Codificador one-hot de perfiles sociodemográficos.
+
+Reproduce el esquema de `pd.get_dummies(X, drop_first=True)` del notebook
+a partir de `esquema.py`, sin depender de los datos: las categorías de
+cada variable se convierten en códigos enteros y los lotes de perfiles se
+escriben de una vez en un buffer NumPy preasignado con las columnas en el
+orden exacto del entrenamiento.
+"""
+
+import numpy as np
+import pandas as pd
+
+from esquema import VARIABLES, NUMERICAS, ORDEN_ENTRENAMIENTO, OBJETIVO
+
+# Hasta este número de perfiles los códigos se buscan en un diccionario
+# (más rápido que `pd.Index.get_indexer` para lotes pequeños)
+FILAS_DICCIONARIO = 64
+
+
+class CodificadorOneHot:
+    """Convierte perfiles (una fila por perfil) en la matriz one-hot del modelo"""
+
+    def __init__(self):
+        # Las variables numéricas van primero, como en pd.get_dummies
+        self.columnas = [v for v in ORDEN_ENTRENAMIENTO if v in NUMERICAS]
+
+        # Variables numéricas: (columna, valor de cada categoría)
+        self._numericas = {
+            v: (self.columnas.index(v), np.asarray(VARIABLES[v], dtype=np.float64))
+            for v in NUMERICAS
+        }
+
+        # Variables categóricas: columna de cada categoría (-1 = categoría de referencia)
+        self._destinos = {}
+        for variable in ORDEN_ENTRENAMIENTO:
+            if variable in NUMERICAS:
+                continue
+            categorias = VARIABLES[variable]
+            destino = np.full(len(categorias), -1, dtype=np.intp)
+            for categoria in sorted(categorias)[1:]:
+                destino[categorias.index(categoria)] = len(self.columnas)
+                self.columnas.append(f'{variable}_{categoria}')
+            self._destinos[variable] = destino
+
+        # Código de cada categoría, para no reconstruir un Categorical en cada llamada:
+        # un diccionario para los lotes pequeños y un índice para los grandes
+        self._mapas = {v: {c: i for i, c in enumerate(categorias)} for v, categorias in VARIABLES.items()}
+        self._indices = {v: pd.Index(categorias) for v, categorias in VARIABLES.items()}
+
+    def codigos(self, perfiles, validar=True):
+        """
+        Devuelve la matriz (N, 8) con el código de cada variable (orden de `esquema.VARIABLES`).
+
+        Con `validar=False` los valores no válidos o faltantes se marcan con
+        -1 en lugar de lanzar un error.
+        """
+        codigos = np.empty((len(perfiles), len(VARIABLES)), dtype=np.int8)
+        pequeno = len(perfiles) <= FILAS_DICCIONARIO
+        for j, variable in enumerate(VARIABLES):
+            if pequeno:
+                mapa = self._mapas[variable]
+                codigos_variable = np.fromiter((mapa.get(v, -1) for v in perfiles[variable].tolist()),
+                                               dtype=np.int8, count=len(perfiles))
+            else:
+                codigos_variable = self._indices[variable].get_indexer(perfiles[variable])
+            if validar and (codigos_variable < 0).any():
+                raise ValueError(f"Valor no válido en la variable {variable}")
+            codigos[:, j] = codigos_variable
+        return codigos
+
+    def transformar_codigos(self, codigos, salida=None, dtype=np.float64):
+        """
+        Escribe la matriz one-hot de una matriz de códigos.
+
+        Si se pasa `salida` (un buffer de al menos N filas) se reutiliza en
+        lugar de reservar memoria nueva; se devuelve la vista de N filas.
+        """
+        n = len(codigos)
+        if salida is None:
+            salida = np.empty((n, len(self.columnas)), dtype=dtype)
+        else:
+            salida = salida[:n]
+        salida[:] = 0
+
+        filas = np.arange(n)
+        for j, variable in enumerate(VARIABLES):
+            if variable in self._numericas:
+                columna, valores = self._numericas[variable]
+                salida[:, columna] = valores[codigos[:, j]]
+            else:
+                destino = self._destinos[variable][codigos[:, j]]
+                marcadas = destino >= 0
+                salida[filas[marcadas], destino[marcadas]] = 1
+        return salida
+
+    def transformar(self, perfiles, salida=None, dtype=np.float64):
+        """Devuelve la matriz one-hot (N, columnas) de un DataFrame de perfiles"""
+        return self.transformar_codigos(self.codigos(perfiles), salida=salida, dtype=dtype)
+
+    def invertir(self, matriz):
+        """
+        Recupera la matriz (N, 8) de códigos a partir de una matriz one-hot.
+
+        Las filas sin ningún dummy activo de una variable toman su categoría
+        de referencia.
+        """
+        matriz = np.asarray(matriz)
+        codigos = np.empty((len(matriz), len(VARIABLES)), dtype=np.int8)
+        for j, variable in enumerate(VARIABLES):
+            if variable in self._numericas:
+                columna, valores = self._numericas[variable]
+                posiciones = np.searchsorted(valores, matriz[:, columna])
+                codigos[:, j] = np.minimum(posiciones, len(valores) - 1)
+                if not np.array_equal(valores[codigos[:, j]], matriz[:, columna]):
+                    raise ValueError(f"Valor no válido en la variable {variable}")
+            else:
+                destino = self._destinos[variable]
+                codigos[:, j] = np.flatnonzero(destino < 0)[0]
+                for categoria in np.flatnonzero(destino >= 0):
+                    codigos[matriz[:, destino[categoria]] != 0, j] = categoria
+        return codigos
+
+    def dataframe(self, perfiles):
+        """Devuelve la matriz one-hot como DataFrame con los nombres de columna del entrenamiento"""
+        return pd.DataFrame(self.transformar(perfiles), columns=self.columnas)
+
+    def validar(self, modelo):
+        """Comprueba que las columnas coinciden (nombre y orden) con las del pipeline entrenado"""
+        esperadas = [c for c in modelo.feature_names_in_ if c != OBJETIVO]
+        if esperadas != self.columnas:
+            faltan = [c for c in esperadas if c not in self.columnas]
+            sobran = [c for c in self.columnas if c not in esperadas]
+            raise ValueError(
+                "Las columnas del codificador no coinciden con las del modelo "
+                f"(faltan: {faltan}, sobran: {sobran}, o el orden es distinto)"
+            )
+
+
+# Codificador compartido, construido una sola vez a partir del esquema
+CODIFICADOR = CodificadorOneHot()
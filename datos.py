@@ -0,0 +1,125 @@
+"""
+Almacenamiento compacto del dataset limpio del entrenamiento.
+
+El notebook guardaba `df_final` en `data/datos_limpios.csv`: 32 dummies
+escritos como texto (True/False), ESCIDEOL y VOTO, que `pd.read_csv`
+convierte en columnas bool, int64 y object. Aquí el dataset se guarda en
+Parquet con una columna por variable predictora: las categóricas como
+códigos (`category`, 1 byte por fila), ESCIDEOL como uint8 y VOTO también
+como categórica. El one-hot del entrenamiento se reconstruye solo cuando
+hace falta (`expandir`).
+
+Uso (convierte un `data/datos_limpios.csv` existente al nuevo formato):
+    python datos.py
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from codificador import CODIFICADOR
+from esquema import VARIABLES, PARTIDOS, NUMERICAS, OBJETIVO
+
+RUTA_DATOS = 'data/datos_limpios.parquet'
+RUTA_CSV = 'data/datos_limpios.csv'
+
+
+def compactar(df_final):
+    """Convierte el dataset one-hot del notebook (dummies + VOTO) al formato compacto"""
+    codigos = CODIFICADOR.invertir(df_final[CODIFICADOR.columnas].to_numpy(dtype=np.float64))
+
+    columnas = {}
+    for j, (variable, categorias) in enumerate(VARIABLES.items()):
+        if variable in NUMERICAS:
+            columnas[variable] = np.asarray(categorias, dtype=np.uint8)[codigos[:, j]]
+        else:
+            columnas[variable] = pd.Categorical.from_codes(codigos[:, j], categories=categorias)
+
+    voto = pd.Categorical(df_final[OBJETIVO], categories=PARTIDOS)
+    if (voto.codes < 0).any():
+        raise ValueError(f"Valor no válido en la variable {OBJETIVO}")
+    columnas[OBJETIVO] = voto
+    return pd.DataFrame(columnas)
+
+
+def compactar_recodificado(recodificado):
+    """
+    Convierte datos recodificados (`recodificacion.recodificar`) al formato compacto.
+
+    Aplica el mismo filtrado que `recodificacion.preparar_dataset`: solo los
+    votos a los 4 partidos y las filas sin valores faltantes.
+    """
+    df = recodificado[recodificado['VOTOSIMG'].notna()].dropna(subset=list(VARIABLES))
+
+    columnas = {}
+    for variable, categorias in VARIABLES.items():
+        if variable in NUMERICAS:
+            columnas[variable] = df[variable].to_numpy().astype(np.uint8)
+        else:
+            columnas[variable] = pd.Categorical(df[variable].to_numpy(dtype=object), categories=categorias)
+    columnas[OBJETIVO] = pd.Categorical(df['VOTOSIMG'].to_numpy(dtype=object), categories=PARTIDOS)
+    return pd.DataFrame(columnas).reset_index(drop=True)
+
+
+def expandir(datos):
+    """Reconstruye el dataset one-hot del notebook (`df_final`) a partir del formato compacto"""
+    from recodificacion import one_hot
+
+    df_final = one_hot(datos)
+    df_final[OBJETIVO] = datos[OBJETIVO].astype(str).to_numpy(dtype=object)
+    return df_final
+
+
+def guardar_datos(df_final, ruta=RUTA_DATOS):
+    """Guarda el dataset one-hot del notebook en formato compacto"""
+    guardar_compacto(compactar(df_final), ruta)
+
+
+def guardar_compacto(datos, ruta=RUTA_DATOS):
+    """
+    Guarda un dataset que ya está en formato compacto.
+
+    Se escribe en un fichero temporal que se vuelve a leer y se compara con
+    `datos`; solo si coincide sustituye a `ruta` (de forma atómica).
+    """
+    ruta_tmp = ruta + '.tmp'
+    datos.to_parquet(ruta_tmp, index=False)
+    try:
+        pd.testing.assert_frame_equal(pd.read_parquet(ruta_tmp), datos.reset_index(drop=True))
+    except AssertionError as e:
+        os.remove(ruta_tmp)
+        raise ValueError(f"El dataset escrito en {ruta_tmp} no coincide con el original: {e}")
+    os.replace(ruta_tmp, ruta)
+
+
+def cargar_datos(ruta=RUTA_DATOS, ruta_csv=RUTA_CSV):
+    """
+    Carga el dataset limpio en formato compacto.
+
+    Si no existe, lo crea: a partir del CSV antiguo si está, o si no a
+    partir de los barómetros .sav del repositorio (como en un clon nuevo).
+    """
+    if not os.path.exists(ruta):
+        if os.path.exists(ruta_csv):
+            guardar_datos(pd.read_csv(ruta_csv), ruta)
+        else:
+            # Import diferido: actualizacion importa este módulo
+            from actualizacion import cargar_meses
+            from ingesta import MESES
+
+            guardar_compacto(cargar_meses(MESES), ruta)
+    return pd.read_parquet(ruta, memory_map=True)
+
+
+if __name__ == '__main__':
+    df_csv = pd.read_csv(RUTA_CSV)
+    guardar_datos(df_csv)
+    datos = cargar_datos()
+    pd.testing.assert_frame_equal(expandir(datos), df_csv, check_dtype=False)
+
+    memoria_csv = df_csv.memory_usage(deep=True).sum() / 2**20
+    memoria = datos.memory_usage(deep=True).sum() / 2**20
+    print(f"✅ {len(datos):,} filas guardadas en {RUTA_DATOS} "
+          f"({os.path.getsize(RUTA_CSV) / 2**20:.1f} MB en CSV → {os.path.getsize(RUTA_DATOS) / 2**20:.2f} MB)")
+    print(f"📊 Memoria: {memoria_csv:.1f} MB (CSV) → {memoria:.2f} MB ({memoria_csv / memoria:.0f}× menos)")
@@ -0,0 +1,336 @@
+"""
+Selección y ajuste del modelo en paralelo, reanudable y con límite de tiempo.
+
+Sustituye a `compare_models(n_select=5)` + `tune_model(n_iter=50)` del
+notebook, que se ejecutaban en un solo proceso durante 10-15 minutos y
+perdían todo el progreso si se interrumpían. El experimento se prepara con
+el mismo `setup` del notebook y cada ensayo (una configuración de un
+candidato evaluada en un fold de la validación cruzada) se reparte entre
+todos los núcleos con joblib (loky):
+
+1. Comparación: cada candidato con sus hiperparámetros por defecto.
+2. Ajuste: el mejor candidato con `N_ITERACIONES` configuraciones
+   aleatorias de su espacio de búsqueda (más la de por defecto).
+
+En ambas fases se usa successive halving: todas las configuraciones se
+evalúan primero en unos pocos folds y solo la mejor parte de cada ronda
+(1 de cada `REDUCCION`) pasa a evaluarse en más folds, hasta los 10.
+
+Cada ensayo terminado se guarda en `models/entrenamiento/<huella>.jsonl`
+(la huella identifica los datos y la configuración del `setup`), así que
+al volver a ejecutar el script solo se evalúan los ensayos que faltan. Con
+`--minutos` se fija un presupuesto de tiempo: al agotarse se detienen los
+ensayos pendientes y se elige el mejor modelo evaluado hasta entonces (si
+no se ha terminado ningún ensayo, el entrenamiento falla con un error).
+
+El modelo final se entrena con PyCaret (`create_model` sobre el 90 % de
+entrenamiento, como el `tuned_model` del notebook) y se guarda en
+`models/modelo_prediccion_voto.pkl`, junto con su artefacto ligero.
+
+Uso:
+    python entrenamiento.py [--minutos M] [--procesos N] [--iteraciones N]
+"""
+
+import hashlib
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+from esquema import OBJETIVO
+
+SEMILLA = 123
+
+# Configuración del `setup` del notebook (sin `data`)
+CONFIG_SETUP = {
+    'target': OBJETIVO,
+    'session_id': SEMILLA,
+    'train_size': 0.9,
+    'normalize': True,
+    'transformation': False,
+    'remove_multicollinearity': True,
+    'multicollinearity_threshold': 0.9,
+    'log_experiment': False,
+    'verbose': False,
+}
+
+# Candidatos que pasan a la fase de ajuste en la comparación (n_select del notebook)
+N_SELECCIONADOS = 5
+
+# Configuraciones aleatorias del ajuste (n_iter del notebook)
+N_ITERACIONES = 50
+
+# Folds evaluados en cada ronda de successive halving
+RONDAS_COMPARACION = (3, 10)
+RONDAS_AJUSTE = (1, 3, 10)
+
+# Fracción de configuraciones que pasa de una ronda a la siguiente (1 de cada REDUCCION)
+REDUCCION = 3
+
+DIRECTORIO_ENSAYOS = 'models/entrenamiento'
+
+
+def _candidatos():
+    """
+    Candidatos de `compare_models` ({clave: (clase, parámetros fijos, espacio de búsqueda)}).
+
+    Solo se incluyen estimadores de scikit-learn con `predict_proba`, que
+    es lo que necesitan la app y la inferencia ligera (PyCaret compara
+    también SVM lineal y Ridge, que no lo tienen). Los espacios de búsqueda
+    siguen los de `tune_model`.
+    """
+    from scipy.stats import loguniform, randint, uniform
+    from sklearn.discriminant_analysis import LinearDiscriminantAnalysis, QuadraticDiscriminantAnalysis
+    from sklearn.ensemble import (AdaBoostClassifier, ExtraTreesClassifier,
+                                  GradientBoostingClassifier, RandomForestClassifier)
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.naive_bayes import GaussianNB
+    from sklearn.neighbors import KNeighborsClassifier
+    from sklearn.tree import DecisionTreeClassifier
+
+    arboles = {
+        'max_depth': randint(1, 12),
+        'min_samples_split': randint(2, 11),
+        'min_samples_leaf': randint(1, 6),
+        'max_features': ['sqrt', 'log2', 1.0],
+    }
+    bosque = {**arboles, 'n_estimators': randint(10, 301), 'criterion': ['gini', 'entropy']}
+    return {
+        'lr': (LogisticRegression, {'max_iter': 1000, 'random_state': SEMILLA},
+               {'C': loguniform(1e-3, 10), 'class_weight': [None, 'balanced']}),
+        'knn': (KNeighborsClassifier, {'n_jobs': 1},
+                {'n_neighbors': randint(1, 51), 'weights': ['uniform', 'distance'],
+                 'metric': ['minkowski', 'euclidean', 'manhattan']}),
+        'nb': (GaussianNB, {}, {'var_smoothing': loguniform(1e-9, 1)}),
+        'dt': (DecisionTreeClassifier, {'random_state': SEMILLA},
+               {**arboles, 'criterion': ['gini', 'entropy']}),
+        'rf': (RandomForestClassifier, {'random_state': SEMILLA, 'n_jobs': 1}, bosque),
+        'qda': (QuadraticDiscriminantAnalysis, {}, {'reg_param': uniform(0, 1)}),
+        'ada': (AdaBoostClassifier, {'random_state': SEMILLA},
+                {'n_estimators': randint(10, 301), 'learning_rate': loguniform(1e-3, 0.5)}),
+        'gbc': (GradientBoostingClassifier, {'random_state': SEMILLA},
+                {**arboles, 'n_estimators': randint(10, 301), 'learning_rate': loguniform(1e-3, 0.5),
+                 'subsample': uniform(0.2, 0.8)}),
+        'lda': (LinearDiscriminantAnalysis, {},
+                {'solver': ['lsqr', 'eigen'], 'shrinkage': uniform(0, 1)}),
+        'et': (ExtraTreesClassifier, {'random_state': SEMILLA, 'n_jobs': 1}, bosque),
+    }
+
+
+def crear_estimador(modelo, parametros):
+    """Instancia el candidato `modelo` con sus parámetros fijos y `parametros`"""
+    clase, fijos, _ = _candidatos()[modelo]
+    return clase(**fijos, **parametros)
+
+
+class Configuracion:
+    """Un candidato con unos hiperparámetros concretos"""
+
+    def __init__(self, modelo, parametros=None):
+        self.modelo = modelo
+        self.parametros = dict(parametros or {})
+        texto = json.dumps([modelo, self.parametros], sort_keys=True)
+        self.clave = hashlib.sha1(texto.encode('utf-8')).hexdigest()[:16]
+
+    def __repr__(self):
+        return f"{self.modelo}({', '.join(f'{k}={v!r}' for k, v in self.parametros.items())})"
+
+
+def configuraciones_aleatorias(modelo, n, semilla=SEMILLA):
+    """La configuración por defecto de `modelo` y `n` configuraciones aleatorias de su espacio"""
+    from sklearn.model_selection import ParameterSampler
+
+    _, _, espacio = _candidatos()[modelo]
+    configuraciones = [Configuracion(modelo)]
+    for parametros in ParameterSampler(espacio, n, random_state=semilla):
+        # Tipos nativos, para que la configuración se pueda guardar en JSON
+        parametros = {k: (v.item() if isinstance(v, np.generic) else v) for k, v in parametros.items()}
+        configuraciones.append(Configuracion(modelo, parametros))
+    return configuraciones
+
+
+class RegistroEnsayos:
+    """Resultados de los ensayos terminados, guardados en disco a medida que llegan"""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.resultados = {}
+        if os.path.exists(ruta):
+            with open(ruta, encoding='utf-8') as f:
+                for linea in f:
+                    try:
+                        ensayo = json.loads(linea)
+                    except ValueError:
+                        # Última línea a medio escribir si el proceso se interrumpió
+                        continue
+                    self.resultados[ensayo['clave'], ensayo['fold']] = ensayo['accuracy']
+
+    def __contains__(self, ensayo):
+        return ensayo in self.resultados
+
+    def guardar(self, configuracion, fold, accuracy):
+        self.resultados[configuracion.clave, fold] = accuracy
+        with open(self.ruta, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'clave': configuracion.clave, 'modelo': configuracion.modelo,
+                                'parametros': configuracion.parametros, 'fold': fold,
+                                'accuracy': accuracy}) + '\n')
+
+    def puntuaciones(self, configuracion):
+        """Accuracy de cada fold ya evaluado de la configuración, en orden de fold"""
+        folds = sorted(f for c, f in self.resultados if c == configuracion.clave)
+        return [self.resultados[configuracion.clave, f] for f in folds]
+
+
+def _evaluar(modelo, parametros, X, y, entrenamiento, validacion):
+    """Entrena la configuración en un fold y devuelve su accuracy (se ejecuta en un proceso del pool)"""
+    import warnings
+    warnings.filterwarnings('ignore')
+
+    estimador = crear_estimador(modelo, parametros)
+    estimador.fit(X[entrenamiento], y[entrenamiento])
+    return float((estimador.predict(X[validacion]) == y[validacion]).mean())
+
+
+class BusquedaModelo:
+    """
+    Successive halving sobre los folds de la validación cruzada.
+
+    `X` e `y` son los datos de entrenamiento ya transformados por el
+    pipeline de PyCaret y `folds` la lista de (índices de entrenamiento,
+    índices de validación) de su `fold_generator`.
+    """
+
+    def __init__(self, X, y, folds, registro, procesos=-1, limite=None):
+        self.X = X
+        self.y = y
+        self.folds = folds
+        self.registro = registro
+        self.procesos = procesos
+        self.limite = limite
+        self.agotado = False
+
+    def _ejecutar(self, pendientes):
+        """Evalúa en paralelo los ensayos (configuración, fold); se detiene si se agota el tiempo"""
+        from joblib import Parallel, delayed
+
+        if self.limite is not None and time.monotonic() >= self.limite:
+            self.agotado = True
+        if self.agotado or not pendientes:
+            return
+
+        tareas = (delayed(_evaluar)(c.modelo, c.parametros, self.X, self.y, *self.folds[f])
+                  for c, f in pendientes)
+        resultados = Parallel(n_jobs=self.procesos, return_as='generator')(tareas)
+        try:
+            for (configuracion, fold), accuracy in zip(pendientes, resultados):
+                self.registro.guardar(configuracion, fold, accuracy)
+                if self.limite is not None and time.monotonic() >= self.limite:
+                    self.agotado = True
+                    break
+        finally:
+            # Cerrar el generador cancela los ensayos que aún no han empezado
+            resultados.close()
+
+    def ranking(self, configuraciones):
+        """Ordena las configuraciones por folds evaluados y, a igualdad, por accuracy media"""
+        def clave(configuracion):
+            puntuaciones = self.registro.puntuaciones(configuracion)
+            return len(puntuaciones), np.mean(puntuaciones) if puntuaciones else -np.inf
+        return sorted(configuraciones, key=clave, reverse=True)
+
+    def sucesivas_mitades(self, configuraciones, rondas, minimo=1):
+        """
+        Devuelve las configuraciones ordenadas de mejor a peor.
+
+        En cada ronda se evalúan las configuraciones vivas en los primeros
+        `rondas[i]` folds y pasan a la siguiente la mejor 1/REDUCCION parte
+        (al menos `minimo`).
+        """
+        vivas = list(configuraciones)
+        for i, n_folds in enumerate(rondas):
+            self._ejecutar([(c, f) for c in vivas for f in range(n_folds) if (c.clave, f) not in self.registro])
+            if self.agotado or i == len(rondas) - 1:
+                break
+            vivas = self.ranking(vivas)[:max(minimo, math.ceil(len(vivas) / REDUCCION))]
+        return self.ranking(configuraciones)
+
+    def seleccionar(self, iteraciones=N_ITERACIONES, n_seleccionados=N_SELECCIONADOS):
+        """
+        Compara los candidatos, ajusta el mejor y devuelve la mejor configuración.
+
+        Lanza RuntimeError si el presupuesto se agota antes de evaluar algún
+        ensayo: el primer candidato no se devuelve como si se hubiera elegido.
+        """
+        comparados = self.sucesivas_mitades([Configuracion(m) for m in _candidatos()],
+                                             RONDAS_COMPARACION, minimo=n_seleccionados)
+        if not self.registro.puntuaciones(comparados[0]):
+            raise RuntimeError("El presupuesto de tiempo se ha agotado sin evaluar ningún ensayo: "
+                               "amplía --minutos (los ensayos terminados se conservan para la próxima ejecución)")
+        mejor_modelo = comparados[0].modelo
+        ajustados = self.sucesivas_mitades(configuraciones_aleatorias(mejor_modelo, iteraciones),
+                                           RONDAS_AJUSTE)
+        return comparados[:n_seleccionados], ajustados[0]
+
+
+def huella_experimento(X, y):
+    """Identifica los datos de entrenamiento transformados, sus folds y la configuración del setup"""
+    huella = hashlib.sha256()
+    huella.update(np.ascontiguousarray(X).tobytes())
+    huella.update(np.ascontiguousarray(y).tobytes())
+    huella.update(json.dumps(CONFIG_SETUP, sort_keys=True).encode('utf-8'))
+    return huella.hexdigest()[:16]
+
+
+def entrenar(df_final, minutos=None, procesos=-1, iteraciones=N_ITERACIONES, directorio=DIRECTORIO_ENSAYOS):
+    """
+    Prepara el experimento, selecciona el modelo y guarda el pipeline final.
+
+    Devuelve la mejor configuración y la búsqueda (con sus puntuaciones).
+    """
+    from pycaret.classification import create_model, get_config, save_model, setup
+
+    from inferencia import exportar_modelo, extraer_modelo
+    from tabla_perfiles import RUTA_MODELO, cargar_pipeline
+
+    limite = time.monotonic() + minutos * 60 if minutos else None
+
+    setup(data=df_final, **CONFIG_SETUP)
+    X = get_config('X_train_transformed').to_numpy(dtype=np.float64)
+    y = np.asarray(get_config('y_train_transformed'))
+    folds = list(get_config('fold_generator').split(X, y))
+
+    os.makedirs(directorio, exist_ok=True)
+    registro = RegistroEnsayos(os.path.join(directorio, f'{huella_experimento(X, y)}.jsonl'))
+    busqueda = BusquedaModelo(X, y, folds, registro, procesos, limite)
+    _, mejor = busqueda.seleccionar(iteraciones)
+
+    # Mismo pipeline que `tune_model` + `save_model` del notebook
+    modelo = create_model(crear_estimador(mejor.modelo, mejor.parametros),
+                          cross_validation=False, verbose=False)
+    save_model(modelo, RUTA_MODELO[:-len('.pkl')], verbose=False)
+    pipeline, huella = cargar_pipeline()
+    exportar_modelo(extraer_modelo(pipeline), huella)
+    return mejor, busqueda
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from datos import cargar_datos, expandir
+
+    parser = argparse.ArgumentParser(description="Selección y ajuste del modelo de voto")
+    parser.add_argument('--minutos', type=float, default=None, help="presupuesto de tiempo")
+    parser.add_argument('--procesos', type=int, default=-1, help="procesos (por defecto, todos los núcleos)")
+    parser.add_argument('--iteraciones', type=int, default=N_ITERACIONES,
+                        help="configuraciones aleatorias del ajuste")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    mejor, busqueda = entrenar(expandir(cargar_datos()), args.minutos, args.procesos, args.iteraciones)
+    puntuaciones = busqueda.registro.puntuaciones(mejor)
+    aviso = " (presupuesto de tiempo agotado)" if busqueda.agotado else ""
+    print(f"✅ Mejor modelo: {mejor}")
+    print(f"   Accuracy media en {len(puntuaciones)} folds: {np.mean(puntuaciones):.2%}{aviso}")
+    print(f"   Guardado en models/modelo_prediccion_voto.pkl ({time.perf_counter() - inicio:.0f} s)")
@@ -0,0 +1,40 @@
+"""
+Esquema de las variables de entrada del modelo de predicción de voto.
+
+Define, en un único sitio, las categorías válidas de cada una de las 8
+variables predictoras (en el mismo orden que los argumentos de
+`crear_dataframe_prediccion`) y los partidos que predice el modelo.
+"""
+
+# Variables predictoras y sus categorías (orden de visualización en la app)
+VARIABLES = {
+    'GRUPO_EDAD': ['18-29', '30-39', '40-49', '50-59', '60-69', '70+'],
+    'SEXO': ['Hombre', 'Mujer'],
+    'CCAA': [
+        'Andalucía', 'Aragón', 'Asturias', 'Balears', 'Canarias', 'Cantabria',
+        'Castilla-La Mancha', 'Castilla y León', 'Catalunya', 'Comunitat Valenciana',
+        'Extremadura', 'Galicia', 'Madrid', 'Murcia', 'Navarra', 'Euskadi',
+        'La Rioja', 'Ceuta y Melilla'
+    ],
+    'TAMUNI': ['0-10.000', '10.001-100.000', '>100.000'],
+    'ESCIDEOL': list(range(1, 11)),
+    'ESTUDIOS': ['Sin estudios o primaria', 'Secundaria', 'Formación Profesional', 'Superiores'],
+    'SITLAB': ['Trabaja', 'En paro', 'Pensionista', 'Otra situación'],
+    'PARTICIPACIONG': ['Sí', 'No'],
+}
+
+# Partidos que predice el modelo (orden del LabelEncoder de PyCaret)
+PARTIDOS = ['PP', 'PSOE', 'Sumar', 'VOX']
+
+# Variables numéricas: el modelo las recibe tal cual, sin one-hot
+NUMERICAS = ['ESCIDEOL']
+
+# Orden de las columnas en el DataFrame de entrenamiento del notebook. Con
+# pd.get_dummies(drop_first=True) las numéricas van primero y después los
+# dummies de cada variable categórica en este orden, con sus categorías
+# ordenadas alfabéticamente y sin la primera (categoría de referencia).
+ORDEN_ENTRENAMIENTO = ['CCAA', 'SEXO', 'ESCIDEOL', 'TAMUNI', 'PARTICIPACIONG',
+                       'ESTUDIOS', 'SITLAB', 'GRUPO_EDAD']
+
+# Variable objetivo del dataset de entrenamiento
+OBJETIVO = 'VOTO'
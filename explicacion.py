@@ -0,0 +1,231 @@
+"""
+Explicación de las predicciones con valores de Shapley exactos.
+
+Cada predicción se reparte entre las 8 variables del perfil: la
+contribución de una variable a la probabilidad de un partido es su valor
+de Shapley, con cada variable categórica tratada como un único jugador
+(todas sus columnas one-hot juntas). Con 8 variables solo hay 2^8 = 256
+coaliciones, así que los valores se calculan de forma exacta, sin
+muestreo ni aproximaciones por árbol: el valor de una coalición S es la
+predicción media cuando las variables de S toman los valores del perfil y
+el resto los de una muestra de fondo de encuestados reales (`N_FONDO`).
+
+Todas las combinaciones (perfiles × coaliciones × fondo) se construyen
+como códigos de base mixta (`tabla_perfiles`), se deduplican y se
+puntúan en unas pocas llamadas vectorizadas a `predecir_codigos`; con la
+tabla precalculada cada llamada es una consulta al array. Los valores de
+Shapley salen de un único producto matricial con los pesos de Shapley.
+
+El resumen global (importancia media de cada variable y contribución
+media de cada categoría) se calcula una vez por modelo y por población y
+se guarda en `models/explicaciones/<huella>-<huella de los datos>.json`:
+si cambian los encuestados de los barómetros, se vuelve a calcular.
+
+Uso:
+    python explicacion.py
+"""
+
+import hashlib
+import json
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+from codificador import CODIFICADOR
+from esquema import VARIABLES, PARTIDOS
+from tabla_perfiles import RADICES
+
+RUTA_EXPLICACIONES = 'models/explicaciones'
+
+# Encuestados de la muestra de fondo
+N_FONDO = 100
+
+# Perfiles con los que se calcula el resumen global
+N_GLOBAL = 1000
+
+# Combinaciones (perfil, coalición, fondo) puntuadas por llamada al modelo
+COMBINACIONES_POR_LLAMADA = 2_000_000
+
+SEMILLA = 123
+
+N_VARIABLES = len(VARIABLES)
+
+# Coaliciones (2^8, variables): la fila c contiene las variables de los bits de c
+COALICIONES = ((np.arange(2 ** N_VARIABLES)[:, None] >> np.arange(N_VARIABLES)) & 1).astype(bool)
+
+
+def _pesos_shapley():
+    """Matriz (variables, coaliciones) tal que valores de Shapley = pesos @ valores de las coaliciones"""
+    pesos = np.zeros((N_VARIABLES, len(COALICIONES)))
+    tamanos = COALICIONES.sum(axis=1)
+    for c, coalicion in enumerate(COALICIONES):
+        for i in np.flatnonzero(~coalicion):
+            s = tamanos[c]
+            peso = math.factorial(s) * math.factorial(N_VARIABLES - s - 1) / math.factorial(N_VARIABLES)
+            pesos[i, c | (1 << i)] += peso
+            pesos[i, c] -= peso
+    return pesos
+
+
+PESOS_SHAPLEY = _pesos_shapley()
+
+
+class Explicador:
+    """Valores de Shapley exactos de un modelo con `predecir_codigos` frente a una muestra de fondo"""
+
+    def __init__(self, modelo, fondo):
+        """`fondo` es un DataFrame de perfiles (p. ej. encuestados reales)"""
+        self.modelo = modelo
+        self.fondo = CODIFICADOR.codigos(fondo, validar=False)
+        self.fondo = self.fondo[(self.fondo >= 0).all(axis=1)]
+        if not len(self.fondo):
+            raise ValueError("La muestra de fondo no tiene perfiles válidos")
+
+    def _valores_coaliciones(self, codigos):
+        """Predicción media (perfiles, coaliciones, partidos) de cada coalición"""
+        # (perfiles, coaliciones, fondo, variables): valor del perfil si la variable está en la coalición
+        combinados = np.where(COALICIONES[None, :, None, :], codigos[:, None, None, :], self.fondo[None, None])
+        indices = np.ravel_multi_index(combinados.reshape(-1, N_VARIABLES).T, RADICES)
+        unicos, inverso = np.unique(indices, return_inverse=True)
+        _, probabilidades = self.modelo.predecir_codigos(np.stack(np.unravel_index(unicos, RADICES), axis=1))
+        probabilidades = np.asarray(probabilidades, dtype=np.float64)[inverso]
+        return probabilidades.reshape(len(codigos), len(COALICIONES), len(self.fondo), -1).mean(axis=2)
+
+    def shapley_codigos(self, codigos, progreso=None):
+        """
+        Valores de Shapley (perfiles, variables, partidos) de una matriz de códigos.
+
+        Devuelve también el valor base (partidos,): la predicción media del
+        fondo. Para cada perfil, base + suma de las contribuciones es su
+        predicción. `progreso(hechos, total)` se llama tras cada lote de perfiles.
+        """
+        codigos = np.asarray(codigos)
+        lote = max(1, COMBINACIONES_POR_LLAMADA // (len(COALICIONES) * len(self.fondo)))
+        valores = []
+        for i in range(0, len(codigos), lote):
+            valores.append(self._valores_coaliciones(codigos[i:i + lote]))
+            if progreso is not None:
+                progreso(min(i + lote, len(codigos)), len(codigos))
+        valores = np.concatenate(valores) if valores else np.zeros((0, len(COALICIONES), len(PARTIDOS)))
+        shapley = np.einsum('vc,pcj->pvj', PESOS_SHAPLEY, valores)
+        return shapley, valores[0, 0] if len(valores) else None
+
+    def explicar(self, perfil):
+        """
+        Contribución de cada variable de un perfil a la probabilidad de cada partido.
+
+        Devuelve un DataFrame con una fila por variable ('Variable', 'Valor'
+        y una columna por partido) y el valor base de cada partido.
+        """
+        perfil = perfil[list(VARIABLES)].iloc[:1]
+        shapley, base = self.shapley_codigos(CODIFICADOR.codigos(perfil))
+        resultado = pd.DataFrame(shapley[0], columns=PARTIDOS)
+        resultado.insert(0, 'Variable', list(VARIABLES))
+        resultado.insert(1, 'Valor', [str(perfil[v].iloc[0]) for v in VARIABLES])
+        return resultado, pd.Series(base, index=PARTIDOS)
+
+
+def resumen_global(explicador, perfiles, progreso=None):
+    """
+    Importancia media de cada variable y contribución media de cada categoría.
+
+    'importancia' es la media del valor absoluto de las contribuciones de
+    cada variable ({partido: {variable: valor}}) y 'categorias' la
+    contribución media de cada categoría de cada variable
+    ({partido: {variable: {categoría: valor}}}).
+    """
+    codigos = CODIFICADOR.codigos(perfiles, validar=False)
+    codigos = codigos[(codigos >= 0).all(axis=1)]
+    shapley, base = explicador.shapley_codigos(codigos, progreso)
+
+    importancia = np.abs(shapley).mean(axis=0)
+    categorias = {}
+    for j, partido in enumerate(PARTIDOS):
+        categorias[partido] = {}
+        for i, (variable, valores) in enumerate(VARIABLES.items()):
+            suma = np.bincount(codigos[:, i], weights=shapley[:, i, j], minlength=len(valores))
+            cuenta = np.bincount(codigos[:, i], minlength=len(valores))
+            categorias[partido][variable] = {str(valor): float(suma[k] / cuenta[k])
+                                             for k, valor in enumerate(valores) if cuenta[k]}
+    return {
+        'perfiles': len(codigos),
+        'fondo': len(explicador.fondo),
+        'base': dict(zip(PARTIDOS, map(float, base))),
+        'importancia': {partido: dict(zip(VARIABLES, map(float, importancia[:, j])))
+                        for j, partido in enumerate(PARTIDOS)},
+        'categorias': categorias,
+    }
+
+
+def muestra(perfiles, n, semilla=SEMILLA):
+    """`n` perfiles al azar (sin reemplazo) de un DataFrame de perfiles"""
+    return perfiles.sample(min(n, len(perfiles)), random_state=semilla).reset_index(drop=True)
+
+
+def crear_explicador(modelo, poblacion, n_fondo=N_FONDO):
+    """Explicador con una muestra de fondo de `n_fondo` perfiles de `poblacion`"""
+    return Explicador(modelo, muestra(poblacion, n_fondo))
+
+
+def huella_datos(explicador, poblacion):
+    """Hash SHA-256 de los perfiles de `poblacion` y de la muestra de fondo del explicador"""
+    contenido = hashlib.sha256(np.ascontiguousarray(CODIFICADOR.codigos(poblacion, validar=False)).tobytes())
+    contenido.update(np.ascontiguousarray(explicador.fondo).tobytes())
+    return contenido.hexdigest()
+
+
+def cargar_resumen_global(explicador, huella, poblacion, ruta=RUTA_EXPLICACIONES, n_global=N_GLOBAL,
+                          progreso=None):
+    """
+    Resumen global del modelo con hash `huella` sobre `poblacion`.
+
+    Se calcula y se guarda la primera vez para cada combinación de modelo
+    y datos (perfiles de `poblacion` y muestra de fondo del explicador).
+    `progreso` se pasa a `resumen_global` y solo se llama si se calcula.
+    """
+    datos = huella_datos(explicador, poblacion)
+    fichero = os.path.join(ruta, f'{huella}-{datos[:16]}.json')
+    try:
+        with open(fichero, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    resumen = {'hash_modelo': huella, 'hash_datos': datos,
+               **resumen_global(explicador, muestra(poblacion, n_global, SEMILLA + 1), progreso)}
+    os.makedirs(ruta, exist_ok=True)
+    with open(fichero + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(resumen, f, ensure_ascii=False, indent=2)
+    os.replace(fichero + '.tmp', fichero)
+    return resumen
+
+
+if __name__ == '__main__':
+    import time
+
+    from agregacion import poblacion_barometros
+    from prediccion import cargar_modelo
+    from registro import fuente_actual
+
+    fuente = fuente_actual()
+    modelo = cargar_modelo(fuente)
+    poblacion = poblacion_barometros()
+    explicador = crear_explicador(modelo, poblacion)
+
+    perfil = poblacion.iloc[:1]
+    inicio = time.perf_counter()
+    contribuciones, base = explicador.explicar(perfil)
+    ms = (time.perf_counter() - inicio) * 1000
+    print(f"🔎 Contribuciones de un perfil ({ms:.0f} ms, {len(COALICIONES)} coaliciones × {N_FONDO} de fondo)")
+    print(contribuciones.round(3).to_string(index=False))
+    prediccion = modelo.predecir(perfil)[PARTIDOS].iloc[0]
+    print(f"   Base + contribuciones - predicción: "
+          f"{np.abs(base + contribuciones[PARTIDOS].sum() - prediccion).max():.1e}")
+
+    inicio = time.perf_counter()
+    resumen = cargar_resumen_global(explicador, fuente['huella'], poblacion)
+    print(f"\n🌐 Importancia media de cada variable ({resumen['perfiles']} perfiles, "
+          f"{time.perf_counter() - inicio:.1f} s)")
+    print(pd.DataFrame(resumen['importancia']).round(3).to_string())
@@ -0,0 +1,335 @@
+"""
+Inferencia ligera sin pasar por `predict_model` de PyCaret.
+
+`predict_model` revalida los datos, reconstruye su DataFrame de salida y
+añade las columnas `prediction_label`/`prediction_score` en cada llamada.
+Este módulo extrae del pipeline guardado los pasos que realmente afectan
+a la predicción (columnas eliminadas por multicolinealidad, normalización
+y el estimador de scikit-learn ya entrenado) y llama a `predict_proba`
+directamente sobre la matriz NumPy del codificador.
+
+Para servir el modelo sin cargar PyCaret, `exportar_modelo` guarda esos
+pasos en un artefacto ligero (`models/modelo_ligero.npz`). Si el estimador
+es un GradientBoostingClassifier, sus árboles se guardan como arrays y se
+evalúan solo con NumPy; cualquier otro estimador se guarda serializado y
+necesita scikit-learn para cargarse.
+
+Uso:
+    python inferencia.py              # comprueba que ambos caminos coinciden
+    python inferencia.py --exportar   # genera models/modelo_ligero.npz
+    python inferencia.py --referencia # salida de predict_model para las pruebas de tests/
+"""
+
+import copy
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from codificador import CODIFICADOR
+from esquema import PARTIDOS
+from tabla_perfiles import hash_modelo
+
+RUTA_MODELO_LIGERO = 'models/modelo_ligero.npz'
+
+# Salida de `predict_model` con la que las pruebas comparan los artefactos sin PyCaret
+RUTA_REFERENCIA = 'tests/datos/predict_model.json'
+
+# Perfiles distintos de encuestados reales en la salida de referencia
+N_REFERENCIA = 300
+
+# Filas evaluadas a la vez por los árboles (acota la memoria intermedia)
+FILAS_POR_BLOQUE = 8192
+
+# Pasos del pipeline de PyCaret que no cambian datos ya codificados: los
+# imputadores (el codificador nunca produce valores faltantes) y la
+# limpieza de nombres de columna (no aplica a una matriz NumPy)
+PASOS_SIN_EFECTO = ('numerical_imputer', 'categorical_imputer', 'clean_column_names')
+
+
+class ArbolesGB:
+    """Evalúa con NumPy los árboles de un GradientBoostingClassifier multiclase"""
+
+    CAMPOS = ('izquierdo', 'derecho', 'variable', 'umbral', 'valor', 'inicial', 'tasa', 'profundidad')
+
+    def __init__(self, izquierdo, derecho, variable, umbral, valor, inicial, tasa, profundidad):
+        # Arrays (árboles, nodos); los árboles van por etapa y, dentro de
+        # cada etapa, uno por clase, como en `estimators_.ravel()`
+        self.izquierdo = izquierdo
+        self.derecho = derecho
+        self.variable = variable
+        self.umbral = umbral
+        self.valor = valor
+        self.inicial = inicial
+        self.tasa = float(tasa)
+        self.profundidad = int(profundidad)
+
+    @classmethod
+    def desde_estimador(cls, estimador):
+        """Copia los árboles de un GradientBoostingClassifier ya entrenado"""
+        arboles = estimador.estimators_.ravel()
+        max_nodos = max(arbol.tree_.node_count for arbol in arboles)
+        forma = (len(arboles), max_nodos)
+        izquierdo = np.zeros(forma, dtype=np.int32)
+        derecho = np.zeros(forma, dtype=np.int32)
+        variable = np.zeros(forma, dtype=np.int32)
+        umbral = np.zeros(forma, dtype=np.float64)
+        valor = np.zeros(forma, dtype=np.float64)
+
+        for t, arbol in enumerate(arboles):
+            arbol = arbol.tree_
+            n = arbol.node_count
+            # Las hojas apuntan a sí mismas para que todas las filas puedan
+            # recorrer el árbol el mismo número de pasos
+            hoja = arbol.children_left == -1
+            nodos = np.arange(n)
+            izquierdo[t, :n] = np.where(hoja, nodos, arbol.children_left)
+            derecho[t, :n] = np.where(hoja, nodos, arbol.children_right)
+            variable[t, :n] = np.where(hoja, 0, arbol.feature)
+            umbral[t, :n] = arbol.threshold
+            valor[t, :n] = arbol.value[:, 0, 0]
+
+        inicial = estimador._raw_predict_init(np.zeros((1, estimador.n_features_in_)))[0]
+        profundidad = max(arbol.tree_.max_depth for arbol in arboles)
+        return cls(izquierdo, derecho, variable, umbral, valor, inicial,
+                   estimador.learning_rate, profundidad)
+
+    def predict_proba(self, X):
+        """Probabilidades de cada clase, idénticas a las de `estimador.predict_proba`"""
+        # scikit-learn compara los valores en float32 con umbrales en float64
+        X = np.asarray(X, dtype=np.float32)
+        return np.concatenate([self._predict_proba_bloque(X[i:i + FILAS_POR_BLOQUE])
+                               for i in range(0, max(len(X), 1), FILAS_POR_BLOQUE)])
+
+    def _predict_proba_bloque(self, X):
+        n_arboles = len(self.izquierdo)
+        n_clases = len(self.inicial)
+        arboles = np.arange(n_arboles)
+        filas = np.arange(len(X))[:, None]
+
+        nodo = np.zeros((len(X), n_arboles), dtype=np.int32)
+        for _ in range(self.profundidad):
+            izquierda = X[filas, self.variable[arboles, nodo]] <= self.umbral[arboles, nodo]
+            nodo = np.where(izquierda, self.izquierdo[arboles, nodo], self.derecho[arboles, nodo])
+        hojas = self.valor[arboles, nodo].reshape(len(X), -1, n_clases)
+
+        # Se acumula etapa a etapa, en el mismo orden que scikit-learn
+        bruto = np.tile(self.inicial, (len(X), 1))
+        for etapa in range(hojas.shape[1]):
+            bruto += self.tasa * hojas[:, etapa]
+        bruto -= bruto.max(axis=1, keepdims=True)
+        probabilidades = np.exp(bruto)
+        return probabilidades / probabilidades.sum(axis=1, keepdims=True)
+
+
+class ModeloLigero:
+    """Estimador de scikit-learn con la normalización y selección de columnas del pipeline"""
+
+    def __init__(self, indices, media, escala, estimador, clases):
+        self.indices = indices
+        self.media = media
+        self.escala = escala
+        self.estimador = estimador
+        self.clases = np.asarray(clases, dtype=object)
+
+    def preprocesar(self, X):
+        """Aplica la selección de columnas y la normalización del pipeline a una matriz one-hot"""
+        return (X[:, self.indices] - self.media) / self.escala
+
+    def predict_proba(self, X):
+        """Probabilidades (N, partidos) de una matriz one-hot con las columnas del codificador"""
+        return self.estimador.predict_proba(self.preprocesar(X))
+
+    def predecir_matriz(self, X):
+        """Devuelve las etiquetas predichas y la matriz de probabilidades"""
+        probabilidades = self.predict_proba(X)
+        return self.clases[probabilidades.argmax(axis=1)], probabilidades
+
+    def predecir_codigos(self, codigos):
+        """Etiquetas y probabilidades de una matriz de códigos (`CodificadorOneHot.codigos`)"""
+        return self.predecir_matriz(CODIFICADOR.transformar_codigos(codigos))
+
+    def predecir(self, perfiles):
+        """Devuelve las predicciones de los perfiles con el mismo formato que `prediccion.predecir`"""
+        etiquetas, probabilidades = self.predecir_codigos(CODIFICADOR.codigos(perfiles))
+
+        resultado = perfiles.reset_index(drop=True)
+        resultado['Partido'] = etiquetas
+        for i, partido in enumerate(self.clases):
+            resultado[partido] = probabilidades[:, i]
+        resultado['Probabilidad'] = probabilidades.max(axis=1)
+        return resultado
+
+
+def extraer_modelo(pipeline):
+    """Construye un `ModeloLigero` a partir del pipeline cargado con `load_model`"""
+    CODIFICADOR.validar(pipeline)
+
+    columnas = list(CODIFICADOR.columnas)
+    media = np.zeros(len(columnas))
+    escala = np.ones(len(columnas))
+    clases = None
+    estimador = None
+
+    for nombre, paso in pipeline.steps:
+        transformador = getattr(paso, 'transformer', None)
+        if nombre == 'label_encoding':
+            clases = list(transformador.classes_)
+        elif nombre in PASOS_SIN_EFECTO:
+            continue
+        elif nombre == 'remove_multicollinearity':
+            conservar = [i for i, c in enumerate(columnas) if c not in transformador.drop_]
+            columnas = [columnas[i] for i in conservar]
+            media, escala = media[conservar], escala[conservar]
+        elif nombre == 'normalize':
+            for c, m, s in zip(transformador.feature_names_in_, transformador.mean_, transformador.scale_):
+                i = columnas.index(c)
+                media[i], escala[i] = m, s
+        elif nombre == 'trained_model':
+            estimador = paso
+        else:
+            raise ValueError(f"Paso del pipeline no soportado por la inferencia ligera: {nombre}")
+
+    if clases != PARTIDOS:
+        raise ValueError(f"Las clases del modelo {clases} no coinciden con {PARTIDOS}")
+
+    # El estimador se entrenó con un DataFrame; al recibir una matriz NumPy
+    # scikit-learn avisaría en cada llamada de que faltan los nombres de
+    # columna, así que se trabaja sobre una copia sin ellos
+    estimador = copy.deepcopy(estimador)
+    if hasattr(estimador, 'feature_names_in_'):
+        del estimador.feature_names_in_
+
+    indices = np.array([CODIFICADOR.columnas.index(c) for c in columnas], dtype=np.intp)
+    return ModeloLigero(indices, media, escala, estimador, clases)
+
+
+def exportar_modelo(ligero, huella, ruta=RUTA_MODELO_LIGERO):
+    """Guarda el modelo ligero en un único .npz junto con el hash del .pkl de origen"""
+    arrays = {
+        'indices': ligero.indices,
+        'media': ligero.media,
+        'escala': ligero.escala,
+        'clases': np.array(list(ligero.clases)),
+        'hash_modelo': np.array(huella),
+    }
+    estimador = ligero.estimador
+    if type(estimador).__name__ == 'GradientBoostingClassifier' and estimador.estimators_.shape[1] > 1:
+        estimador = ArbolesGB.desde_estimador(estimador)
+    if isinstance(estimador, ArbolesGB):
+        arrays['tipo'] = np.array('arboles')
+        arrays.update({campo: np.asarray(getattr(estimador, campo)) for campo in ArbolesGB.CAMPOS})
+    else:
+        arrays['tipo'] = np.array('sklearn')
+        arrays['estimador'] = np.frombuffer(pickle.dumps(estimador), dtype=np.uint8)
+
+    ruta_tmp = ruta + '.tmp.npz'
+    np.savez(ruta_tmp, **arrays)
+    os.replace(ruta_tmp, ruta)
+
+
+def cargar_modelo_ligero(ruta=RUTA_MODELO_LIGERO, huella=None):
+    """
+    Carga el artefacto ligero si existe y corresponde al modelo actual.
+
+    Devuelve None si no existe o se exportó a partir de otro .pkl.
+    """
+    if huella is None:
+        huella = hash_modelo()
+    try:
+        with np.load(ruta) as datos:
+            if str(datos['hash_modelo']) != huella:
+                return None
+            if str(datos['tipo']) == 'arboles':
+                estimador = ArbolesGB(*(datos[campo] for campo in ArbolesGB.CAMPOS))
+            else:
+                estimador = pickle.loads(datos['estimador'].tobytes())
+            return ModeloLigero(datos['indices'], datos['media'], datos['escala'],
+                                estimador, list(datos['clases']))
+    except (OSError, KeyError):
+        return None
+
+
+def verificar(pipeline, ligero, perfiles):
+    """
+    Comprueba que la inferencia ligera coincide con `predict_model`.
+
+    Compara la etiqueta y la probabilidad de cada partido en todos los
+    perfiles. `predict_model` redondea las probabilidades a 4 decimales, así
+    que se comparan con las de la inferencia ligera redondeadas igual.
+    """
+    from pycaret.classification import predict_model
+
+    pred = predict_model(pipeline, data=CODIFICADOR.dataframe(perfiles), raw_score=True)
+    etiquetas, probabilidades = ligero.predecir_matriz(CODIFICADOR.transformar(perfiles))
+
+    if not (pred['prediction_label'].to_numpy() == etiquetas).all():
+        raise AssertionError("Las etiquetas predichas no coinciden con predict_model")
+    for i, partido in enumerate(ligero.clases):
+        distintas = (pred[f'prediction_score_{partido}'].to_numpy() != np.round(probabilidades[:, i], 4)).sum()
+        if distintas:
+            raise AssertionError(f"Las probabilidades de {partido} no coinciden con predict_model "
+                                 f"en {distintas} perfiles")
+
+
+def guardar_referencia(pipeline, huella, ruta=RUTA_REFERENCIA, n=N_REFERENCIA, semilla=123):
+    """Guarda `predict_model(raw_score=True)` para `n` perfiles distintos de encuestados reales"""
+    import json
+
+    from pycaret.classification import predict_model
+
+    from agregacion import poblacion_barometros
+    from esquema import VARIABLES
+
+    perfiles = poblacion_barometros()[list(VARIABLES)].drop_duplicates()
+    perfiles = perfiles.sample(n, random_state=semilla).astype(object).reset_index(drop=True)
+    perfiles['ESCIDEOL'] = perfiles['ESCIDEOL'].astype(int)
+    pred = predict_model(pipeline, data=CODIFICADOR.dataframe(perfiles), raw_score=True, verbose=False)
+
+    salida = perfiles.assign(prediction_label=pred['prediction_label'].to_numpy())
+    for partido in PARTIDOS:
+        salida[f'prediction_score_{partido}'] = pred[f'prediction_score_{partido}'].to_numpy()
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump({'hash_modelo': huella, 'filas': salida.to_dict(orient='records')},
+                  f, ensure_ascii=False, indent=1)
+
+
+if __name__ == '__main__':
+    import sys
+    from tabla_perfiles import N_PERFILES, cargar_pipeline, decodificar_perfiles
+
+    pipeline, huella = cargar_pipeline()
+    ligero = extraer_modelo(pipeline)
+
+    if '--exportar' in sys.argv:
+        exportar_modelo(ligero, huella)
+        print(f"✅ Modelo ligero guardado en {RUTA_MODELO_LIGERO} "
+              f"({os.path.getsize(RUTA_MODELO_LIGERO) / 1024:.0f} KB)")
+        sys.exit()
+
+    if '--referencia' in sys.argv:
+        guardar_referencia(pipeline, huella)
+        print(f"✅ Salida de predict_model de {N_REFERENCIA} perfiles guardada en {RUTA_REFERENCIA}")
+        sys.exit()
+
+    perfiles = decodificar_perfiles(np.arange(N_PERFILES))
+    verificar(pipeline, ligero, perfiles)
+    print(f"✅ Inferencia ligera idéntica a predict_model en los {N_PERFILES:,} perfiles "
+          f"y los {len(ligero.clases)} partidos")
+
+    # Sin el redondeo de predict_model la coincidencia es exacta
+    X = pd.DataFrame(CODIFICADOR.transformar(perfiles), columns=CODIFICADOR.columnas)
+    exacta = np.abs(pipeline.predict_proba(X) - ligero.predict_proba(X.to_numpy())).max()
+    print(f"   Diferencia frente a pipeline.predict_proba: {exacta:.1e}")
+
+    # El artefacto exportado (árboles evaluados con NumPy) debe dar lo mismo
+    ruta_tmp = RUTA_MODELO_LIGERO + '.verificacion.npz'
+    exportar_modelo(ligero, huella, ruta_tmp)
+    exportado = cargar_modelo_ligero(ruta_tmp, huella)
+    os.remove(ruta_tmp)
+    verificar(pipeline, exportado, perfiles)
+    exacta = np.abs(pipeline.predict_proba(X) - exportado.predict_proba(X.to_numpy())).max()
+    print(f"✅ Artefacto ligero idéntico a predict_model (diferencia frente a "
+          f"pipeline.predict_proba: {exacta:.1e})")
@@ -0,0 +1,141 @@
+"""
+Ingesta de los barómetros mensuales del CIS con caché columnar.
+
+Cada barómetro (`data/<mes>.sav`) tiene ~300 columnas, pero el modelo solo
+usa 9. Este módulo lee únicamente esas columnas (`usecols`), reparte los
+ficheros entre varios procesos y guarda cada mes en una partición Arrow
+sin comprimir (`data/cache/barometros/mes=<mes>/datos.arrow`) que se abre
+con memory-map en las ejecuciones siguientes. Cada partición registra el
+tamaño y la fecha de modificación del .sav de origen y las columnas
+leídas: solo se vuelven a leer los meses nuevos o modificados.
+
+Uso:
+    python ingesta.py
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+# Barómetros de 2025 (agosto no tiene barómetro)
+MESES = ['enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio', 'julio',
+         'septiembre', 'octubre', 'noviembre', 'diciembre']
+
+# Columnas del .sav que usa el modelo
+COLUMNAS = ['CCAA', 'SEXO', 'EDAD', 'VOTOSIMG', 'ESCIDEOL', 'TAMUNI',
+            'PARTICIPACIONG', 'ESTUDIOS', 'SITLAB']
+
+DIRECTORIO_DATOS = 'data'
+RUTA_CACHE = 'data/cache/barometros'
+
+
+def _ruta_particion(cache, mes):
+    return os.path.join(cache, f'mes={mes}')
+
+
+def _firma(ruta_sav, columnas):
+    """Identifica la versión del .sav de origen y las columnas leídas"""
+    estado = os.stat(ruta_sav)
+    return {'tamano': estado.st_size, 'mtime_ns': estado.st_mtime_ns, 'columnas': list(columnas)}
+
+
+def firma_barometros(meses=MESES, directorio=DIRECTORIO_DATOS):
+    """Hash del tamaño y la fecha de modificación de los .sav de `meses` (cambia si se modifica alguno)"""
+    firmas = {mes: _firma(os.path.join(directorio, f'{mes}.sav'), COLUMNAS) for mes in meses}
+    return hashlib.sha256(json.dumps(firmas, sort_keys=True).encode()).hexdigest()
+
+
+def particion_vigente(ruta_sav, particion, columnas=COLUMNAS):
+    """Indica si la partición de la caché corresponde al .sav actual"""
+    try:
+        with open(os.path.join(particion, 'fuente.json'), encoding='utf-8') as f:
+            return json.load(f) == _firma(ruta_sav, columnas)
+    except (OSError, ValueError):
+        return False
+
+
+def leer_barometro(ruta_sav, columnas=COLUMNAS):
+    """Lee solo las columnas indicadas de un barómetro en formato SPSS"""
+    import pyreadstat
+
+    df, _ = pyreadstat.read_sav(ruta_sav, usecols=list(columnas))
+    return df[list(columnas)]
+
+
+def _actualizar_particion(ruta_sav, particion, columnas):
+    """Lee un .sav y escribe su partición (se ejecuta en un proceso del pool)"""
+    df = leer_barometro(ruta_sav, columnas)
+
+    ruta_tmp = particion + '.tmp'
+    shutil.rmtree(ruta_tmp, ignore_errors=True)
+    os.makedirs(ruta_tmp)
+    feather.write_feather(df, os.path.join(ruta_tmp, 'datos.arrow'), compression='uncompressed')
+    with open(os.path.join(ruta_tmp, 'fuente.json'), 'w', encoding='utf-8') as f:
+        json.dump(_firma(ruta_sav, columnas), f)
+
+    shutil.rmtree(particion, ignore_errors=True)
+    os.replace(ruta_tmp, particion)
+    return len(df)
+
+
+def actualizar_cache(meses=MESES, directorio=DIRECTORIO_DATOS, cache=RUTA_CACHE,
+                     columnas=COLUMNAS, procesos=None):
+    """
+    Vuelve a leer, en paralelo, los meses sin partición vigente en la caché.
+
+    Devuelve un diccionario {mes: filas leídas} con los meses actualizados.
+    """
+    pendientes = {
+        mes: os.path.join(directorio, f'{mes}.sav') for mes in meses
+        if not particion_vigente(os.path.join(directorio, f'{mes}.sav'),
+                                 _ruta_particion(cache, mes), columnas)
+    }
+    if not pendientes:
+        return {}
+
+    os.makedirs(cache, exist_ok=True)
+    procesos = min(procesos or os.cpu_count() or 1, len(pendientes))
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        futuros = {
+            mes: pool.submit(_actualizar_particion, ruta_sav, _ruta_particion(cache, mes), list(columnas))
+            for mes, ruta_sav in pendientes.items()
+        }
+        return {mes: futuro.result() for mes, futuro in futuros.items()}
+
+
+def cargar_barometros(meses=MESES, directorio=DIRECTORIO_DATOS, cache=RUTA_CACHE,
+                      columnas=COLUMNAS, procesos=None):
+    """
+    Devuelve los barómetros indicados en un único DataFrame.
+
+    Actualiza antes la caché si algún .sav es nuevo o ha cambiado. La
+    columna MES (categórica) indica el barómetro de origen de cada fila.
+    """
+    actualizar_cache(meses, directorio, cache, columnas, procesos)
+
+    tablas = []
+    for mes in meses:
+        tabla = feather.read_table(os.path.join(_ruta_particion(cache, mes), 'datos.arrow'),
+                                   memory_map=True)
+        tablas.append(tabla.append_column('MES', pa.array([mes] * tabla.num_rows)))
+    df = pa.concat_tables(tablas).to_pandas()
+    df['MES'] = pd.Categorical(df['MES'], categories=list(meses))
+    return df
+
+
+if __name__ == '__main__':
+    import time
+
+    inicio = time.perf_counter()
+    actualizados = actualizar_cache()
+    for mes, filas in actualizados.items():
+        print(f"Leído data/{mes}.sav: {filas} filas")
+    df = cargar_barometros()
+    print(f"✅ {len(df):,} filas de {len(MESES)} barómetros en {RUTA_CACHE} "
+          f"({len(actualizados)} meses actualizados, {time.perf_counter() - inicio:.1f} s)")
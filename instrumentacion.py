@@ -0,0 +1,244 @@
+"""
+Medición ligera de la latencia de cada etapa de la predicción.
+
+Cada etapa (`with medir('tab1.prediccion'): ...`) registra su duración en
+un histograma en memoria, compartido por todos los hilos del proceso (las
+sesiones de Streamlit o las peticiones del servicio HTTP). Los
+histogramas tienen intervalos logarítmicos fijos (20 por década entre
+1 µs y 100 s), así que registrar una medida cuesta un par de microsegundos
+y la memoria no crece con el número de medidas; los percentiles se
+estiman con el límite superior de su intervalo (error < 13 %).
+
+Los percentiles se consultan en la barra lateral de la app (abriéndola
+con `?latencias=1`) o en `GET /metricas` del servicio HTTP.
+
+Con la variable de entorno `PERFILAR=<directorio>` se puede perfilar una
+única ejecución: la primera del proceso y, después, la siguiente a cada
+`Perfilador.solicitar()`. Se guardan dos ficheros en el directorio:
+
+    <nombre>-<fecha>.prof   cProfile del hilo que ejecuta la petición
+                            (pstats, snakeviz...)
+    <nombre>-<fecha>.txt    muestreo de las pilas de todos los hilos cada
+                            `INTERVALO_MUESTREO` s en el formato plegado de
+                            `py-spy record --format raw` (flamegraph.pl,
+                            speedscope, inferno)
+
+El perfil es de todo el proceso: el muestreo recoge todos los hilos y
+cProfile todo lo que se ejecute en el hilo que lo inicia. El servicio
+HTTP aísla la petición perfilada (espera a que terminen las que están en
+curso y retiene las nuevas hasta que acabe, ver `servicio.py`); en la
+app, lo que ejecuten a la vez otras sesiones aparece en el muestreo.
+"""
+
+import bisect
+import cProfile
+import collections
+import datetime
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Límites superiores de los intervalos del histograma, en segundos
+LIMITES = tuple(10 ** (e / 20) for e in range(-120, 41))
+
+# Percentiles que se muestran
+PERCENTILES = (50, 90, 99)
+
+# Directorio donde se guardan los perfiles (None: perfilado desactivado)
+PERFILAR = os.environ.get('PERFILAR') or None
+
+# Segundos entre dos muestras de las pilas
+INTERVALO_MUESTREO = 0.001
+
+
+class Histograma:
+    """Recuento de duraciones por intervalos logarítmicos"""
+
+    def __init__(self):
+        self.cuentas = [0] * (len(LIMITES) + 1)
+        self.n = 0
+        self.total = 0.0
+        self.maximo = 0.0
+
+    def registrar(self, segundos):
+        self.cuentas[bisect.bisect_left(LIMITES, segundos)] += 1
+        self.n += 1
+        self.total += segundos
+        self.maximo = max(self.maximo, segundos)
+
+    def percentil(self, q):
+        """Duración por debajo de la que queda el `q` % de las medidas (en segundos)"""
+        if not self.n:
+            return 0.0
+        objetivo = q / 100 * self.n
+        acumulado = 0
+        for i, cuenta in enumerate(self.cuentas):
+            acumulado += cuenta
+            if acumulado >= objetivo:
+                return min(LIMITES[i] if i < len(LIMITES) else self.maximo, self.maximo)
+        return self.maximo
+
+    def resumen(self):
+        """Número de medidas, media, percentiles y máximo (en milisegundos)"""
+        return {
+            'n': self.n,
+            'media_ms': self.total / self.n * 1000 if self.n else 0.0,
+            **{f'p{q}_ms': self.percentil(q) * 1000 for q in PERCENTILES},
+            'max_ms': self.maximo * 1000,
+        }
+
+
+class Latencias:
+    """Histogramas de latencia por etapa, seguros entre hilos"""
+
+    def __init__(self):
+        self._histogramas = {}
+        self._cerrojo = threading.Lock()
+
+    def registrar(self, etapa, segundos):
+        with self._cerrojo:
+            histograma = self._histogramas.get(etapa)
+            if histograma is None:
+                histograma = self._histogramas[etapa] = Histograma()
+            histograma.registrar(segundos)
+
+    @contextmanager
+    def medir(self, etapa):
+        """Registra la duración del bloque en el histograma de `etapa` (también si lanza una excepción)"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(etapa, time.perf_counter() - inicio)
+
+    def resumen(self):
+        """{etapa: resumen del histograma}, por orden alfabético"""
+        with self._cerrojo:
+            return {etapa: h.resumen() for etapa, h in sorted(self._histogramas.items())}
+
+    def texto(self):
+        """Tabla en texto plano con los percentiles de cada etapa"""
+        columnas = ['n', 'media_ms'] + [f'p{q}_ms' for q in PERCENTILES] + ['max_ms']
+        filas = [f"{'etapa':<28}" + ''.join(f'{c:>11}' for c in columnas)]
+        for etapa, resumen in self.resumen().items():
+            filas.append(f'{etapa:<28}{resumen["n"]:>11}'
+                         + ''.join(f'{resumen[c]:>11.2f}' for c in columnas[1:]))
+        return '\n'.join(filas) + '\n'
+
+    def reiniciar(self):
+        with self._cerrojo:
+            self._histogramas.clear()
+
+
+class _Muestreo(threading.Thread):
+    """Muestrea periódicamente las pilas de todos los hilos del proceso"""
+
+    def __init__(self, intervalo=INTERVALO_MUESTREO):
+        super().__init__(name='muestreo-pilas', daemon=True)
+        self.intervalo = intervalo
+        self.pilas = collections.Counter()
+        self._parar = threading.Event()
+
+    def run(self):
+        nombres = {}
+        while not self._parar.wait(self.intervalo):
+            for hilo, marco in sys._current_frames().items():
+                if hilo == self.ident:
+                    continue
+                if hilo not in nombres:
+                    nombres.update({h.ident: h.name for h in threading.enumerate()})
+                pila = []
+                while marco is not None:
+                    codigo = marco.f_code
+                    pila.append(f'{codigo.co_name} ({codigo.co_filename}:{marco.f_lineno})')
+                    marco = marco.f_back
+                pila.append(f'thread ({nombres.get(hilo, hilo)})')
+                self.pilas[';'.join(reversed(pila))] += 1
+
+    def detener(self):
+        self._parar.set()
+        self.join()
+
+
+def _hilo_vivo(ident):
+    return any(hilo.ident == ident for hilo in threading.enumerate())
+
+
+class Perfilador:
+    """Perfila una única ejecución con cProfile y muestreo de pilas (solo si `directorio`)"""
+
+    def __init__(self, directorio=PERFILAR):
+        self.directorio = directorio
+        self.ultimo = None
+        self._pendiente = directorio is not None
+        self._activo = None
+        self._cerrojo = threading.Lock()
+
+    @property
+    def habilitado(self):
+        return self.directorio is not None
+
+    @property
+    def pendiente(self):
+        """Si la siguiente ejecución se va a perfilar"""
+        return self._pendiente
+
+    def solicitar(self):
+        """Perfila la siguiente ejecución"""
+        if self.habilitado:
+            self._pendiente = True
+
+    def iniciar(self, nombre):
+        """Empieza a perfilar si hay un perfil solicitado; devuelve si lo ha hecho"""
+        with self._cerrojo:
+            if self._activo is not None and not _hilo_vivo(self._activo[3]):
+                # Ejecución interrumpida (p. ej. un rerun de Streamlit) en un hilo que ya no existe
+                self._activo[2].detener()
+                self._activo = None
+            if not self._pendiente or self._activo is not None:
+                return False
+            self._pendiente = False
+            perfil = cProfile.Profile()
+            muestreo = _Muestreo()
+            self._activo = (nombre, perfil, muestreo, threading.get_ident())
+        muestreo.start()
+        perfil.enable()
+        return True
+
+    def terminar(self):
+        """Termina el perfil en curso (iniciado en este hilo) y lo guarda; devuelve la ruta base"""
+        with self._cerrojo:
+            if self._activo is None or self._activo[3] != threading.get_ident():
+                return None
+            nombre, perfil, muestreo, _ = self._activo
+            self._activo = None
+        perfil.disable()
+        muestreo.detener()
+
+        os.makedirs(self.directorio, exist_ok=True)
+        fecha = datetime.datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        ruta = os.path.join(self.directorio, f'{nombre}-{fecha}')
+        perfil.dump_stats(ruta + '.prof')
+        with open(ruta + '.txt', 'w', encoding='utf-8') as f:
+            for pila, cuenta in muestreo.pilas.items():
+                f.write(f'{pila} {cuenta}\n')
+        self.ultimo = ruta
+        return ruta
+
+    @contextmanager
+    def perfilar(self, nombre):
+        """Perfila el bloque si hay un perfil solicitado"""
+        iniciado = self.iniciar(nombre)
+        try:
+            yield
+        finally:
+            if iniciado:
+                self.terminar()
+
+
+# Instancias compartidas por todo el proceso
+LATENCIAS = Latencias()
+PERFILADOR = Perfilador()
+medir = LATENCIAS.medir
@@ -0,0 +1,106 @@
+"""
+Funciones de predicción compartidas por la aplicación Streamlit.
+
+Construyen el DataFrame one-hot que espera el modelo a partir de perfiles
+sociodemográficos y puntúan lotes completos de perfiles con una única
+llamada al modelo, incluidos los barridos de variables del análisis de
+probabilidades.
+"""
+
+import pandas as pd
+
+from codificador import CODIFICADOR
+from esquema import VARIABLES, PARTIDOS
+from instrumentacion import medir
+
+
+def cargar_modelo(fuente=None):
+    """
+    Carga el modelo para servir predicciones fuera de la app, sin PyCaret.
+
+    `fuente` es el diccionario de `registro.fuente_actual` (por defecto, la
+    versión en servicio). Devuelve su tabla de perfiles si está vigente y,
+    si no, su artefacto ligero (ambos sirven para `predecir` y exponen
+    `predecir_codigos`). Lanza FileNotFoundError si no hay ninguno.
+    """
+    from inferencia import cargar_modelo_ligero
+    from registro import fuente_actual
+    from tabla_perfiles import cargar_tabla
+
+    if fuente is None:
+        fuente = fuente_actual()
+    modelo = cargar_tabla(fuente['ruta_tabla'], fuente['huella'])
+    if modelo is None:
+        modelo = cargar_modelo_ligero(fuente['ruta_ligero'], fuente['huella'])
+    if modelo is None:
+        raise FileNotFoundError("No hay tabla de perfiles ni artefacto ligero del modelo actual "
+                                "(ejecuta `python inferencia.py --exportar`)")
+    return modelo
+
+
+def crear_dataframe_perfiles(perfiles):
+    """Convierte un DataFrame de perfiles (una fila por perfil) en el DataFrame one-hot del modelo"""
+    return CODIFICADOR.dataframe(perfiles)
+
+
+def crear_dataframe_prediccion(grupo_edad, sexo, ccaa, tamuni, escideol, estudios, sitlab, participacion):
+    """Convierte los parámetros de entrada en un DataFrame para el modelo"""
+    perfil = pd.DataFrame({
+        'GRUPO_EDAD': [grupo_edad],
+        'SEXO': [sexo],
+        'CCAA': [ccaa],
+        'TAMUNI': [tamuni],
+        'ESCIDEOL': [escideol],
+        'ESTUDIOS': [estudios],
+        'SITLAB': [sitlab],
+        'PARTICIPACIONG': [participacion],
+    })
+    return crear_dataframe_perfiles(perfil)
+
+
+def predecir(modelo, perfiles):
+    """
+    Puntúa todos los perfiles con una sola llamada a `predict_model`.
+
+    Devuelve los perfiles junto con el partido predicho ('Partido'), su
+    probabilidad ('Probabilidad') y la probabilidad de cada partido.
+    `modelo` puede ser también cualquier objeto con un método `predecir`
+    que devuelva ese mismo formato (p. ej. `tabla_perfiles.TablaPerfiles`).
+    """
+    if hasattr(modelo, 'predecir'):
+        with medir(f'predecir.{type(modelo).__name__}'):
+            return modelo.predecir(perfiles)
+
+    # PyCaret solo se importa si realmente se usa el pipeline completo
+    from pycaret.classification import predict_model
+
+    with medir('predecir.crear_dataframe'):
+        datos = crear_dataframe_perfiles(perfiles)
+    with medir('predecir.predict_model'):
+        pred = predict_model(modelo, data=datos, raw_score=True)
+
+    resultado = perfiles.reset_index(drop=True)
+    resultado['Partido'] = pred['prediction_label'].to_numpy()
+    for partido in PARTIDOS:
+        resultado[partido] = pred[f'prediction_score_{partido}'].to_numpy()
+    resultado['Probabilidad'] = resultado[PARTIDOS].max(axis=1)
+    return resultado
+
+
+def barrido(modelo, perfil_base, variables):
+    """
+    Analiza cómo cambia la predicción al variar una o varias variables.
+
+    `perfil_base` es un diccionario con las 8 variables del perfil y
+    `variables` un diccionario {variable: valores a recorrer} (None recorre
+    todas las categorías). Se puntúa el producto cartesiano de los valores
+    en un único lote, de modo que barrer dos variables (p. ej. ideología ×
+    CCAA) cuesta prácticamente lo mismo que una sola predicción.
+    """
+    valores = {v: (VARIABLES[v] if opciones is None else list(opciones))
+               for v, opciones in variables.items()}
+    perfiles = pd.MultiIndex.from_product(list(valores.values()), names=list(valores)).to_frame(index=False)
+    for variable in VARIABLES:
+        if variable not in valores:
+            perfiles[variable] = perfil_base[variable]
+    return predecir(modelo, perfiles[list(VARIABLES)])
@@ -0,0 +1,246 @@
+"""
+Puntuación por lotes de ficheros de encuestados, fuera de la app.
+
+Lee un CSV o Parquet con los atributos de cada encuestado, o directamente
+un barómetro del CIS en .sav, por bloques de `FILAS_POR_LOTE` filas (la
+memoria no depende del tamaño del fichero). Cada bloque se reparte a un
+proceso del pool, que lo recodifica si hace falta, lo codifica con el
+mismo esquema que `crear_dataframe_prediccion` y lo puntúa con la tabla
+de perfiles precalculada (o, si no está vigente, con el artefacto
+ligero). Los resultados se escriben en orden a medida que llegan, con el
+partido predicho, su probabilidad y la probabilidad de cada partido.
+
+La entrada puede traer las 8 variables del modelo ya en sus categorías
+(las de `esquema.VARIABLES`) o las columnas originales del CIS (EDAD,
+CCAA, SEXO... con sus códigos numéricos), que se recodifican con
+`recodificacion.recodificar`. Las filas con algún valor no válido o
+faltante se conservan en la salida sin predicción.
+
+Uso:
+    python puntuacion.py entrada.{csv,parquet,sav} salida.{csv,parquet}
+        [--filas N] [--procesos N] [--conservar COLUMNA ...]
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from codificador import CODIFICADOR
+from esquema import VARIABLES, PARTIDOS
+from ingesta import COLUMNAS
+from prediccion import cargar_modelo
+from recodificacion import recodificar
+
+# Filas leídas, enviadas a un proceso y escritas de una vez
+FILAS_POR_LOTE = 100_000
+
+# Bloques en vuelo por proceso (acota la memoria de la cola de resultados)
+LOTES_POR_PROCESO = 2
+
+# Columnas originales del CIS necesarias para recodificar las 8 variables
+COLUMNAS_CIS = [c for c in COLUMNAS if c != 'VOTOSIMG']
+
+FORMATOS_ENTRADA = ('.csv', '.parquet', '.sav')
+FORMATOS_SALIDA = ('.csv', '.parquet')
+
+# Modelo de cada proceso del pool (se carga una sola vez en `_iniciar_proceso`)
+_MODELO = None
+
+
+def _extension(ruta, formatos):
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension not in formatos:
+        raise ValueError(f"Formato no soportado: {ruta} (se admite {', '.join(formatos)})")
+    return extension
+
+
+def columnas_fichero(ruta):
+    """Columnas del fichero de entrada, sin leer sus filas"""
+    extension = _extension(ruta, FORMATOS_ENTRADA)
+    if extension == '.csv':
+        return list(pd.read_csv(ruta, nrows=0).columns)
+    if extension == '.parquet':
+        import pyarrow.parquet as pq
+        return list(pq.read_schema(ruta).names)
+    import pyreadstat
+    _, meta = pyreadstat.read_sav(ruta, metadataonly=True)
+    return list(meta.column_names)
+
+
+def columnas_necesarias(disponibles):
+    """
+    Columnas de entrada que hay que leer para puntuar.
+
+    Usa las 8 variables del modelo si están todas y, si no, las columnas
+    originales del CIS.
+    """
+    for necesarias in (list(VARIABLES), COLUMNAS_CIS):
+        if all(c in disponibles for c in necesarias):
+            return necesarias
+    faltan = [c for c in VARIABLES if c not in disponibles]
+    faltan_cis = [c for c in COLUMNAS_CIS if c not in disponibles]
+    raise ValueError(f"Faltan columnas en la entrada: {faltan} (o, en formato CIS, {faltan_cis})")
+
+
+def leer_por_lotes(ruta, columnas, filas=FILAS_POR_LOTE):
+    """Itera sobre el fichero de entrada en DataFrames de como mucho `filas` filas"""
+    extension = _extension(ruta, FORMATOS_ENTRADA)
+    if extension == '.csv':
+        yield from pd.read_csv(ruta, usecols=columnas, chunksize=filas)
+    elif extension == '.parquet':
+        import pyarrow.parquet as pq
+        for lote in pq.ParquetFile(ruta).iter_batches(batch_size=filas, columns=columnas):
+            yield lote.to_pandas()
+    else:
+        import pyreadstat
+        for lote, _ in pyreadstat.read_file_in_chunks(pyreadstat.read_sav, ruta,
+                                                      chunksize=filas, usecols=columnas):
+            yield lote[columnas]
+
+
+def puntuar_lote(modelo, lote, conservar=()):
+    """
+    Puntúa un bloque de encuestados.
+
+    Devuelve las columnas `conservar` del bloque seguidas de 'Partido',
+    'Probabilidad' y la probabilidad de cada partido; las filas no
+    válidas quedan con valores faltantes.
+    """
+    perfiles = lote if 'GRUPO_EDAD' in lote else recodificar(lote[COLUMNAS_CIS])
+    codigos = CODIFICADOR.codigos(perfiles, validar=False)
+    validas = (codigos >= 0).all(axis=1)
+
+    etiquetas = np.full(len(lote), None, dtype=object)
+    probabilidades = np.full((len(lote), len(PARTIDOS)), np.nan, dtype=np.float32)
+    if validas.any():
+        etiquetas[validas], probabilidades[validas] = modelo.predecir_codigos(codigos[validas])
+
+    resultado = pd.DataFrame({c: lote[c].to_numpy() for c in conservar})
+    resultado['Partido'] = etiquetas
+    resultado['Probabilidad'] = probabilidades.max(axis=1)
+    for i, partido in enumerate(PARTIDOS):
+        resultado[partido] = probabilidades[:, i]
+    return resultado
+
+
+def _iniciar_proceso(fuente):
+    global _MODELO
+    _MODELO = cargar_modelo(fuente)
+
+
+def _puntuar_en_proceso(lote, conservar):
+    return puntuar_lote(_MODELO, lote, conservar)
+
+
+class _Escritor:
+    """Escribe los bloques de resultados uno tras otro en un CSV o un Parquet"""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.parquet = _extension(ruta, FORMATOS_SALIDA) == '.parquet'
+        self.ruta_tmp = ruta + '.tmp'
+        self._escritor = None
+        self._esquema = None
+
+    def escribir(self, resultado):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            if self._escritor is None:
+                resultado['Partido'] = resultado['Partido'].astype('string')
+                self._esquema = pa.Schema.from_pandas(resultado, preserve_index=False)
+                self._escritor = pq.ParquetWriter(self.ruta_tmp, self._esquema)
+            self._escritor.write_table(pa.Table.from_pandas(resultado, schema=self._esquema,
+                                                            preserve_index=False))
+        else:
+            primero = self._escritor is None
+            resultado.to_csv(self.ruta_tmp, mode='w' if primero else 'a', header=primero, index=False)
+            self._escritor = True
+
+    def cerrar(self):
+        """Cierra el fichero y lo mueve a su sitio (un lector nunca ve una salida a medias)"""
+        if self.parquet and self._escritor is not None:
+            self._escritor.close()
+        os.replace(self.ruta_tmp, self.ruta)
+
+    def descartar(self):
+        """Cierra y borra la salida a medias tras un error"""
+        if self.parquet and self._escritor is not None:
+            self._escritor.close()
+        if os.path.exists(self.ruta_tmp):
+            os.remove(self.ruta_tmp)
+
+
+def puntuar_fichero(entrada, salida, filas=FILAS_POR_LOTE, procesos=None, conservar=()):
+    """
+    Puntúa `entrada` por bloques en varios procesos y escribe los resultados en `salida`.
+
+    Como mucho hay `LOTES_POR_PROCESO` bloques por proceso en memoria a la
+    vez. Devuelve un diccionario con las filas leídas y las puntuadas.
+    """
+    from registro import fuente_actual
+
+    disponibles = columnas_fichero(entrada)
+    conservar = list(conservar)
+    faltan = [c for c in conservar if c not in disponibles]
+    if faltan:
+        raise ValueError(f"Las columnas a conservar no están en la entrada: {faltan}")
+    columnas = list(dict.fromkeys(columnas_necesarias(disponibles) + conservar))
+
+    # Todos los procesos usan la misma versión del modelo aunque se publique otra
+    fuente = fuente_actual()
+    escritor = _Escritor(salida)
+    totales = {'filas': 0, 'puntuadas': 0}
+
+    def escribir(resultado):
+        totales['filas'] += len(resultado)
+        totales['puntuadas'] += int(resultado['Partido'].notna().sum())
+        escritor.escribir(resultado)
+
+    lotes = leer_por_lotes(entrada, columnas, filas)
+    procesos = procesos or os.cpu_count() or 1
+    try:
+        if procesos == 1:
+            modelo = cargar_modelo(fuente)
+            for lote in lotes:
+                escribir(puntuar_lote(modelo, lote, conservar))
+        else:
+            with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_proceso,
+                                     initargs=(fuente,)) as pool:
+                # Los resultados se escriben en el orden de lectura
+                pendientes = deque()
+                for lote in lotes:
+                    pendientes.append(pool.submit(_puntuar_en_proceso, lote, conservar))
+                    if len(pendientes) >= procesos * LOTES_POR_PROCESO:
+                        escribir(pendientes.popleft().result())
+                while pendientes:
+                    escribir(pendientes.popleft().result())
+        escritor.cerrar()
+    except BaseException:
+        escritor.descartar()
+        raise
+    return totales
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Puntúa un fichero de encuestados con el modelo de voto")
+    parser.add_argument('entrada', help="CSV, Parquet o .sav del CIS")
+    parser.add_argument('salida', help="CSV o Parquet de resultados")
+    parser.add_argument('--filas', type=int, default=FILAS_POR_LOTE, help="filas por bloque")
+    parser.add_argument('--procesos', type=int, default=None, help="procesos (por defecto, uno por núcleo)")
+    parser.add_argument('--conservar', nargs='*', default=[],
+                        help="columnas de la entrada que se copian a la salida (p. ej. un identificador)")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    totales = puntuar_fichero(args.entrada, args.salida, args.filas, args.procesos, args.conservar)
+    segundos = time.perf_counter() - inicio
+    print(f"✅ {totales['puntuadas']:,} de {totales['filas']:,} filas puntuadas en {args.salida} "
+          f"({segundos:.1f} s, {totales['filas'] / segundos:,.0f} filas/s)")
@@ -0,0 +1,143 @@
+"""
+Recodificación vectorizada de las variables del CIS.
+
+Sustituye los `.map()` por variable y el `.apply()` fila a fila del
+notebook por una definición declarativa (código del CIS → categoría) que
+se aplica con arrays de consulta: cada variable se convierte en un
+`pd.Categorical` con el conjunto fijo de categorías de `esquema.py`, el
+mismo que usa la app, de modo que entrenamiento y predicción comparten un
+único esquema.
+
+Los códigos que no aparecen en `RECODIFICACION` (no sabe, no contesta,
+partidos minoritarios...) se convierten en valores faltantes.
+"""
+
+import numpy as np
+import pandas as pd
+
+from codificador import CODIFICADOR
+from esquema import VARIABLES, PARTIDOS, NUMERICAS, OBJETIVO
+
+# Código del CIS → categoría, por variable
+RECODIFICACION = {
+    'CCAA': {
+        1: 'Andalucía', 2: 'Aragón', 3: 'Asturias', 4: 'Balears', 5: 'Canarias',
+        6: 'Cantabria', 7: 'Castilla-La Mancha', 8: 'Castilla y León', 9: 'Catalunya',
+        10: 'Comunitat Valenciana', 11: 'Extremadura', 12: 'Galicia', 13: 'Madrid',
+        14: 'Murcia', 15: 'Navarra', 16: 'Euskadi', 17: 'La Rioja',
+        18: 'Ceuta y Melilla', 19: 'Ceuta y Melilla',
+    },
+    'SEXO': {1: 'Hombre', 2: 'Mujer'},
+    # 0, 98 y 99 no son posiciones válidas
+    'ESCIDEOL': {i: i for i in range(1, 11)},
+    'TAMUNI': {
+        1: '0-10.000', 2: '0-10.000',
+        3: '10.001-100.000', 4: '10.001-100.000',
+        5: '>100.000', 6: '>100.000', 7: '>100.000',
+    },
+    # 8 y 9: no recuerda / no contesta
+    'PARTICIPACIONG': {1: 'Sí', 2: 'No', 3: 'No', 4: 'No'},
+    # 9: no contesta
+    'SITLAB': {
+        1: 'Trabaja', 2: 'Pensionista', 3: 'Pensionista', 4: 'En paro', 5: 'En paro',
+        6: 'Otra situación', 7: 'Otra situación', 8: 'Otra situación',
+    },
+    # 7 y 9: otros / no contesta
+    'ESTUDIOS': {
+        1: 'Sin estudios o primaria', 2: 'Sin estudios o primaria',
+        3: 'Secundaria', 4: 'Secundaria', 5: 'Formación Profesional', 6: 'Superiores',
+    },
+    # Variable objetivo: solo los 4 partidos mayoritarios (blanco, abstención,
+    # no recuerda, no contesta y partidos minoritarios quedan como faltantes)
+    'VOTOSIMG': {1: 'PSOE', 2: 'PP', 3: 'VOX', 21: 'Sumar'},
+}
+
+# Categorías de cada variable recodificada
+CATEGORIAS = {**VARIABLES, 'VOTOSIMG': PARTIDOS}
+
+# Grupos de edad: mismos cortes que `crear_grupo_edad` del notebook (edad < 29 → 18-29, ...)
+CORTES_EDAD = [-np.inf, 29, 39, 49, 59, 69, np.inf]
+
+
+def _tabla_consulta(mapeo, categorias):
+    """Array indexado por código del CIS con el índice de su categoría (-1 = faltante)"""
+    tabla = np.full(max(mapeo) + 1, -1, dtype=np.int8)
+    for codigo, categoria in mapeo.items():
+        tabla[codigo] = categorias.index(categoria)
+    return tabla
+
+
+TABLAS_CONSULTA = {v: _tabla_consulta(m, CATEGORIAS[v]) for v, m in RECODIFICACION.items()}
+
+
+def codigos_variable(valores, variable):
+    """Índice de categoría de cada código del CIS (-1 si no es válido o falta)"""
+    tabla = TABLAS_CONSULTA[variable]
+    valores = np.asarray(valores, dtype=np.float64)
+    validos = np.isfinite(valores) & (valores >= 0) & (valores < len(tabla))
+    codigos = np.full(len(valores), -1, dtype=np.int8)
+    codigos[validos] = tabla[valores[validos].astype(np.intp)]
+    return codigos
+
+
+def recodificar_variable(valores, variable):
+    """Recodifica una variable del CIS (categórica, o float32 si es numérica)"""
+    codigos = codigos_variable(valores, variable)
+    categorias = CATEGORIAS[variable]
+    if variable in NUMERICAS:
+        # El código -1 apunta al último elemento, que es NaN
+        numeros = np.array(list(categorias) + [np.nan], dtype=np.float32)
+        return numeros[codigos]
+    return pd.Categorical.from_codes(codigos, categories=categorias)
+
+
+def grupo_edad(edad):
+    """Agrupa la edad en los tramos del modelo"""
+    return pd.cut(edad, bins=CORTES_EDAD, right=False, labels=VARIABLES['GRUPO_EDAD'])
+
+
+def recodificar(df):
+    """
+    Recodifica las columnas del CIS presentes en `df` y añade GRUPO_EDAD.
+
+    Devuelve un DataFrame nuevo; las columnas que no se recodifican (EDAD,
+    MES...) se conservan tal cual.
+    """
+    columnas = {
+        c: recodificar_variable(df[c].to_numpy(), c) if c in RECODIFICACION else df[c]
+        for c in df.columns
+    }
+    if 'EDAD' in df:
+        columnas['GRUPO_EDAD'] = grupo_edad(df['EDAD'])
+    return pd.DataFrame(columnas, index=df.index, copy=False)
+
+
+def one_hot(perfiles):
+    """
+    One-hot de los perfiles con el esquema del entrenamiento.
+
+    Equivale a `pd.get_dummies(X, drop_first=True)` del notebook (ESCIDEOL
+    numérico y dummies booleanos) pero con las columnas de `CODIFICADOR`,
+    por lo que no depende de las categorías presentes en los datos.
+    """
+    matriz = CODIFICADOR.transformar(perfiles)
+    datos = {}
+    for j, columna in enumerate(CODIFICADOR.columnas):
+        datos[columna] = matriz[:, j] if columna in NUMERICAS else matriz[:, j].astype(bool)
+    return pd.DataFrame(datos, index=perfiles.index)
+
+
+def preparar_dataset(recodificado):
+    """
+    Construye el dataset final del entrenamiento a partir de los datos recodificados.
+
+    Se queda con los votos a los 4 partidos, elimina las filas con algún
+    valor faltante en las variables predictoras y añade el one-hot y la
+    columna objetivo VOTO.
+    """
+    df_ml = recodificado[recodificado['VOTOSIMG'].notna()]
+    df_ml = df_ml.dropna(subset=list(VARIABLES))
+
+    df_final = one_hot(df_ml).reset_index(drop=True)
+    df_final[OBJETIVO] = df_ml['VOTOSIMG'].astype(str).to_numpy()
+    return df_final
@@ -0,0 +1,152 @@
+"""
+Registro versionado de modelos para actualizar la app sin reiniciarla.
+
+Cada versión es un directorio `models/registro/v<NNNN>/` con:
+
+    modelo_ligero.npz    artefacto que sirve la app (ver inferencia.py)
+    modelo_sklearn.pkl   el `ModeloLigero` con el estimador de scikit-learn,
+                         del que parte la siguiente actualización incremental
+    tabla_perfiles/      tabla precalculada de la versión
+    meta.json            huella, hash del .pkl de PyCaret del que deriva,
+                         meses de entrenamiento, tipo de actualización,
+                         métricas de deriva y distribuciones de referencia
+
+El fichero `models/registro/ACTUAL` indica la versión en servicio y se
+sustituye de forma atómica al publicar una nueva. La app, el servicio HTTP
+y la puntuación por lotes lo consultan con `fuente_actual`: en cuanto
+cambia, cargan la nueva versión sin reiniciar los workers. Si el registro
+está vacío se sirve el modelo de `models/` como hasta ahora.
+
+Uso:
+    python registro.py            # lista las versiones
+    python registro.py v0003      # vuelve a poner en servicio una versión
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import pickle
+import shutil
+
+from inferencia import RUTA_MODELO_LIGERO, exportar_modelo
+from tabla_perfiles import RUTA_TABLA, construir_tabla, hash_modelo
+
+RUTA_REGISTRO = 'models/registro'
+
+# Versiones que se conservan en disco (además de la que está en servicio)
+VERSIONES_CONSERVADAS = 5
+
+
+def versiones(ruta=RUTA_REGISTRO):
+    """Versiones publicadas, de la más antigua a la más reciente"""
+    try:
+        nombres = os.listdir(ruta)
+    except OSError:
+        return []
+    return sorted(n for n in nombres if n.startswith('v') and n[1:].isdigit())
+
+
+def version_actual(ruta=RUTA_REGISTRO):
+    """Versión en servicio, o None si el registro está vacío"""
+    try:
+        with open(os.path.join(ruta, 'ACTUAL'), encoding='utf-8') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def leer_meta(version, ruta=RUTA_REGISTRO):
+    """Metadatos de una versión"""
+    with open(os.path.join(ruta, version, 'meta.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def fuente_actual(ruta=RUTA_REGISTRO):
+    """
+    Huella y rutas del modelo en servicio.
+
+    Devuelve un diccionario con 'version', 'huella', 'ruta_ligero' y
+    'ruta_tabla': los de la versión actual del registro o, si está vacío,
+    los del modelo de `models/` (lanza OSError si tampoco existe).
+    """
+    version = version_actual(ruta)
+    if version is None:
+        return {'version': None, 'huella': hash_modelo(),
+                'ruta_ligero': RUTA_MODELO_LIGERO, 'ruta_tabla': RUTA_TABLA}
+    directorio = os.path.join(ruta, version)
+    return {'version': version, 'huella': leer_meta(version, ruta)['huella'],
+            'ruta_ligero': os.path.join(directorio, 'modelo_ligero.npz'),
+            'ruta_tabla': os.path.join(directorio, 'tabla_perfiles')}
+
+
+def cargar_version(version, ruta=RUTA_REGISTRO):
+    """`ModeloLigero` (con el estimador de scikit-learn) de una versión"""
+    with open(os.path.join(ruta, version, 'modelo_sklearn.pkl'), 'rb') as f:
+        return pickle.load(f)
+
+
+def activar(version, ruta=RUTA_REGISTRO):
+    """Pone en servicio una versión ya publicada"""
+    if version not in versiones(ruta):
+        raise ValueError(f"La versión {version} no existe en {ruta}")
+    ruta_tmp = os.path.join(ruta, 'ACTUAL.tmp')
+    with open(ruta_tmp, 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(ruta_tmp, os.path.join(ruta, 'ACTUAL'))
+
+
+def publicar(ligero, meta, ruta=RUTA_REGISTRO):
+    """
+    Guarda `ligero` como una nueva versión y la pone en servicio.
+
+    El artefacto, la tabla de perfiles y los metadatos se escriben en un
+    directorio temporal que se mueve a su sitio al terminar; solo entonces
+    se actualiza ACTUAL. Devuelve el nombre de la versión.
+    """
+    existentes = versiones(ruta)
+    version = f'v{int(existentes[-1][1:]) + 1 if existentes else 1:04d}'
+    directorio = os.path.join(ruta, version)
+    directorio_tmp = directorio + '.tmp'
+    shutil.rmtree(directorio_tmp, ignore_errors=True)
+    os.makedirs(directorio_tmp)
+
+    serializado = pickle.dumps(ligero)
+    huella = hashlib.sha256(serializado).hexdigest()
+    with open(os.path.join(directorio_tmp, 'modelo_sklearn.pkl'), 'wb') as f:
+        f.write(serializado)
+    exportar_modelo(ligero, huella, os.path.join(directorio_tmp, 'modelo_ligero.npz'))
+    construir_tabla(ligero, huella, os.path.join(directorio_tmp, 'tabla_perfiles'))
+    with open(os.path.join(directorio_tmp, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({**meta, 'version': version, 'huella': huella,
+                   'creado': datetime.datetime.now().isoformat(timespec='seconds')},
+                  f, ensure_ascii=False, indent=2)
+
+    os.replace(directorio_tmp, directorio)
+    activar(version, ruta)
+    _limpiar(ruta)
+    return version
+
+
+def _limpiar(ruta):
+    """Borra las versiones más antiguas, salvo la que está en servicio"""
+    actual = version_actual(ruta)
+    for version in versiones(ruta)[:-VERSIONES_CONSERVADAS]:
+        if version != actual:
+            shutil.rmtree(os.path.join(ruta, version), ignore_errors=True)
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) > 1:
+        activar(sys.argv[1])
+        print(f"✅ Versión {sys.argv[1]} en servicio")
+        sys.exit()
+
+    actual = version_actual()
+    for version in versiones():
+        meta = leer_meta(version)
+        marca = '→' if version == actual else ' '
+        print(f"{marca} {version}  {meta['creado']}  {meta['tipo']:<12} {len(meta['meses'])} meses, "
+              f"{meta['filas']:,} filas")
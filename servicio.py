@@ -0,0 +1,341 @@
+"""
+Servicio HTTP de predicción, independiente de la app Streamlit.
+
+Expone el modelo (la tabla de perfiles o, si no está vigente, el artefacto
+ligero; ver `prediccion.cargar_modelo`) a otros sistemas con un servidor
+asíncrono de Tornado, que ya se instala como dependencia de Streamlit:
+
+    POST /predict   un perfil {"GRUPO_EDAD": "30-39", ...} o una lista de perfiles
+    POST /sweep     {"perfil": {...}, "variables": {"ESCIDEOL": null, "CCAA": [...]}}
+    GET  /salud     versión del modelo y número de peticiones y lotes puntuados
+    GET  /metricas  percentiles de latencia de cada etapa, en texto plano
+    POST /perfilar  perfila la siguiente petición (solo con PERFILAR=<directorio>)
+
+La petición perfilada se ejecuta sola: espera a que terminen las que
+están en curso y las que llegan mientras tanto esperan a que acabe, de
+modo que el perfil no incluye el trabajo de otras peticiones.
+
+Las peticiones de un único perfil no se puntúan una a una: un agrupador
+las retiene unos milisegundos (`ESPERA_AGRUPACION`) y puntúa todas las que
+hayan llegado en un único lote, como hacen `prediccion.predecir` y
+`prediccion.barrido` con los perfiles de la app.
+
+Cada `INTERVALO_REGISTRO` segundos se comprueba si se ha publicado una
+nueva versión en el registro (`registro.py`) y, si es así, se carga sin
+detener el servicio.
+
+Uso:
+    python servicio.py [--puerto 8000] [--espera-ms 2] [--max-lote 1024]
+"""
+
+import asyncio
+import json
+import time
+
+import pandas as pd
+import tornado.ioloop
+import tornado.web
+
+from esquema import VARIABLES, PARTIDOS
+from instrumentacion import LATENCIAS, PERFILADOR, medir
+from prediccion import predecir, barrido
+
+PUERTO = 8000
+
+# Segundos que se retiene la primera petición de un lote a la espera de otras
+ESPERA_AGRUPACION = 0.002
+
+# Perfiles a partir de los cuales el lote se puntúa sin esperar más
+MAX_LOTE = 1024
+
+# Segundos entre comprobaciones de una nueva versión del modelo en el registro
+INTERVALO_REGISTRO = 5
+
+
+def _validar_valor(variable, valor):
+    # En JSON true/false no deben colarse como 1/0 en ESCIDEOL
+    if isinstance(valor, bool) or valor not in VARIABLES[variable]:
+        raise ValueError(f"Valor no válido en la variable {variable}: {valor!r}")
+
+
+def validar_perfil(perfil):
+    """Comprueba que un perfil recibido en JSON tiene las 8 variables con valores válidos"""
+    if not isinstance(perfil, dict):
+        raise ValueError("Cada perfil debe ser un objeto JSON")
+    for variable in VARIABLES:
+        if variable not in perfil:
+            raise ValueError(f"Falta la variable {variable}")
+        _validar_valor(variable, perfil[variable])
+    return {variable: perfil[variable] for variable in VARIABLES}
+
+
+def validar_variables(variables):
+    """Comprueba las variables a barrer ({variable: valores o null}) de una petición /sweep"""
+    if not isinstance(variables, dict) or not variables:
+        raise ValueError("'variables' debe ser un objeto {variable: valores o null}")
+    for variable, valores in variables.items():
+        if variable not in VARIABLES:
+            raise ValueError(f"Variable desconocida: {variable}")
+        if valores is None:
+            continue
+        if not isinstance(valores, list) or not valores:
+            raise ValueError(f"Los valores de {variable} deben ser una lista no vacía o null")
+        for valor in valores:
+            _validar_valor(variable, valor)
+    return variables
+
+
+def registros(resultado):
+    """Convierte el resultado de `predecir` en una lista de diccionarios serializables"""
+    return [
+        {**fila, 'Probabilidad': float(fila['Probabilidad']),
+         **{partido: float(fila[partido]) for partido in PARTIDOS}}
+        for fila in resultado.to_dict(orient='records')
+    ]
+
+
+class AgrupadorPeticiones:
+    """Reúne las peticiones de un perfil que llegan casi a la vez y las puntúa en un único lote"""
+
+    def __init__(self, modelo, espera=ESPERA_AGRUPACION, max_lote=MAX_LOTE, fuente=None):
+        self.modelo = modelo
+        self.fuente = fuente
+        self.espera = espera
+        self.max_lote = max_lote
+        self.peticiones = 0
+        self.lotes = 0
+        self._pendientes = []
+        self._temporizador = None
+
+    async def predecir(self, perfil):
+        """Devuelve la predicción de un perfil (ya validado) cuando se puntúe su lote"""
+        bucle = asyncio.get_running_loop()
+        futuro = bucle.create_future()
+        self._pendientes.append((perfil, futuro))
+        self.peticiones += 1
+        if len(self._pendientes) >= self.max_lote or self.espera <= 0:
+            self._vaciar()
+        elif self._temporizador is None:
+            self._temporizador = bucle.call_later(self.espera, self._vaciar)
+        return await futuro
+
+    def _vaciar(self):
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+            self._temporizador = None
+        lote, self._pendientes = self._pendientes, []
+        if lote:
+            self.lotes += 1
+            asyncio.ensure_future(self._puntuar(lote))
+
+    async def _puntuar(self, lote):
+        perfiles = pd.DataFrame([perfil for perfil, _ in lote], columns=list(VARIABLES))
+        try:
+            # Se puntúa en un hilo para que el bucle siga aceptando peticiones
+            with medir('servicio.lote'):
+                resultado = await asyncio.get_running_loop().run_in_executor(
+                    None, predecir, self.modelo, perfiles)
+        except Exception as e:
+            for _, futuro in lote:
+                if not futuro.done():
+                    futuro.set_exception(e)
+            return
+        for (_, futuro), registro in zip(lote, registros(resultado)):
+            if not futuro.done():
+                futuro.set_result(registro)
+
+
+class PerfiladoExclusivo:
+    """
+    Aísla la petición perfilada del resto.
+
+    El perfilador es de todo el proceso, así que la petición que se perfila
+    espera a que terminen las que están en curso y, mientras se perfila,
+    las nuevas esperan a que acabe. Todo se ejecuta en el bucle de eventos,
+    así que basta con contadores y eventos de asyncio.
+    """
+
+    def __init__(self):
+        self.activas = 0
+        self._libre = asyncio.Event()
+        self._libre.set()
+        self._vacio = asyncio.Event()
+        self._vacio.set()
+
+    async def entrar(self, perfilable, nombre):
+        """Admite una petición; devuelve si se está perfilando"""
+        while not self._libre.is_set():
+            await self._libre.wait()
+        if perfilable and PERFILADOR.pendiente:
+            self._libre.clear()
+            while self.activas:
+                await self._vacio.wait()
+            if PERFILADOR.iniciar(nombre):
+                return True
+            self._libre.set()
+        self.activas += 1
+        self._vacio.clear()
+        return False
+
+    def salir(self, perfilando):
+        if perfilando:
+            PERFILADOR.terminar()
+            self._libre.set()
+            return
+        self.activas -= 1
+        if not self.activas:
+            self._vacio.set()
+
+
+class _Manejador(tornado.web.RequestHandler):
+    # Solo se perfilan las peticiones que llegan al modelo
+    perfilable = False
+
+    def initialize(self, agrupador, exclusivo):
+        self.agrupador = agrupador
+        self.exclusivo = exclusivo
+        self._admitida = False
+
+    async def prepare(self):
+        self._inicio = time.perf_counter()
+        self._perfilando = await self.exclusivo.entrar(self.perfilable, self.request.path.strip('/'))
+        self._admitida = True
+
+    def on_finish(self):
+        LATENCIAS.registrar(f'servicio.{self.request.path.strip("/")}', time.perf_counter() - self._inicio)
+        if self._admitida:
+            self.exclusivo.salir(self._perfilando)
+
+    @property
+    def modelo(self):
+        # El agrupador guarda el modelo en servicio (cambia al publicarse otra versión)
+        return self.agrupador.modelo
+
+    def responder(self, datos, estado=200):
+        self.set_status(estado)
+        self.set_header('Content-Type', 'application/json; charset=utf-8')
+        self.finish(json.dumps(datos, ensure_ascii=False))
+
+    def cuerpo(self):
+        try:
+            return json.loads(self.request.body)
+        except ValueError:
+            raise ValueError("El cuerpo de la petición no es JSON válido")
+
+
+class ManejadorPrediccion(_Manejador):
+    perfilable = True
+
+    async def post(self):
+        try:
+            datos = self.cuerpo()
+            if isinstance(datos, list):
+                perfiles = pd.DataFrame([validar_perfil(p) for p in datos], columns=list(VARIABLES))
+            else:
+                perfil = validar_perfil(datos)
+        except ValueError as e:
+            return self.responder({'error': str(e)}, 400)
+
+        if isinstance(datos, list):
+            # Las listas ya son un lote: se puntúan directamente
+            resultado = await asyncio.get_running_loop().run_in_executor(
+                None, predecir, self.modelo, perfiles)
+            self.responder(registros(resultado))
+        else:
+            self.responder(await self.agrupador.predecir(perfil))
+
+
+class ManejadorBarrido(_Manejador):
+    perfilable = True
+
+    async def post(self):
+        try:
+            datos = self.cuerpo()
+            if not isinstance(datos, dict):
+                raise ValueError("Se esperaba un objeto {\"perfil\": ..., \"variables\": ...}")
+            perfil = validar_perfil(datos.get('perfil'))
+            variables = validar_variables(datos.get('variables'))
+        except ValueError as e:
+            return self.responder({'error': str(e)}, 400)
+
+        resultado = await asyncio.get_running_loop().run_in_executor(
+            None, barrido, self.modelo, perfil, variables)
+        self.responder(registros(resultado))
+
+
+class ManejadorSalud(_Manejador):
+    def get(self):
+        self.responder({
+            'modelo': type(self.modelo).__name__,
+            'version': self.agrupador.fuente['version'] if self.agrupador.fuente else None,
+            'peticiones': self.agrupador.peticiones,
+            'lotes': self.agrupador.lotes,
+        })
+
+
+class ManejadorMetricas(_Manejador):
+    def get(self):
+        self.set_header('Content-Type', 'text/plain; charset=utf-8')
+        self.finish(LATENCIAS.texto())
+
+
+class ManejadorPerfilado(_Manejador):
+    def post(self):
+        if not PERFILADOR.habilitado:
+            return self.responder({'error': "Perfilado desactivado: arranca el servicio con PERFILAR=<directorio>"}, 403)
+        PERFILADOR.solicitar()
+        self.responder({'perfilar': True, 'ultimo': PERFILADOR.ultimo})
+
+
+def crear_aplicacion(agrupador):
+    """Construye la aplicación Tornado con los endpoints del servicio"""
+    contexto = {'agrupador': agrupador, 'exclusivo': PerfiladoExclusivo()}
+    return tornado.web.Application([
+        (r'/predict', ManejadorPrediccion, contexto),
+        (r'/sweep', ManejadorBarrido, contexto),
+        (r'/salud', ManejadorSalud, contexto),
+        (r'/metricas', ManejadorMetricas, contexto),
+        (r'/perfilar', ManejadorPerfilado, contexto),
+    ])
+
+
+def recargar_modelo(agrupador):
+    """Carga la versión en servicio del registro si ha cambiado; si falla, sigue con la anterior"""
+    from prediccion import cargar_modelo
+    from registro import fuente_actual
+
+    try:
+        fuente = fuente_actual()
+        if agrupador.fuente is None or fuente['huella'] != agrupador.fuente['huella']:
+            agrupador.modelo = cargar_modelo(fuente)
+            agrupador.fuente = fuente
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠️ No se pudo cargar la nueva versión del modelo: {e}")
+
+
+async def servir(puerto=PUERTO, espera=ESPERA_AGRUPACION, max_lote=MAX_LOTE):
+    """Carga el modelo y atiende peticiones hasta que se interrumpa el proceso"""
+    from prediccion import cargar_modelo
+    from registro import fuente_actual
+
+    fuente = fuente_actual()
+    agrupador = AgrupadorPeticiones(cargar_modelo(fuente), espera, max_lote, fuente)
+    tornado.ioloop.PeriodicCallback(lambda: recargar_modelo(agrupador), INTERVALO_REGISTRO * 1000).start()
+
+    aplicacion = crear_aplicacion(agrupador)
+    aplicacion.listen(puerto)
+    print(f"✅ Servicio de predicción escuchando en http://localhost:{puerto}")
+    await asyncio.Event().wait()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Servicio HTTP de predicción de voto")
+    parser.add_argument('--puerto', type=int, default=PUERTO)
+    parser.add_argument('--espera-ms', type=float, default=ESPERA_AGRUPACION * 1000,
+                        help="milisegundos que se agrupan las peticiones (0 = sin agrupar)")
+    parser.add_argument('--max-lote', type=int, default=MAX_LOTE)
+    args = parser.parse_args()
+
+    asyncio.run(servir(args.puerto, args.espera_ms / 1000, args.max_lote))
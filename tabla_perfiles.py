@@ -0,0 +1,182 @@
+"""
+Tabla precalculada de predicciones para todos los perfiles posibles.
+
+El espacio de entrada del modelo es finito: 6 grupos de edad × 2 sexos ×
+18 CCAA × 3 tamaños de municipio × 10 posiciones ideológicas × 4 niveles
+de estudios × 4 situaciones laborales × 2 valores de participación =
+207.360 perfiles. Este módulo puntúa todos ellos una sola vez y guarda el
+partido predicho y las probabilidades de los 4 partidos en arrays NumPy
+que se abren con memory-map. Cada perfil se indexa con un código de base
+mixta (un dígito por variable, en el orden de `esquema.VARIABLES`), de
+modo que servir una predicción o un barrido es una consulta al array.
+
+La tabla guarda el hash SHA-256 del modelo con el que se construyó y se
+considera obsoleta en cuanto el .pkl cambia.
+
+Uso:
+    python tabla_perfiles.py
+"""
+
+import hashlib
+import io
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from codificador import CODIFICADOR
+from esquema import VARIABLES, PARTIDOS
+
+RUTA_MODELO = 'models/modelo_prediccion_voto.pkl'
+RUTA_TABLA = 'models/tabla_perfiles'
+
+# Número de categorías de cada variable (dígitos del código de base mixta)
+RADICES = tuple(len(categorias) for categorias in VARIABLES.values())
+N_PERFILES = int(np.prod(RADICES))
+
+# Perfiles puntuados por cada llamada al modelo durante la construcción
+TAMANO_LOTE = 50_000
+
+
+def hash_modelo(ruta_modelo=RUTA_MODELO):
+    """Calcula el hash SHA-256 del fichero del modelo"""
+    with open(ruta_modelo, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def cargar_pipeline(ruta_modelo=RUTA_MODELO):
+    """
+    Carga el pipeline de PyCaret y el hash SHA-256 de los mismos bytes.
+
+    El fichero se lee una sola vez: si se sustituye durante la carga, el
+    hash sigue correspondiendo al pipeline devuelto. Los artefactos que se
+    derivan del pipeline deben etiquetarse con este hash y no con uno
+    calculado aparte.
+    """
+    import joblib
+
+    with open(ruta_modelo, 'rb') as f:
+        contenido = f.read()
+    return joblib.load(io.BytesIO(contenido)), hashlib.sha256(contenido).hexdigest()
+
+
+def codificar_perfiles(perfiles):
+    """Convierte un DataFrame de perfiles en sus códigos de base mixta"""
+    return np.ravel_multi_index(CODIFICADOR.codigos(perfiles).T, RADICES)
+
+
+def decodificar_perfiles(codigos):
+    """Reconstruye el DataFrame de perfiles a partir de sus códigos de base mixta"""
+    digitos = np.unravel_index(codigos, RADICES)
+    return pd.DataFrame({
+        variable: np.asarray(categorias, dtype=object)[digito]
+        for (variable, categorias), digito in zip(VARIABLES.items(), digitos)
+    })
+
+
+def construir_tabla(modelo, huella, ruta=RUTA_TABLA, tamano_lote=TAMANO_LOTE):
+    """
+    Puntúa todos los perfiles por lotes y guarda la tabla en `ruta`.
+
+    `modelo` puede ser el pipeline de PyCaret o un `inferencia.ModeloLigero`
+    (mucho más rápido); `huella` es el hash del modelo que se registra en
+    los metadatos. La tabla se escribe en un directorio temporal y se mueve
+    a su sitio al terminar, de modo que un lector nunca ve una tabla a
+    medio construir.
+    """
+    from prediccion import predecir
+
+    # El ModeloLigero ya se validó al extraerlo del pipeline
+    if hasattr(modelo, 'feature_names_in_'):
+        CODIFICADOR.validar(modelo)
+
+    ruta_tmp = ruta + '.tmp'
+    shutil.rmtree(ruta_tmp, ignore_errors=True)
+    os.makedirs(ruta_tmp)
+
+    probabilidades = np.lib.format.open_memmap(
+        os.path.join(ruta_tmp, 'probabilidades.npy'), mode='w+',
+        dtype=np.float32, shape=(N_PERFILES, len(PARTIDOS)))
+    etiquetas = np.lib.format.open_memmap(
+        os.path.join(ruta_tmp, 'etiquetas.npy'), mode='w+',
+        dtype=np.uint8, shape=(N_PERFILES,))
+
+    for inicio in range(0, N_PERFILES, tamano_lote):
+        codigos = np.arange(inicio, min(inicio + tamano_lote, N_PERFILES))
+        pred = predecir(modelo, decodificar_perfiles(codigos))
+        probabilidades[codigos] = pred[PARTIDOS].to_numpy(dtype=np.float32)
+        etiquetas[codigos] = pd.Categorical(pred['Partido'], categories=PARTIDOS).codes
+
+    probabilidades.flush()
+    etiquetas.flush()
+    del probabilidades, etiquetas
+
+    with open(os.path.join(ruta_tmp, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({
+            'hash_modelo': huella,
+            'partidos': PARTIDOS,
+            'variables': VARIABLES,
+            'n_perfiles': N_PERFILES,
+        }, f, ensure_ascii=False, indent=2)
+
+    shutil.rmtree(ruta, ignore_errors=True)
+    os.replace(ruta_tmp, ruta)
+
+
+class TablaPerfiles:
+    """Predicciones precalculadas servidas por consulta directa al array"""
+
+    def __init__(self, ruta=RUTA_TABLA):
+        with open(os.path.join(ruta, 'meta.json'), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        if self.meta['variables'] != VARIABLES or self.meta['partidos'] != PARTIDOS:
+            raise ValueError("La tabla de perfiles no corresponde al esquema actual")
+        self.huella = self.meta['hash_modelo']
+        self.probabilidades = np.load(os.path.join(ruta, 'probabilidades.npy'), mmap_mode='r')
+        self.etiquetas = np.load(os.path.join(ruta, 'etiquetas.npy'), mmap_mode='r')
+
+    def predecir_codigos(self, codigos):
+        """Etiquetas y probabilidades de una matriz de códigos (`CodificadorOneHot.codigos`)"""
+        indices = np.ravel_multi_index(np.asarray(codigos).T, RADICES)
+        return np.asarray(PARTIDOS, dtype=object)[self.etiquetas[indices]], self.probabilidades[indices]
+
+    def predecir(self, perfiles):
+        """Devuelve las predicciones de los perfiles con el mismo formato que `prediccion.predecir`"""
+        etiquetas, probabilidades = self.predecir_codigos(CODIFICADOR.codigos(perfiles))
+
+        resultado = perfiles.reset_index(drop=True)
+        resultado['Partido'] = etiquetas
+        for i, partido in enumerate(PARTIDOS):
+            resultado[partido] = probabilidades[:, i]
+        resultado['Probabilidad'] = probabilidades.max(axis=1)
+        return resultado
+
+
+def cargar_tabla(ruta=RUTA_TABLA, huella=None):
+    """
+    Abre la tabla de perfiles si existe y corresponde al modelo actual.
+
+    Devuelve None si la tabla no existe o se construyó con otro modelo
+    (hash distinto), en cuyo caso hay que reconstruirla.
+    """
+    if huella is None:
+        huella = hash_modelo()
+    try:
+        tabla = TablaPerfiles(ruta)
+    except (OSError, ValueError, KeyError):
+        return None
+    return tabla if tabla.huella == huella else None
+
+
+if __name__ == '__main__':
+    import time
+
+    inicio = time.perf_counter()
+    from inferencia import extraer_modelo
+
+    modelo, huella = cargar_pipeline()
+    construir_tabla(extraer_modelo(modelo), huella)
+    print(f"✅ Tabla de {N_PERFILES:,} perfiles guardada en {RUTA_TABLA} "
+          f"({time.perf_counter() - inicio:.1f} s)")
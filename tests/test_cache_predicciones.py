@@ -0,0 +1,46 @@
+"""
+Caché de predicciones: los aciertos devuelven lo mismo (valores y tipos)
+que los fallos, y un cambio de modelo durante una predicción no deja
+predicciones del modelo anterior en la caché.
+"""
+
+import numpy as np
+import pytest
+
+import prediccion
+from cache_predicciones import CachePredicciones
+from tabla_perfiles import cargar_tabla, decodificar_perfiles, hash_modelo
+
+
+@pytest.fixture(scope='module')
+def tabla():
+    tabla = cargar_tabla(huella=hash_modelo())
+    if tabla is None:
+        pytest.skip("La tabla de perfiles no está construida")
+    return tabla
+
+
+def test_acierto_igual_que_fallo(tabla):
+    cache = CachePredicciones()
+    perfiles = decodificar_perfiles(np.arange(0, 200_000, 20_000)).to_dict('records')
+    fallo = cache.predecir(tabla, perfiles)
+    acierto = cache.predecir(tabla, perfiles)
+    assert cache.estadisticas()['aciertos'] == len(perfiles)
+    assert acierto.dtypes.equals(fallo.dtypes)
+    assert acierto.equals(fallo)
+    assert fallo['Probabilidad'].dtype == np.float32
+
+
+def test_cambio_de_modelo_durante_la_prediccion(tabla, monkeypatch):
+    cache = CachePredicciones()
+    cache.vincular('modelo anterior')
+    original = prediccion.predecir
+
+    def predecir_y_cambiar(modelo, perfiles):
+        cache.vincular('modelo nuevo')
+        return original(modelo, perfiles)
+
+    monkeypatch.setattr(prediccion, 'predecir', predecir_y_cambiar)
+    resultado = cache.predecir(tabla, decodificar_perfiles(np.arange(3)))
+    assert len(resultado) == 3
+    assert cache.estadisticas()['perfiles'] == 0
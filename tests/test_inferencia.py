@@ -0,0 +1,148 @@
+"""
+Concordancia de la inferencia ligera con scikit-learn y con PyCaret.
+
+Las pruebas con estimadores entrenados sobre filas aleatorias solo
+necesitan scikit-learn. El artefacto `models/modelo_ligero.npz` y la tabla
+de perfiles se comparan con la salida de `predict_model(raw_score=True)`
+guardada en `tests/datos/predict_model.json` para un conjunto fijo de
+perfiles de encuestados reales, sin necesidad de PyCaret; la comparación
+directa con el pipeline se omite si PyCaret no está instalado.
+
+Para regenerar la salida de referencia tras reentrenar el modelo (necesita PyCaret):
+    python inferencia.py --referencia
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from codificador import CODIFICADOR
+from esquema import VARIABLES, PARTIDOS
+from inferencia import ArbolesGB, ModeloLigero, cargar_modelo_ligero, exportar_modelo
+from tabla_perfiles import N_PERFILES, RADICES, construir_tabla, cargar_tabla, decodificar_perfiles, hash_modelo
+
+SEMILLA = 123
+
+# Diferencia máxima admitida frente a `predict_proba` de scikit-learn
+TOLERANCIA = 1e-12
+
+# Salida de `predict_model` para perfiles reales (ver `inferencia.guardar_referencia`)
+RUTA_REFERENCIA = os.path.join(os.path.dirname(__file__), 'datos', 'predict_model.json')
+
+# `predict_model` redondea a 4 decimales; la tabla guarda las probabilidades en float32
+TOLERANCIA_TABLA = 5e-5 + 1e-6
+
+
+def filas_codificadas(n, semilla=SEMILLA):
+    """Matriz one-hot de `n` perfiles aleatorios"""
+    rng = np.random.default_rng(semilla)
+    codigos = np.stack([rng.integers(0, radix, n) for radix in RADICES], axis=1)
+    return CODIFICADOR.transformar_codigos(codigos)
+
+
+@pytest.fixture(scope='module')
+def ligero():
+    """`ModeloLigero` con un GradientBoostingClassifier entrenado sobre filas aleatorias"""
+    from sklearn.ensemble import GradientBoostingClassifier
+
+    rng = np.random.default_rng(SEMILLA)
+    X = filas_codificadas(2000)
+    n_columnas = X.shape[1]
+    # Selección de columnas y normalización como las del pipeline
+    indices = np.sort(rng.choice(n_columnas, n_columnas - 3, replace=False))
+    media = rng.normal(size=len(indices))
+    escala = rng.uniform(0.5, 2.0, size=len(indices))
+    Xp = (X[:, indices] - media) / escala
+    # Etiquetas que dependen de las variables, para que los árboles tengan ramas
+    puntuaciones = Xp @ rng.normal(size=(len(indices), len(PARTIDOS))) + rng.normal(size=(len(X), len(PARTIDOS)))
+    y = np.asarray(PARTIDOS)[puntuaciones.argmax(axis=1)]
+
+    estimador = GradientBoostingClassifier(n_estimators=30, max_depth=3, random_state=SEMILLA).fit(Xp, y)
+    return ModeloLigero(indices, media, escala, estimador, list(estimador.classes_))
+
+
+def test_arboles_gb_coincide_con_sklearn(ligero):
+    X = ligero.preprocesar(filas_codificadas(5000, SEMILLA + 1))
+    arboles = ArbolesGB.desde_estimador(ligero.estimador)
+    diferencia = np.abs(arboles.predict_proba(X) - ligero.estimador.predict_proba(X)).max()
+    assert diferencia < TOLERANCIA
+
+
+def test_artefacto_exportado_coincide_con_sklearn(ligero, tmp_path):
+    ruta = str(tmp_path / 'modelo_ligero.npz')
+    exportar_modelo(ligero, 'prueba', ruta)
+    exportado = cargar_modelo_ligero(ruta, 'prueba')
+    assert isinstance(exportado.estimador, ArbolesGB)
+    assert list(exportado.clases) == list(ligero.clases)
+
+    X = filas_codificadas(5000, SEMILLA + 2)
+    diferencia = np.abs(exportado.predict_proba(X) - ligero.predict_proba(X)).max()
+    assert diferencia < TOLERANCIA
+    etiquetas, _ = exportado.predecir_matriz(X)
+    assert (etiquetas == ligero.predecir_matriz(X)[0]).all()
+
+
+def test_artefacto_de_otro_modelo_no_se_carga(ligero, tmp_path):
+    ruta = str(tmp_path / 'modelo_ligero.npz')
+    exportar_modelo(ligero, 'prueba', ruta)
+    assert cargar_modelo_ligero(ruta, 'otra') is None
+
+
+def test_pipeline_pycaret_coincide_con_artefacto():
+    pytest.importorskip('pycaret')
+    from inferencia import extraer_modelo, verificar
+    from tabla_perfiles import cargar_pipeline
+
+    pipeline, huella = cargar_pipeline()
+    ligero = extraer_modelo(pipeline)
+    exportado = cargar_modelo_ligero(huella=huella)
+    assert exportado is not None, "models/modelo_ligero.npz no corresponde al .pkl"
+
+    perfiles = decodificar_perfiles(np.random.default_rng(SEMILLA).choice(N_PERFILES, 5000, replace=False))
+    verificar(pipeline, ligero, perfiles)
+    verificar(pipeline, exportado, perfiles)
+
+    X = CODIFICADOR.dataframe(perfiles)
+    referencia = pipeline.predict_proba(X)
+    assert np.abs(ligero.predict_proba(X.to_numpy()) - referencia).max() < TOLERANCIA
+    assert np.abs(exportado.predict_proba(X.to_numpy()) - referencia).max() < TOLERANCIA
+
+
+@pytest.fixture(scope='module')
+def referencia():
+    with open(RUTA_REFERENCIA, encoding='utf-8') as f:
+        referencia = json.load(f)
+    if referencia['hash_modelo'] != hash_modelo():
+        pytest.fail("tests/datos/predict_model.json es de otro modelo: regenérala con "
+                    "`python inferencia.py --referencia`")
+    salida = pd.DataFrame(referencia['filas'])
+    return salida[list(VARIABLES)], salida
+
+
+def _comparar_con_referencia(modelo, referencia, tolerancia):
+    perfiles, salida = referencia
+    etiquetas, probabilidades = modelo.predecir_codigos(CODIFICADOR.codigos(perfiles))
+    assert (np.asarray(etiquetas) == salida['prediction_label'].to_numpy()).all()
+    for i, partido in enumerate(PARTIDOS):
+        esperadas = salida[f'prediction_score_{partido}'].to_numpy()
+        assert np.abs(np.round(np.asarray(probabilidades[:, i], dtype=np.float64), 4) - esperadas).max() <= tolerancia
+
+
+def test_artefacto_del_repositorio_coincide_con_predict_model(referencia):
+    ligero = cargar_modelo_ligero(huella=hash_modelo())
+    assert ligero is not None, "models/modelo_ligero.npz no corresponde al .pkl"
+    _comparar_con_referencia(ligero, referencia, 0)
+
+
+def test_tabla_de_perfiles_coincide_con_predict_model(referencia, tmp_path):
+    huella = hash_modelo()
+    tabla = cargar_tabla(huella=huella)
+    if tabla is None:
+        # La tabla no está en el repositorio: se construye desde el artefacto ligero
+        ruta = str(tmp_path / 'tabla_perfiles')
+        construir_tabla(cargar_modelo_ligero(huella=huella), huella, ruta)
+        tabla = cargar_tabla(ruta, huella)
+    _comparar_con_referencia(tabla, referencia, TOLERANCIA_TABLA)